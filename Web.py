@@ -1,4 +1,5 @@
 #Importtting files
+import os
 import mysql.connector
 from flask import Flask, render_template, request
 import locale
@@ -11,6 +12,6 @@ app = Flask(__name__)
 def index():
     return render_template('index.html')
 
-#Running application
+#Running application (dev server only; the real app is Website/Web.py, served via Website/wsgi.py)
 if __name__ == "__main__":
-    app.run(debug=True)
\ No newline at end of file
+    app.run(debug=os.environ.get('FLASK_DEBUG') == '1')
\ No newline at end of file
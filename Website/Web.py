@@ -1,12 +1,38 @@
 # ==============================================================================
 # 🚀 CORE IMPORTS
 # ==============================================================================
+import asyncio
 import os
+import random
+import shutil
+import time
+import uuid
+import click
 import mysql.connector
+from contextlib import contextmanager
 from datetime import datetime
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify
+from flask import (Flask, render_template, request, redirect, url_for, session, flash, jsonify, g,
+                   has_app_context, Response, stream_with_context, send_file)
+from markupsafe import Markup
 from werkzeug.utils import secure_filename
 
+from db_pool import ConnectionPool
+from report_cache import ReportCache, make_backend
+import migrations
+from exports import EXPORT_FORMATS
+from report_jobs import ReportJobQueue, JobQueueFull
+from login_guard import LoginGuard
+from credentials import PasswordHasher, HashingBusy
+from session_store import ServerSessionInterface, make_session_backend
+from instrumentation import Instrumentation
+import assets
+from page_cache import PageCache
+from uploads import UploadStore, UploadError
+from previews import PreviewCache
+from async_db import AsyncDB, DatabaseUnavailable, async_view
+import queries
+from jinja2 import FileSystemBytecodeCache
+
 # ==============================================================================
 # ⚙️ APP & DATABASE CONFIGURATION
 # ==============================================================================
@@ -19,68 +45,452 @@ app.secret_key = 'a_very_secret_key_for_contractor_app'
 UPLOAD_FOLDER = os.path.join(app.root_path, 'static', 'uploads')
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+# Attachments are uploaded in chunks and stored once per SHA-256 under ATTACHMENT_FOLDER/blobs.
+# Keep it outside static/: files must only be reachable through the access-checked routes.
+ATTACHMENT_FOLDER = os.environ.get('ATTACHMENT_FOLDER', os.path.join(app.instance_path, 'attachments'))
+UPLOAD_CONFIG = {
+    'max_bytes': int(os.environ.get('UPLOAD_MAX_MB', 25)) * 1024 * 1024,
+    'chunk_bytes': int(os.environ.get('UPLOAD_CHUNK_MB', 4)) * 1024 * 1024,
+    'partial_ttl': int(os.environ.get('UPLOAD_PARTIAL_TTL', 24 * 3600))
+}
+upload_store = UploadStore(ATTACHMENT_FOLDER, **UPLOAD_CONFIG)
+# Thumbnails / first-page previews for reviewers, rendered in the background; the
+# folder is capped at PREVIEW_CACHE_MB and least recently viewed previews are evicted
+PREVIEW_CONFIG = {
+    'root': os.path.join(app.instance_path, 'previews'),
+    'max_bytes': int(os.environ.get('PREVIEW_CACHE_MB', 256)) * 1024 * 1024,
+    'workers': int(os.environ.get('PREVIEW_WORKERS', 2))
+}
+preview_cache = PreviewCache(**PREVIEW_CONFIG, log=app.logger.warning)
+
+# --- STATIC ASSETS & TEMPLATES ---
+# Hashed, minified copies come from `flask build-assets`; url_for('static', ...) picks
+# them up from the manifest. Compiled templates are cached on disk across restarts.
+asset_manifest = assets.AssetManifest(app.static_folder)
+TEMPLATE_CACHE_DIR = os.path.join(app.instance_path, 'jinja_cache')
+os.makedirs(TEMPLATE_CACHE_DIR, exist_ok=True)
+app.jinja_env.bytecode_cache = FileSystemBytecodeCache(TEMPLATE_CACHE_DIR)
+
+@app.url_defaults
+def fingerprint_static_urls(endpoint, values):
+    if endpoint == 'static' and 'filename' in values:
+        values['filename'] = asset_manifest.resolve(values['filename'])
+
+@app.after_request
+def cache_fingerprinted_assets(response):
+    """Hashed file names change whenever the content does, so browsers may keep them for a year."""
+    if request.endpoint == 'static' and response.status_code == 200 \
+            and asset_manifest.is_fingerprinted(request.view_args.get('filename', '')):
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = assets.CACHE_FOREVER
+        response.cache_control.immutable = True
+    return response
+
+@app.template_global()
+def responsive_image(filename, alt, sizes='100vw', **attrs):
+    """<picture> with WebP/AVIF srcsets when the asset build made them, else a lazy <img>."""
+    return asset_manifest.responsive_image(url_for, filename, alt, sizes=sizes, **attrs)
+
+def warm_templates():
+    """Compiles every template now (from the bytecode cache when possible) instead of on first hit."""
+    for name in app.jinja_env.list_templates(extensions=('html',)):
+        app.jinja_env.get_template(name)
+
+@app.cli.command('build-assets')
+def build_assets_command():
+    """Minifies/fingerprints CSS, makes image variants (with Pillow) and precompiles templates."""
+    assets.build(app.static_folder, log=click.echo)
+    asset_manifest.load()
+    warm_templates()
+    click.echo(f"Assets written to {os.path.join(app.static_folder, assets.DIST_DIR)}; templates compiled.")
+
+# --- PUBLIC PAGE CACHE ---
+# Anonymous visitors get index/impact/about... from memory (gzip/br, ETag + 304s);
+# anyone with a session (logged in, pending flash) is rendered fresh.
+page_cache = PageCache(
+    ttl=int(os.environ.get('PAGE_CACHE_TTL', 300)),
+    max_age=int(os.environ.get('PAGE_CACHE_MAX_AGE', 60))
+)
+
+@app.template_global()
+def cached_fragment(template_name, **context):
+    """Renders a shared partial once per context for anonymous visitors (it may show the session otherwise)."""
+    render = lambda: render_template(template_name, **context)
+    if session:
+        return Markup(render())
+    key = (template_name,) + tuple(sorted(context.items()))
+    return page_cache.fragment(key, render)
 
 # --- DATABASE CONFIG ---
+# DB_* environment variables override the local defaults (e.g. DB_NAME=Rebates_Bench for load tests)
 DB_CONFIG = {
-    'host': '127.0.0.1',
-    'user': 'root',
-    'password': '',
-    'port': 3306,
-    'database': 'Rebates'
+    'host': os.environ.get('DB_HOST', '127.0.0.1'),
+    'user': os.environ.get('DB_USER', 'root'),
+    'password': os.environ.get('DB_PASSWORD', ''),
+    'port': int(os.environ.get('DB_PORT', 3306)),
+    'database': os.environ.get('DB_NAME', 'Rebates')
+}
+
+# --- CONNECTION POOL CONFIG ---
+# pool_size: connections kept warm | max_overflow: extra ones allowed under load
+# timeout: seconds to wait for a free connection | recycle: max connection age in seconds
+POOL_CONFIG = {
+    'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+    'max_overflow': int(os.environ.get('DB_POOL_MAX_OVERFLOW', 10)),
+    'timeout': float(os.environ.get('DB_POOL_TIMEOUT', 30)),
+    'recycle': int(os.environ.get('DB_POOL_RECYCLE', 3600)),
+    'pre_ping': True
+}
+
+db_pool = ConnectionPool(DB_CONFIG, **POOL_CONFIG)
+
+# --- REPORT CACHE CONFIG ---
+# REPORT_CACHE_BACKEND: 'memory' (per worker process: other workers never see its
+# invalidations, so only for a single worker), 'sqlite' (shared by the workers of this
+# host; gunicorn.conf.py makes it the default when it runs several) or a redis:// URL
+REPORT_CACHE_CONFIG = {
+    'backend': os.environ.get('REPORT_CACHE_BACKEND', 'memory'),
+    'db_path': os.path.join(app.instance_path, 'report_cache.sqlite3'),
+    'ttl': int(os.environ.get('REPORT_CACHE_TTL', 300)),
+    'max_entries': int(os.environ.get('REPORT_CACHE_MAX_ENTRIES', 256))
 }
 
+report_cache = ReportCache(
+    make_backend(REPORT_CACHE_CONFIG['backend'], max_entries=REPORT_CACHE_CONFIG['max_entries'],
+                 db_path=REPORT_CACHE_CONFIG['db_path']),
+    default_ttl=REPORT_CACHE_CONFIG['ttl']
+)
+
+# --- SESSION STORE CONFIG ---
+# SESSION_BACKEND: 'sqlite' (file in the instance folder) or a redis:// URL shared by all workers
+# idle_timeout: seconds without a request before someone is logged out
+SESSION_CONFIG = {
+    'backend': os.environ.get('SESSION_BACKEND', 'sqlite'),
+    'db_path': os.path.join(app.instance_path, 'sessions.sqlite3'),
+    'idle_timeout': int(os.environ.get('SESSION_IDLE_TIMEOUT', 3600))
+}
+
+def session_principal(sess):
+    """Who a session belongs to, e.g. 'reviewer:7', so it can be revoked with the rest of theirs."""
+    if sess.get('contractor_logged_in'):
+        return f"reviewer:{sess.get('reviewer_id')}"
+    if sess.get('sponsor_logged_in'):
+        return f"sponsor:{sess.get('sponsor_id')}"
+    if sess.get('user_logged_in'):
+        return f"applicant:{sess.get('user_id')}"
+    return None
+
+app.session_interface = ServerSessionInterface(
+    make_session_backend(SESSION_CONFIG['backend'], SESSION_CONFIG['db_path']),
+    idle_timeout=SESSION_CONFIG['idle_timeout'],
+    principal_for=session_principal
+)
+
+# --- INSTRUMENTATION CONFIG ---
+# Requests slower than SLOW_REQUEST_MS are logged as one JSON line (to SLOW_REQUEST_LOG if set)
+SLOW_REQUEST_MS = float(os.environ.get('SLOW_REQUEST_MS', 500))
+SLOW_REQUEST_LOG = os.environ.get('SLOW_REQUEST_LOG')
+
+def log_slow_request(line):
+    if SLOW_REQUEST_LOG:
+        with open(SLOW_REQUEST_LOG, 'a', encoding='utf-8') as log_file:
+            log_file.write(line + '\n')
+    else:
+        print(line)
+
+instrumentation = Instrumentation(slow_ms=SLOW_REQUEST_MS, log=log_slow_request)
+
 # --- DB CONNECTION HELPER ---
 def get_db_connection():
-    """Establishes a connection to the MySQL database."""
+    """
+    Checks a connection out of the pool. Calling conn.close() hands it back;
+    anything a route forgets to close is returned at app-context teardown.
+    """
     try:
-        conn = mysql.connector.connect(**DB_CONFIG)
-        return conn
+        conn = instrumentation.wrap(db_pool.acquire())
     except mysql.connector.Error as err:
         print(f"Error connecting to MySQL: {err}")
         return None
-    
-# --- ADD THIS SYNC FUNCTION HERE ---
-def sync_rebate_approvals():
-    """Automatically creates approval records for all approved rebates."""
+
+    if has_app_context():
+        g.setdefault('db_connections', []).append(conn)
+    return conn
+
+@contextmanager
+def db_connection():
+    """`with db_connection() as conn:` -- always returns the connection, even on errors."""
     conn = get_db_connection()
-    if conn is None: return
     try:
-        cursor = conn.cursor(dictionary=True)
-        # Find SOP_Numbers that are 'Approved' but MISSING from REBATE_APPROVALS
-        find_query = """
-            SELECT R.SOP_Number, R.Sponsor_ID, R.Submission_Date, R.Num_Of_Applications 
+        yield conn
+    finally:
+        if conn is not None:
+            conn.close()
+
+# Lets async views await independent queries together (each on its own pooled connection).
+# Request threads and these workers draw on the same pool; gunicorn.conf.py sets
+# ASYNC_DB_WORKERS so that together they stay within pool_size + max_overflow.
+ASYNC_DB_WORKERS = int(os.environ.get('ASYNC_DB_WORKERS', POOL_CONFIG['pool_size']))
+async_db = AsyncDB(get_db_connection, workers=ASYNC_DB_WORKERS)
+
+@app.teardown_appcontext
+def release_db_connections(exception=None):
+    """Returns every connection this request checked out (fixes leaks on early returns/errors)."""
+    for conn in g.pop('db_connections', []):
+        conn.close()
+
+# --- REQUEST TIMING ---
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    g.query_stats = instrumentation.start()
+
+@app.after_request
+def remember_response_status(response):
+    g.response_status = response.status_code
+    return response
+
+@app.teardown_request
+def record_request_metrics(exception=None):
+    """Runs after the response (streamed bodies included) so the totals cover the whole request."""
+    started = g.pop('request_started', None)
+    if started is None:
+        return
+    status = 500 if exception is not None else g.pop('response_status', 200)
+    instrumentation.finish(request.endpoint or 'unmatched', g.pop('query_stats'),
+                           time.perf_counter() - started, status,
+                           method=request.method, path=request.path)
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Per-route latency and SQL counters plus pool/cache/job gauges, in Prometheus text format."""
+    gauges = {f"db_pool_{name}": value for name, value in db_pool.metrics().items()}
+    gauges.update({f"report_cache_{name}": value for name, value in report_cache.stats().items()})
+    gauges.update({f"report_jobs_{status}": count for status, count in report_jobs.stats().items()})
+    gauges.update({f"page_cache_{name}": value for name, value in page_cache.stats().items()})
+    gauges.update({f"preview_cache_{name}": value for name, value in preview_cache.stats().items()})
+    return Response(instrumentation.render_prometheus(gauges), mimetype='text/plain; version=0.0.4')
+
+# --- HEALTH CHECKS ---
+# live: the process answers | startup: migrations checked, first DB connection worked
+# ready: a pooled connection can be checked out quickly and answers SELECT 1
+HEALTH_CHECK_TIMEOUT = float(os.environ.get('HEALTH_CHECK_TIMEOUT', 2))
+
+@app.route('/healthz/live')
+def health_live():
+    return jsonify({'status': 'ok'})
+
+@app.route('/healthz/startup')
+def health_startup():
+    if not _app_schema_ready:
+        # Read-only: only create_app() and `flask db-upgrade` apply migrations
+        with db_connection() as conn:
+            if conn is not None:
+                check_app_schema(conn)
+    status = 200 if _app_schema_ready else 503
+    return jsonify({'status': 'ok' if status == 200 else 'starting', 'schema_ready': _app_schema_ready}), status
+
+@app.route('/healthz/ready')
+def health_ready():
+    try:
+        conn = db_pool.acquire(timeout=HEALTH_CHECK_TIMEOUT)
+    except mysql.connector.Error as err:
+        return jsonify({'status': 'unavailable', 'error': str(err), 'pool': db_pool.metrics()}), 503
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1")
+        cursor.fetchone()
+        cursor.close()
+    except mysql.connector.Error as err:
+        return jsonify({'status': 'unavailable', 'error': str(err), 'pool': db_pool.metrics()}), 503
+    finally:
+        conn.close()
+    return jsonify({'status': 'ok', 'pool': db_pool.metrics()})
+
+# --- POOL METRICS (MONITORING) ---
+@app.route('/metrics/db-pool')
+def db_pool_metrics():
+    """Exposes pool usage (in use, waits, wait time...) as JSON for monitoring."""
+    return jsonify(db_pool.metrics())
+
+# --- APPROVAL SYNC CONFIG ---
+# Fallback rate per application when a Category has no row in REBATE_RATES
+DEFAULT_REBATE_RATE = 500.00
+
+# --- SCHEMA MIGRATIONS ---
+# Pending migrations are applied by create_app() at startup (once, in the preloading
+# master) and by `flask db-upgrade` -- never on a request's connection, where a slow
+# or failing migration would hold the request and its pooled connection hostage.
+# Set AUTO_MIGRATE=0 to leave schema changes to `flask db-upgrade` alone.
+AUTO_MIGRATE = os.environ.get('AUTO_MIGRATE', '1') == '1'
+
+_app_schema_ready = False
+
+def check_app_schema(conn):
+    """Marks the schema ready once no migration is pending (reads only, never raises)."""
+    global _app_schema_ready
+    try:
+        if not migrations.pending_migrations(conn):
+            _app_schema_ready = True
+    except mysql.connector.Error as err:
+        print(f"Schema check error: {err}")
+    return _app_schema_ready
+
+def ensure_app_schema(conn):
+    """Applies pending migrations at startup; a failure is logged and leaves the app 'starting'."""
+    global _app_schema_ready
+    if _app_schema_ready:
+        return True
+    if not AUTO_MIGRATE:
+        return check_app_schema(conn)
+    try:
+        migrations.upgrade(conn)
+    except Exception as err:
+        # e.g. migration 4 refusing duplicate REBATE_APPROVALS rows: fix the data, then `flask db-upgrade`
+        print(f"Schema migration error: {err}")
+        try:
+            conn.rollback()
+        except mysql.connector.Error:
+            pass
+        return False
+    _app_schema_ready = True
+    return True
+
+@app.cli.command('db-upgrade')
+@click.option('--target', type=int, default=None, help='Stop after this migration version.')
+def db_upgrade_command(target):
+    """Applies pending schema migrations."""
+    conn = mysql.connector.connect(**DB_CONFIG)
+    try:
+        applied = migrations.upgrade(conn, target=target, log=click.echo)
+        click.echo(f"Applied {len(applied)} migration(s)." if applied else "Schema is up to date.")
+    finally:
+        conn.close()
+
+@app.cli.command('db-status')
+def db_status_command():
+    """Lists applied and pending schema migrations."""
+    conn = mysql.connector.connect(**DB_CONFIG)
+    try:
+        pending = {m[0] for m in migrations.pending_migrations(conn)}
+        for version, description, _ in migrations.MIGRATIONS:
+            click.echo(f"{'pending' if version in pending else 'applied':8} {version:4}  {description}")
+    finally:
+        conn.close()
+
+@app.cli.command('db-explain-check')
+def db_explain_check_command():
+    """EXPLAINs every registered route query and exits non-zero on any full table scan."""
+    conn = mysql.connector.connect(**DB_CONFIG)
+    try:
+        failures = migrations.explain_check(conn)
+    finally:
+        conn.close()
+    for name, table in failures:
+        click.echo(f"FULL SCAN  {name}: table {table}")
+    if failures:
+        raise SystemExit(1)
+    click.echo(f"All {len(migrations.ROUTE_QUERIES)} route queries use an index.")
+
+# --- APPROVAL SYNC FUNCTION ---
+def sync_rebate_approvals(full=False):
+    """
+    Creates approval records for approved rebates that don't have one yet, in a
+    single INSERT ... SELECT. Only rebates modified since the last run are scanned
+    unless full=True. Returns {'inserted', 'elapsed_ms', 'high_water_mark'}.
+    """
+    with instrumentation.track('sync_rebate_approvals'):
+        return _sync_rebate_approvals(full)
+
+def _sync_rebate_approvals(full):
+    started = time.perf_counter()
+    result = {'inserted': 0, 'elapsed_ms': 0, 'high_water_mark': None}
+
+    conn = get_db_connection()
+    if conn is None: return result
+    try:
+        cursor = conn.cursor()
+
+        # Take the new mark from the DB clock *before* scanning so nothing slips between runs
+        cursor.execute("SELECT NOW()")
+        run_started_at = cursor.fetchone()[0]
+
+        cursor.execute("SELECT High_Water_Mark FROM SYNC_STATE WHERE Sync_Name = 'rebate_approvals' FOR UPDATE")
+        row = cursor.fetchone()
+        last_mark = None if (full or row is None) else row[0]
+
+        # Approved, MISSING from REBATE_APPROVALS, priced from REBATE_RATES (or the default rate)
+        candidates_where = """
             FROM REBATE R
             LEFT JOIN REBATE_APPROVALS RA ON R.SOP_Number = RA.SOP_Number
             WHERE R.Status = 'Approved' AND RA.SOP_Number IS NULL
         """
-        cursor.execute(find_query)
-        missing = cursor.fetchall()
-
-        if missing:
-            insert_query = """
-                INSERT INTO REBATE_APPROVALS 
-                (SOP_Number, Sponsor_ID, Approved_Amount, Disbursed_Amount_Display, Disbursed_Date, Payment_Date)
-                VALUES (%s, %s, %s, %s, %s, %s)
-            """
-            for app in missing:
-                count = app['Num_Of_Applications'] if app['Num_Of_Applications'] else 1
-                amount = count * 500.00 # Set your default rate here
-                cursor.execute(insert_query, (
-                    app['SOP_Number'], app['Sponsor_ID'], amount, amount, 
-                    app['Submission_Date'], app['Submission_Date']
-                ))
-            conn.commit()
+        insert_query = """
+            INSERT INTO REBATE_APPROVALS 
+            (SOP_Number, Sponsor_ID, Approved_Amount, Disbursed_Amount_Display, Disbursed_Date, Payment_Date)
+            SELECT R.SOP_Number, R.Sponsor_ID,
+                   COALESCE(NULLIF(R.Num_Of_Applications, 0), 1) * COALESCE(RR.Rate_Per_Application, %s),
+                   COALESCE(NULLIF(R.Num_Of_Applications, 0), 1) * COALESCE(RR.Rate_Per_Application, %s),
+                   R.Submission_Date, R.Submission_Date
+            FROM REBATE R
+            LEFT JOIN REBATE_APPROVALS RA ON R.SOP_Number = RA.SOP_Number
+            LEFT JOIN REBATE_RATES RR ON R.Category = RR.Category
+            WHERE R.Status = 'Approved' AND RA.SOP_Number IS NULL
+        """
+        params = [DEFAULT_REBATE_RATE, DEFAULT_REBATE_RATE]
+        if last_mark is None:
+            cursor.execute(insert_query, params)
+            inserted = cursor.rowcount
+        else:
+            # Incremental run: lock just the rebates changed since the mark, so their campaign
+            # totals can be adjusted by delta instead of rebuilding CAMPAIGN_METRICS
+            cursor.execute("SELECT R.SOP_Number" + candidates_where + " AND R.Last_Modified >= %s FOR UPDATE",
+                           (last_mark,))
+            sops = [row[0] for row in cursor.fetchall()]
+            inserted = 0
+            if sops:
+                placeholders = ', '.join(['%s'] * len(sops))
+                campaign_metrics_leaving(cursor, sops)
+                cursor.execute(insert_query + f" AND R.SOP_Number IN ({placeholders})", params + sops)
+                inserted = cursor.rowcount
+                campaign_metrics_entered(cursor, sops)
+
+        elapsed_ms = int((time.perf_counter() - started) * 1000)
+        cursor.execute("""
+            INSERT INTO SYNC_STATE (Sync_Name, High_Water_Mark, Last_Run_At, Rows_Inserted, Duration_Ms)
+            VALUES ('rebate_approvals', %s, NOW(), %s, %s)
+            ON DUPLICATE KEY UPDATE High_Water_Mark = VALUES(High_Water_Mark), Last_Run_At = VALUES(Last_Run_At),
+                                    Rows_Inserted = VALUES(Rows_Inserted), Duration_Ms = VALUES(Duration_Ms)
+        """, (run_started_at, inserted, elapsed_ms))
+        conn.commit()
         cursor.close()
+        if inserted:
+            if last_mark is None:
+                # A full scan may have touched any campaign: recompute them all
+                rebuild_campaign_metrics(conn)
+            report_cache.invalidate('REBATE_APPROVALS')
+
+        result = {'inserted': inserted, 'elapsed_ms': elapsed_ms, 'high_water_mark': run_started_at}
+        print(f"Sync: inserted {inserted} approval records in {elapsed_ms} ms (mark {run_started_at})")
     except Exception as e:
+        conn.rollback()
         print(f"Sync Error: {e}")
     finally:
         conn.close()
+    return result
+
+@app.cli.command('sync-approvals')
+@click.option('--full', is_flag=True, help='Ignore the high-water mark and scan every rebate.')
+def sync_approvals_command(full):
+    """Runs sync_rebate_approvals() from the command line: flask --app Web sync-approvals"""
+    result = sync_rebate_approvals(full=full)
+    click.echo(f"Inserted {result['inserted']} rows in {result['elapsed_ms']} ms.")
 
 # --- ADMIN PASSWORD SETTER ROUTE ---
 @app.route('/admin/set-password', methods=['POST'])
 def admin_set_password():
     """
-    ⚠️ NON-SECURE: Saves the plaintext password directly into the DEPARTMENT_USERS.Password_ID column.
+    Stores a salted hash of the new password in DEPARTMENT_USERS.Password_ID.
     This route assumes an admin form posts to it with 'department_id' and 'new_password'.
     """
     if 'contractor_logged_in' not in session:
@@ -103,10 +513,10 @@ def admin_set_password():
     
     try:
         update_query = "UPDATE DEPARTMENT_USERS SET Password_ID = %s WHERE Department_ID = %s"
-        cursor.execute(update_query, (new_password_plaintext, dept_id))
+        cursor.execute(update_query, (password_hasher.hash(new_password_plaintext), dept_id))
         conn.commit()
         
-        flash(f"Password successfully set (plaintext) for Department ID {dept_id}.", 'success')
+        flash(f"Password successfully set for Department ID {dept_id}.", 'success')
         
     except mysql.connector.Error as e:
         flash(f'Database error setting password: {e}', 'danger')
@@ -142,62 +552,210 @@ def user_login():
     """Renders the standard user login page template."""
     return render_template('user_login.html')
 
+# --- LOGIN RESOLVER ---
+# One round trip finds every account an identifier could belong to. Each branch is an
+# index lookup (Email indexes / APPLICANT primary key) instead of the old
+# `Email = %s OR Department_ID = %s`, and only the columns the login needs are read.
+# Priority keeps the original order: reviewer, then sponsor, then applicant.
+LOGIN_RESOLVER_QUERY = """
+    SELECT 1 AS Priority, 'reviewer' AS Role, Reviewer_ID AS Account_ID, Employee_Name AS Display_Name, Password_ID
+    FROM REVIEWER WHERE Email = %s
+    UNION ALL
+    SELECT 2, 'sponsor', Sponsor_ID, Sponsor_Name, Password_ID
+    FROM APPLICATION_SPONSOR WHERE Email = %s
+    UNION ALL
+    SELECT 3, 'applicant', Department_ID, Department_Name, Password_ID
+    FROM APPLICANT WHERE Email = %s
+"""
+# Only added for numeric identifiers: comparing the INT key to a string like
+# 'jane@hawaii.edu' would cast it to 0 and match the wrong row.
+LOGIN_RESOLVER_BY_DEPARTMENT = """
+    UNION ALL
+    SELECT 4, 'applicant', Department_ID, Department_Name, Password_ID
+    FROM APPLICANT WHERE Department_ID = %s
+"""
+
+# --- LOGIN GUARD CONFIG ---
+# max_failures within window (seconds) locks the identifier out for lockout seconds;
+# negative_ttl: how long an identifier with no account skips the database entirely
+LOGIN_GUARD_CONFIG = {
+    'max_failures': int(os.environ.get('LOGIN_MAX_FAILURES', 5)),
+    'window': int(os.environ.get('LOGIN_FAILURE_WINDOW', 300)),
+    'lockout': int(os.environ.get('LOGIN_LOCKOUT', 300)),
+    'negative_ttl': int(os.environ.get('LOGIN_NEGATIVE_TTL', 30))
+}
+
+login_guard = LoginGuard(**LOGIN_GUARD_CONFIG)
+
+# --- PASSWORD HASHING CONFIG ---
+# scrypt_n is the work factor (a power of two); raise it while `flask hash-benchmark`
+# stays under the login p99 budget. workers caps concurrent hashes per process; a login
+# that waits longer than queue_timeout seconds for one gets a 503 with Retry-After.
+PASSWORD_HASH_CONFIG = {
+    'n': int(os.environ.get('PASSWORD_SCRYPT_N', 2 ** 14)),
+    'r': int(os.environ.get('PASSWORD_SCRYPT_R', 8)),
+    'p': int(os.environ.get('PASSWORD_SCRYPT_P', 1)),
+    'workers': int(os.environ.get('PASSWORD_HASH_WORKERS', 2)),
+    'queue_timeout': float(os.environ.get('PASSWORD_HASH_QUEUE_TIMEOUT', 2))
+}
+LOGIN_P99_BUDGET_MS = float(os.environ.get('LOGIN_P99_BUDGET_MS', 250))
+
+password_hasher = PasswordHasher(**PASSWORD_HASH_CONFIG)
+
+@app.errorhandler(HashingBusy)
+def hashing_busy(err):
+    return ("Too many sign-ins at once. Please try again in a moment.", 503,
+            {'Retry-After': str(err.retry_after)})
+
+# Where each login role's credentials live (table, key column) for rehashing
+CREDENTIAL_TABLES = {
+    'reviewer': ('REVIEWER', 'Reviewer_ID'),
+    'sponsor': ('APPLICATION_SPONSOR', 'Sponsor_ID'),
+    'applicant': ('APPLICANT', 'Department_ID'),
+}
+
+def resolve_login_identity(identifier):
+    """Returns every account matching the identifier (best match first), or None if the DB is down."""
+    query = LOGIN_RESOLVER_QUERY
+    params = [identifier, identifier, identifier]
+    if identifier.isdigit():
+        query += LOGIN_RESOLVER_BY_DEPARTMENT
+        params.append(int(identifier))
+    query += " ORDER BY Priority"
+
+    conn = get_db_connection()
+    if conn is None: return None
+    try:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(query, params)
+        identities = cursor.fetchall()
+        cursor.close()
+        return identities
+    finally:
+        conn.close()
+
+def upgrade_stored_password(identity, password):
+    """Replaces a plaintext (or outdated) Password_ID with a fresh hash after a successful login."""
+    table, key_column = CREDENTIAL_TABLES[identity['Role']]
+    try:
+        new_hash = password_hasher.hash(password)
+    except HashingBusy:
+        return  # The login itself succeeded; the upgrade happens on a later one
+    conn = get_db_connection()
+    if conn is None: return
+    try:
+        cursor = conn.cursor()
+        # Only overwrite the value we just verified, in case it changed meanwhile
+        cursor.execute(
+            f"UPDATE {table} SET Password_ID = %s WHERE {key_column} = %s AND Password_ID = %s",
+            (new_hash, identity['Account_ID'], identity['Password_ID'])
+        )
+        conn.commit()
+        cursor.close()
+    except mysql.connector.Error as err:
+        conn.rollback()
+        print(f"Password Upgrade Error: {err}")
+    finally:
+        conn.close()
+
+def start_login_session(identity):
+    """Fills the session for the matched account and returns the dashboard to send them to."""
+    session.clear()
+    if identity['Role'] == 'reviewer':
+        session['contractor_logged_in'] = True
+        session['reviewer_id'] = identity['Account_ID']
+        session['username'] = identity['Display_Name']
+        return url_for('contractor_dashboard')
+    if identity['Role'] == 'sponsor':
+        session['sponsor_logged_in'] = True
+        session['sponsor_id'] = identity['Account_ID']
+        session['sponsor_name'] = identity['Display_Name']
+        return url_for('sponsor_dashboard')
+    session['user_logged_in'] = True
+    session['user_id'] = identity['Account_ID']
+    session['user_username'] = identity['Display_Name']
+    return url_for('user_dashboard')
+
 @app.route('/login-submit', methods=['POST'])
 def login_submit():
-    identifier = request.form.get('username').strip() # .strip() removes accidental spaces
-    password_attempt = request.form.get('password').strip()
-    
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+    identifier = (request.form.get('username') or '').strip() # .strip() removes accidental spaces
+    password_attempt = (request.form.get('password') or '').strip()
+
+    # Determine which page to send them back to so they don't get "lost"
+    # If they used an email, they were likely a contractor/sponsor
+    login_page = url_for('contractor_login') if '@' in identifier else url_for('user_login')
+
+    if not identifier or not password_attempt:
+        flash('Invalid username or password. Please try again.', 'danger')
+        return redirect(login_page)
+
+    retry_after = login_guard.retry_after(identifier)
+    if retry_after:
+        flash(f'Too many failed attempts. Please try again in {retry_after} seconds.', 'danger')
+        return redirect(login_page)
 
     try:
-        # 1. Check Reviewers
-        cursor.execute("SELECT * FROM REVIEWER WHERE Email = %s", (identifier,))
-        reviewer = cursor.fetchone()
-        if reviewer and str(reviewer['Password_ID']) == str(password_attempt):
-            session.clear()
-            session['contractor_logged_in'] = True
-            session['username'] = reviewer['Employee_Name']
-            return redirect(url_for('contractor_dashboard'))
-
-        # 2. Check Sponsors
-        cursor.execute("SELECT * FROM APPLICATION_SPONSOR WHERE Email = %s", (identifier,))
-        sponsor = cursor.fetchone()
-        if sponsor and str(sponsor['Password_ID']) == str(password_attempt):
-            session.clear()
-            session['sponsor_logged_in'] = True
-            session['sponsor_id'] = sponsor['Sponsor_ID']
-            session['sponsor_name'] = sponsor['Sponsor_Name']
-            return redirect(url_for('sponsor_dashboard'))
-
-        # 3. Check Applicants (Users)
-        # We check both Email and Department_ID
-        cursor.execute("SELECT * FROM APPLICANT WHERE Email = %s OR Department_ID = %s", (identifier, identifier))
-        applicant = cursor.fetchone()
-        if applicant and str(applicant['Password_ID']) == str(password_attempt):
-            session.clear()
-            session['user_logged_in'] = True
-            session['user_id'] = applicant['Department_ID']
-            session['user_username'] = applicant['Department_Name']
-            return redirect(url_for('user_dashboard'))
+        # Identifiers that just matched nothing don't need another trip to MySQL
+        if login_guard.is_known_unknown(identifier):
+            identities = []
+        else:
+            identities = resolve_login_identity(identifier)
+            if identities is None:
+                flash('Database connection error.', 'danger')
+                return redirect(login_page)
+            if not identities:
+                login_guard.remember_unknown(identifier)
+
+        for identity in identities:
+            matches, needs_rehash = password_hasher.verify(identity['Password_ID'], password_attempt)
+            if matches:
+                login_guard.record_success(identifier)
+                if needs_rehash:
+                    upgrade_stored_password(identity, password_attempt)
+                return redirect(start_login_session(identity))
+        if not identities:
+            # Same hashing cost as a wrong password, so response time doesn't reveal accounts
+            password_hasher.verify_dummy(password_attempt)
 
         # --- IF WE GET HERE, LOGIN FAILED ---
+        login_guard.record_failure(identifier)
         flash('Invalid username or password. Please try again.', 'danger')
-        
-        # Determine which page to send them back to so they don't get "lost"
-        # If they used an email, they were likely a contractor/sponsor
-        if '@' in identifier:
-            return redirect(url_for('contractor_login'))
-        else:
-            return redirect(url_for('user_login'))
+        return redirect(login_page)
 
+    except HashingBusy:
+        raise  # -> 503 with Retry-After (hashing_busy)
     except Exception as e:
         print(f"Login Error: {e}")
         flash('An error occurred during login.', 'danger')
         return redirect(url_for('index'))
-    finally:
-        cursor.close()
-        conn.close()
+
+@app.cli.command('revoke-sessions')
+@click.argument('role', type=click.Choice(['reviewer', 'sponsor', 'applicant']))
+@click.argument('account_id')
+def revoke_sessions_command(role, account_id):
+    """Logs an account out everywhere, e.g. when a reviewer is offboarded: revoke-sessions reviewer 7"""
+    removed = app.session_interface.revoke(f"{role}:{account_id}")
+    click.echo(f"Revoked {removed} session(s) for {role} {account_id}.")
+
+@app.cli.command('purge-sessions')
+def purge_sessions_command():
+    """Deletes expired sessions (also happens occasionally on its own)."""
+    removed = app.session_interface.backend.purge_expired()
+    click.echo(f"Purged {removed} expired session(s).")
+
+@app.cli.command('hash-benchmark')
+@click.option('--samples', type=int, default=20, help='Hashes timed per work factor.')
+def hash_benchmark_command(samples):
+    """Times scrypt work factors against the login p99 budget (LOGIN_P99_BUDGET_MS)."""
+    results = password_hasher.benchmark(samples=samples)
+    fitting = [n for n, t in results.items() if t['p99_ms'] <= LOGIN_P99_BUDGET_MS]
+    for n, timing in results.items():
+        marker = '  <- current' if n == password_hasher.n else ''
+        click.echo(f"n={n:<7} p50 {timing['p50_ms']:>8} ms   p99 {timing['p99_ms']:>8} ms{marker}")
+    if fitting:
+        click.echo(f"Largest work factor within the {LOGIN_P99_BUDGET_MS:g} ms budget: PASSWORD_SCRYPT_N={max(fitting)}")
+    else:
+        click.echo(f"No tested work factor fits the {LOGIN_P99_BUDGET_MS:g} ms budget.")
 
 # ==============================================================================
 # 🏠 DASHBOARD & CORE VIEW ROUTES
@@ -205,6 +763,7 @@ def login_submit():
 
 # --- INDEX ROUTE ---
 @app.route("/")
+@page_cache.cached
 def index():
     """Renders the appropriate dashboard based on exact session type."""
     if session.get('sponsor_logged_in'):
@@ -219,42 +778,49 @@ def index():
 # --- CONTRACTOR DASHBOARD ---
 @app.route('/dashboard')
 def contractor_dashboard():
+    counts = {'Pending': 0, 'Approved': 0, 'Rejected': 0}
+    feed_items = []
+
+    # Two tiny reads (a handful of counter rows, five ring rows by primary key): back to
+    # back on one pooled connection, rather than a thread hop and a connection each
     conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+    if conn is None:
+        return render_template('contractor_dashboard.html', counts=counts, feed_items=feed_items)
+    try:
+        cursor = conn.cursor(dictionary=True)
+        # 1. COUNTS (kept current by the write routes, see STATUS_COUNTS)
+        cursor.execute("SELECT Status, Total FROM STATUS_COUNTS")
+        rows = cursor.fetchall()
+        # 2. RECENT ACTIVITY (newest entries of the RECENT_ACTIVITY ring)
+        cursor.execute("""
+            SELECT Building, Category, Status, Changed_At 
+            FROM RECENT_ACTIVITY 
+            ORDER BY Activity_ID DESC 
+            LIMIT 5
+        """)
+        recent_data = cursor.fetchall()
+        cursor.close()
+    except mysql.connector.Error as err:
+        print(f"Database query error fetching contractor dashboard: {err}")
+        return render_template('contractor_dashboard.html', counts=counts, feed_items=feed_items)
+    finally:
+        conn.close()
 
-    # 1. GET COUNTS (This fixes the 4, 6, 1 issue)
-    cursor.execute("SELECT Status, COUNT(*) as count FROM REBATE GROUP BY Status")
-    rows = cursor.fetchall()
-    counts = {'Pending': 0, 'Approved': 0, 'Rejected': 0}
     for row in rows:
         stat = row['Status']
         if stat == 'Approved':
-            counts['Approved'] = row['count']
+            counts['Approved'] = row['Total']
         elif stat == 'Rejected':
-            counts['Rejected'] = row['count']
+            counts['Rejected'] = row['Total']
         else:
             # Captures 'Pending' AND 'Request revision'
-            counts['Pending'] += row['count']
-
-    # 2. GET RECENT ACTIVITY (This fixes the deleted feed)
-    # We use Submission_Date because that is what's in your phpMyAdmin
-    cursor.execute("""
-        SELECT Building, Category, Status, Submission_Date 
-        FROM REBATE 
-        ORDER BY Submission_Date DESC 
-        LIMIT 5
-    """)
-    recent_data = cursor.fetchall()
+            counts['Pending'] += row['Total']
 
-    feed_items = []
     for app in recent_data:
         # This builds the string that your HTML loop is looking for
-        msg = f"<strong>{app['Building']}</strong> ({app['Category']}) status changed to <strong>{app['Status']}</strong> on {app['Submission_Date']}"
+        msg = f"<strong>{app['Building']}</strong> ({app['Category']}) status changed to <strong>{app['Status']}</strong> on {app['Changed_At']}"
         feed_items.append(msg)
 
-    cursor.close()
-    conn.close()
-
     return render_template('contractor_dashboard.html', counts=counts, feed_items=feed_items)
 
 # --- USER DASHBOARD ---
@@ -280,20 +846,9 @@ def user_dashboard():
         return render_template('user_dashboard.html', username=username, applications=user_applications)
 
     try:
-        cursor = conn.cursor(dictionary=True)
-        
         # NOTE: Status filtering is omitted because we want ALL records for this user (Draft, Pending, Approved, etc.)
-        query = """
-        SELECT SOP_Number, Category, Status, Building, Submission_Date, Office_Notes
-        FROM REBATE
-        WHERE Department_ID = %s 
-        ORDER BY Submission_Date DESC
-        LIMIT 10;
-        """
         # --- FIX 1: Pass the numeric 'department_id' instead of the string 'username' ---
-        cursor.execute(query, (department_id,)) 
-        user_applications = cursor.fetchall()
-        cursor.close()
+        user_applications = queries.fetch_all(conn, queries.USER_APPLICATIONS, (department_id,))
         
     except mysql.connector.Error as err:
         print(f"Database query error fetching user dashboard applications from REBATE: {err}")
@@ -327,6 +882,14 @@ def delete_draft(sop_number):
     try:
         cursor = conn.cursor()
         
+        # Lock the draft (if it is this user's draft) so its campaign contribution can be taken out
+        cursor.execute("""
+            SELECT SOP_Number FROM REBATE
+            WHERE SOP_Number = %s AND Status = 'Draft' AND Department_ID = %s FOR UPDATE
+        """, (sop_number, department_id))
+        if cursor.fetchone():
+            campaign_metrics_leaving(cursor, sop_number)
+
         # --- CRITICAL: Delete Query ---
         # Ensures that only records with the 'Draft' status AND the correct Department_ID are deleted.
         sql = """
@@ -334,10 +897,16 @@ def delete_draft(sop_number):
         WHERE SOP_Number = %s AND Status = 'Draft' AND Department_ID = %s
         """
         cursor.execute(sql, (sop_number, department_id))
+        deleted = cursor.rowcount
+        if deleted == 1:
+            adjust_status_count(cursor, 'Draft', -1)
+            # The blobs stay (other applications may share them); `flask purge-uploads` sweeps orphans
+            cursor.execute("DELETE FROM ATTACHMENT WHERE SOP_Number = %s", (sop_number,))
         conn.commit()
+        report_cache.invalidate('REBATE')
         
         # Check if any rows were actually deleted
-        if cursor.rowcount == 1:
+        if deleted == 1:
             flash(f"Draft application {sop_number} has been deleted.", 'success')
         else:
             # This handles attempts to delete a submitted or approved application, or another user's draft.
@@ -357,46 +926,277 @@ def delete_draft(sop_number):
     return redirect(url_for('user_dashboard'))
 
 # --- VIEW ALL APPLICATIONS (COMPREHENSIVE VERSION) ---
-@app.route('/view-all-applications')
-def view_all_applications():
-    status_filter = request.args.get('status_filter', 'all')
-    conn = get_db_connection()
-    
-    # Base Query with the JOIN
-    query = """
-        SELECT R.*, RA.Approved_Amount, RA.Payment_Date 
-        FROM REBATE R 
-        LEFT JOIN REBATE_APPROVALS RA ON R.SOP_Number = RA.SOP_Number
-    """
+APPLICATIONS_PAGE_SIZE = 50
+APPLICATIONS_MAX_PAGE_SIZE = 200
+
+SOP_NUMBER_MAX = 2**31 - 1  # REBATE.SOP_Number is a signed INT
+
+def parse_sop_number(text):
+    """The SOP # typed into a search box, or None if it isn't one (prepared statements can't bind huge ints)."""
+    if not text.isdigit() or len(text) > 10:
+        return None
+    number = int(text)
+    return number if number <= SOP_NUMBER_MAX else None
 
-    # Filter Logic
+def build_application_filters(status_filter, search_text, category, building):
+    """Turns the hub's filter inputs into a WHERE clause + params shared by the page and totals queries."""
+    clauses = []
+    params = []
+
+    # Status dropdown
     if status_filter == 'pending':
         # Shows applications that are still awaiting a decision
-        query += " WHERE R.Status = 'Pending'"
+        clauses.append("R.Status = 'Pending'")
     elif status_filter == 'disbursed':
         # Approved and already paid
-        query += " WHERE R.Status = 'Approved' AND RA.Payment_Date IS NOT NULL"
+        clauses.append("R.Status = 'Approved' AND RA.Payment_Date IS NOT NULL")
     elif status_filter == 'pending_disbursement':
         # Approved but not yet paid
-        query += " WHERE R.Status = 'Approved' AND RA.Payment_Date IS NULL"
+        clauses.append("R.Status = 'Approved' AND RA.Payment_Date IS NULL")
     elif status_filter == 'rejected':
         # Denied applications
-        query += " WHERE R.Status = 'Rejected'"
+        clauses.append("R.Status = 'Rejected'")
+
+    # Quick search (replaces the old in-browser table scan): SOP #, Building or Category
+    if search_text:
+        like = f"%{search_text}%"
+        expression = queries.boolean_search(search_text)
+        sop_number = parse_sop_number(search_text)
+        if sop_number is not None:
+            clauses.append("(R.SOP_Number = %s OR R.Building LIKE %s OR R.Category LIKE %s)")
+            params.extend([sop_number, like, like])
+        elif expression:
+            # Word prefixes through the FULLTEXT index (also covers the project description)
+            clauses.append(queries.SEARCH_MATCH)
+            params.append(expression)
+        else:
+            # Too short for the index (e.g. 'B2'): scan as before
+            clauses.append("(R.Building LIKE %s OR R.Category LIKE %s)")
+            params.extend([like, like])
+
+    # Column filters
+    if category:
+        clauses.append("R.Category = %s")
+        params.append(category)
+    if building:
+        clauses.append("R.Building = %s")
+        params.append(building)
+
+    where_sql = (" WHERE " + " AND ".join(clauses)) if clauses else ""
+    return where_sql, params
 
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute(query)
-    applications = cursor.fetchall()
+@app.route('/view-all-applications')
+@async_view
+async def view_all_applications():
+    status_filter = request.args.get('status_filter', 'all')
+    search_text = request.args.get('q', '').strip()
+    category = request.args.get('category', '').strip()
+    building = request.args.get('building', '').strip()
+
+    # Keyset cursor: 'after' pages forward (older SOPs), 'before' pages back (newer SOPs)
+    after = request.args.get('after', type=int)
+    before = request.args.get('before', type=int)
+    per_page = request.args.get('per_page', APPLICATIONS_PAGE_SIZE, type=int)
+    per_page = max(1, min(per_page, APPLICATIONS_MAX_PAGE_SIZE))
+
+    applications = []
+    total_count = 0
+    total_committed = 0.0
+    next_cursor = None
+    prev_cursor = None
+
+    where_sql, params = build_application_filters(status_filter, search_text, category, building)
+
+    # 1. Totals come from one aggregate query (queries.APPLICATION_TOTALS), not from the page we render
+    # 2. One page of rows, seeking on SOP_Number instead of OFFSET
+    page_clauses = []
+    page_params = list(params)
+    if before is not None:
+        page_clauses.append("R.SOP_Number > %s")
+        page_params.append(before)
+        order_sql = " ORDER BY R.SOP_Number ASC"
+    else:
+        if after is not None:
+            page_clauses.append("R.SOP_Number < %s")
+            page_params.append(after)
+        order_sql = " ORDER BY R.SOP_Number DESC"
 
-    # Calculate Totals Safely
-    total_count = len(applications)
-    total_committed = sum(float(app.get('Approved_Amount') or 0) for app in applications)
+    page_where = where_sql
+    if page_clauses:
+        page_where += (" AND " if where_sql else " WHERE ") + " AND ".join(page_clauses)
+
+    # Fetch one extra row to learn whether another page exists
+    page_params.append(per_page + 1)
+
+    try:
+        # The COUNT/SUM and the page don't depend on each other: run them together
+        totals, applications = await asyncio.gather(
+            async_db.run(queries.fetch_one, queries.APPLICATION_TOTALS, params, where_sql),
+            async_db.run(queries.fetch_all, queries.APPLICATION_PAGE, page_params,
+                         page_where + order_sql + " LIMIT %s")
+        )
+        total_count = totals.total_count
+        total_committed = float(totals.total_committed or 0)
+
+        has_more = len(applications) > per_page
+        applications = applications[:per_page]
+        if before is not None:
+            applications.reverse()  # Back to newest-first for display
+
+        if applications:
+            first_sop = applications[0].SOP_Number
+            last_sop = applications[-1].SOP_Number
+            if before is not None:
+                prev_cursor = first_sop if has_more else None
+                next_cursor = last_sop
+            else:
+                next_cursor = last_sop if has_more else None
+                prev_cursor = first_sop if after is not None else None
+
+    except mysql.connector.Error as err:
+        print(f"Database query error fetching application hub: {err}")
+        applications = []
+        flash('Could not connect to the database.' if isinstance(err, DatabaseUnavailable)
+              else 'Error fetching applications.', 'error')
+
+    # Filters carried through the pagination links
+    filter_args = {'status_filter': status_filter, 'q': search_text,
+                   'category': category, 'building': building, 'per_page': per_page}
+    filter_args = {k: v for k, v in filter_args.items() if v not in ('', None)}
 
     return render_template('view_all_applications.html', 
                            applications=applications, 
                            current_filter=status_filter,
+                           search_text=search_text,
+                           category_filter=category,
+                           building_filter=building,
+                           filter_args=filter_args,
+                           next_cursor=next_cursor,
+                           prev_cursor=prev_cursor,
                            total_count=total_count,
                            total_committed=total_committed)
 
+# --- FULL-TEXT SEARCH ---
+# Ranked search over Building, Category and the project description (FULLTEXT index
+# from migration 8, kept current by InnoDB as the submit/update routes commit).
+# Reviewers search everything, sponsors only the applications they sponsor.
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE = 50
+TYPEAHEAD_LIMIT = 8
+TYPEAHEAD_TTL = 60
+
+def search_scope():
+    """(extra WHERE, params) limiting search to what the session may see, or None if not logged in."""
+    if session.get('contractor_logged_in'):
+        return "", []
+    if session.get('sponsor_logged_in'):
+        return " AND R.Sponsor_ID = %s", [session.get('sponsor_id')]
+    return None
+
+def fetch_sop_match(conn, search_text, scope_sql, scope_params):
+    """An exact SOP # hit for a numeric query, listed above the ranked results."""
+    sop_number = parse_sop_number(search_text)
+    if sop_number is None:
+        return None
+    return queries.fetch_one(conn, queries.APPLICATION_BY_SOP, [sop_number] + scope_params, scope_sql)
+
+@app.route('/search')
+def search_applications():
+    scope = search_scope()
+    if scope is None:
+        return redirect(url_for('contractor_login'))
+    scope_sql, scope_params = scope
+
+    search_text = request.args.get('q', '').strip()
+    page = max(1, min(request.args.get('page', 1, type=int), SEARCH_MAX_PAGE))
+    expression = queries.boolean_search(search_text)
+    results = []
+    has_more = False
+
+    conn = get_db_connection() if search_text else None
+    if conn is not None:
+        try:
+            if expression:
+                # One extra row tells us whether there is a next page
+                results = queries.fetch_all(
+                    conn, queries.APPLICATION_SEARCH,
+                    [expression, expression] + scope_params + [SEARCH_PAGE_SIZE + 1, (page - 1) * SEARCH_PAGE_SIZE],
+                    scope_sql + " ORDER BY Score DESC, R.SOP_Number DESC LIMIT %s OFFSET %s")
+                has_more = len(results) > SEARCH_PAGE_SIZE
+                results = results[:SEARCH_PAGE_SIZE]
+            exact = fetch_sop_match(conn, search_text, scope_sql, scope_params) if page == 1 else None
+            if exact is not None:
+                results = [exact] + [row for row in results if row.SOP_Number != exact.SOP_Number]
+        except mysql.connector.Error as err:
+            print(f"Database query error searching applications: {err}")
+            flash('Error searching applications.', 'error')
+        finally:
+            conn.close()
+    elif search_text:
+        flash('Could not connect to the database.', 'error')
+
+    if request.args.get('format') == 'json':
+        return jsonify({'q': search_text, 'page': page, 'has_more': has_more,
+                        'results': [row._asdict() for row in results]})
+
+    return render_template('search_results.html',
+                           results=results,
+                           search_text=search_text,
+                           page=page,
+                           has_more=has_more,
+                           too_short=bool(search_text) and not expression and parse_sop_number(search_text) is None,
+                           can_review=bool(session.get('contractor_logged_in')))
+
+@app.route('/search/typeahead')
+def search_typeahead():
+    """Top matches for the search box as JSON; repeated prefixes are answered from the report cache."""
+    scope = search_scope()
+    if scope is None:
+        return jsonify({'error': 'Not logged in.'}), 401
+    scope_sql, scope_params = scope
+
+    started = time.perf_counter()
+    search_text = request.args.get('q', '').strip()
+    expression = queries.boolean_search(search_text)
+
+    def compute():
+        conn = get_db_connection()
+        if conn is None:
+            return None
+        try:
+            suggestions = []
+            exact = fetch_sop_match(conn, search_text, scope_sql, scope_params)
+            if exact is not None:
+                suggestions.append(exact)
+            if expression:
+                rows = queries.fetch_all(conn, queries.SEARCH_TYPEAHEAD,
+                                         [expression, expression] + scope_params + [TYPEAHEAD_LIMIT],
+                                         scope_sql + " ORDER BY Score DESC, R.SOP_Number DESC LIMIT %s")
+                suggestions.extend(row for row in rows if exact is None or row.SOP_Number != exact.SOP_Number)
+            # Plain dicts: the Redis backend pickles cached values
+            return [{'SOP_Number': row.SOP_Number, 'Building': row.Building,
+                     'Category': row.Category, 'Status': row.Status}
+                    for row in suggestions[:TYPEAHEAD_LIMIT]]
+        except mysql.connector.Error as err:
+            print(f"Database query error in search typeahead: {err}")
+            return None
+        finally:
+            conn.close()
+
+    suggestions = []
+    sop_number = parse_sop_number(search_text)
+    if expression or sop_number is not None:
+        # The SOP # is part of the key: '123' lists SOP 123 first, '123 the' doesn't
+        suggestions = report_cache.get_or_compute(
+            'search_typeahead', {'q': expression, 'sop': sop_number, 'scope': scope_params},
+            compute, tags=('REBATE',), ttl=TYPEAHEAD_TTL) or []
+
+    response = jsonify({'q': search_text, 'suggestions': suggestions,
+                        'took_ms': round((time.perf_counter() - started) * 1000, 1)})
+    response.cache_control.private = True
+    response.cache_control.max_age = 30
+    return response
+
 # --- SPONSOR APPROVALS VIEW --- (FUNCTIONAL ROUTE)
 @app.route('/sponsor-approvals')
 def sponsor_approvals():
@@ -411,36 +1211,33 @@ def sponsor_approvals():
         return redirect(url_for('contractor_login'))
     
     filter_value = request.args.get('status_filter', 'all')
+
+    # 2. DATA LOGIC: If it's a Sponsor, filter by their ID. If Contractor, show everything.
+    if is_sponsor:
+        sponsor_id = session.get('sponsor_id')
+        where = " WHERE Sponsor_ID = %s"
+        params = (sponsor_id,)
+    else:
+        # It's a Contractor, show ALL sponsor records
+        where = " WHERE 1=1"
+        params = ()
+
+    # 3. APPLY FILTERS (Status)
+    if filter_value == 'pending':
+        where += " AND Payment_Date IS NULL"
+    elif filter_value == 'approved':
+        where += " AND Payment_Date IS NOT NULL"
+
+    approvals = []
     conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    
-    try:
-        # 2. DATA LOGIC: If it's a Sponsor, filter by their ID. If Contractor, show everything.
-        if is_sponsor:
-            sponsor_id = session.get('sponsor_id')
-            query = "SELECT * FROM REBATE_APPROVALS WHERE Sponsor_ID = %s"
-            params = (sponsor_id,)
-        else:
-            # It's a Contractor, show ALL sponsor records
-            query = "SELECT * FROM REBATE_APPROVALS WHERE 1=1"
-            params = ()
-
-        # 3. APPLY FILTERS (Status)
-        if filter_value == 'pending':
-            query += " AND Payment_Date IS NULL"
-        elif filter_value == 'approved':
-            query += " AND Payment_Date IS NOT NULL"
-        
-        query += " ORDER BY SOP_Number DESC"
-        
-        cursor.execute(query, params)
-        approvals = cursor.fetchall()
-        
-    except mysql.connector.Error as err:
-        print(f"Report Error: {err}")
-        approvals = []
-    finally:
-        conn.close()
+    if conn is not None:
+        try:
+            approvals = queries.fetch_all(conn, queries.SPONSOR_APPROVALS, params,
+                                          suffix=where + " ORDER BY SOP_Number DESC")
+        except mysql.connector.Error as err:
+            print(f"Report Error: {err}")
+        finally:
+            conn.close()
 
     return render_template('sponsor_approvals.html', 
                            approvals=approvals, 
@@ -453,22 +1250,15 @@ def sponsor_dashboard():
         return redirect(url_for('contractor_login'))
     
     sponsor_id = session.get('sponsor_id')
+    apps = []
     conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    
-    # ADDED R.Office_Notes to the SELECT list below
-    query = """
-        SELECT R.SOP_Number, R.Category, R.Building, R.Status, R.Office_Notes,
-               RA.Payment_Date, RA.Approved_Amount
-        FROM REBATE R
-        LEFT JOIN REBATE_APPROVALS RA ON R.SOP_Number = RA.SOP_Number
-        WHERE R.Sponsor_ID = %s
-        ORDER BY R.Submission_Date DESC
-    """
-    
-    cursor.execute(query, (sponsor_id,))
-    apps = cursor.fetchall()
-    conn.close()
+    if conn is not None:
+        try:
+            apps = queries.fetch_all(conn, queries.SPONSOR_APPLICATIONS, (sponsor_id,))
+        except mysql.connector.Error as err:
+            print(f"Database query error fetching sponsor dashboard: {err}")
+        finally:
+            conn.close()
     
     return render_template('sponsor_dashboard.html', 
                            applications=apps, 
@@ -504,6 +1294,11 @@ def submit_eia():
     if 'contractor_logged_in' not in session:
         return redirect(url_for('contractor_login'))
     
+    try:
+        uploads = claimed_uploads()
+    except UploadError as err:
+        return f"Attachment error: {err}", 400
+
     conn = get_db_connection()
     if conn is None:
         return "Database connection error. Application not saved.", 500
@@ -524,7 +1319,13 @@ def submit_eia():
         data = (category, 'Pending', building, department_id, sponsor_id)
         
         cursor.execute(sql, data)
+        sop_number = cursor.lastrowid
+        status_entered(cursor, sop_number)
+        record_attachments(cursor, sop_number, uploads)
+        campaign_metrics_entered(cursor, sop_number)
         conn.commit()
+        report_cache.invalidate('REBATE')
+        release_uploads(uploads)
         cursor.close()
         
         return redirect(url_for('contractor_dashboard'))
@@ -571,6 +1372,13 @@ def user_submit_eia():
         flash("Validation Error: Project description must be at least 10 characters.", 'warning')
         return redirect(url_for('user_new_eia_application'))
 
+    # Attachments were uploaded (and checked) while the form was being filled in
+    try:
+        uploads = claimed_uploads()
+    except UploadError as err:
+        flash(f"Attachment Error: {err}", 'error')
+        return redirect(url_for('user_new_eia_application'))
+
     # --- 3. DATABASE OPERATIONS ---
     conn = get_db_connection()
     if conn is None:
@@ -589,7 +1397,13 @@ def user_submit_eia():
         data = (category, 'Pending', building, department_id, sponsor_id, applicant_description)
         
         cursor.execute(sql, data)
+        sop_number = cursor.lastrowid
+        status_entered(cursor, sop_number)
+        record_attachments(cursor, sop_number, uploads)
+        campaign_metrics_entered(cursor, sop_number)
         conn.commit()
+        report_cache.invalidate('REBATE')
+        release_uploads(uploads)
         cursor.close()
         
         flash("Application submitted successfully.", 'success')
@@ -614,6 +1428,12 @@ def user_save_draft():
     """
     if 'user_logged_in' not in session:
         return redirect(url_for('user_login'))
+
+    try:
+        uploads = claimed_uploads()
+    except UploadError as err:
+        flash(f"Attachment Error: {err}", 'error')
+        return redirect(url_for('user_new_eia_application'))
     
     conn = get_db_connection()
     if conn is None:
@@ -648,7 +1468,13 @@ def user_save_draft():
         )
         
         cursor.execute(sql, data)
+        sop_number = cursor.lastrowid
+        status_entered(cursor, sop_number)
+        record_attachments(cursor, sop_number, uploads)
+        campaign_metrics_entered(cursor, sop_number)
         conn.commit()
+        report_cache.invalidate('REBATE')
+        release_uploads(uploads)
         cursor.close()
         
         flash("Your application draft has been saved. You can continue editing later.", 'success')
@@ -671,20 +1497,20 @@ def review_application(application_id):
         return redirect(url_for('contractor_login'))
 
     conn = get_db_connection()
+    if conn is None:
+        return "Database connection error.", 503
     try:
-        cursor = conn.cursor(dictionary=True)
-        
-        query = """
-        SELECT 
-            R.SOP_Number, R.Category, R.Building, R.Department_ID, R.Status, R.Office_Notes,
-            RA.Approved_Amount, RA.Start_Date AS Decision_Date
-        FROM REBATE R
-        LEFT JOIN REBATE_APPROVALS RA ON R.SOP_Number = RA.SOP_Number
-        WHERE R.SOP_Number = %s;
-        """
-        cursor.execute(query, (application_id,))
-        application_details = cursor.fetchone()
-        cursor.close()
+        application_details = queries.fetch_one(conn, queries.APPLICATION_DETAILS, (application_id,))
+        attachments = queries.fetch_all(conn, queries.ATTACHMENTS_FOR_SOP, (application_id,))
+
+        previews = set()
+        for attachment in attachments:
+            if preview_cache.available(attachment.Sha256):
+                previews.add(attachment.Sha256)
+            else:
+                # Evicted or never rendered: queue it, the file link works meanwhile
+                preview_cache.schedule(attachment.Sha256, attachment.Content_Type,
+                                       upload_store.blob_path(attachment.Sha256))
         
         if not application_details:
             return "Application not found.", 404
@@ -695,9 +1521,25 @@ def review_application(application_id):
     finally:
         conn.close()
 
-    return render_template('application_review_form.html', details=application_details)
+    return render_template('application_review_form.html', details=application_details, attachments=attachments,
+                           previews=previews)
 
 # --- PROCESS REVIEW DECISION (POST) ---
+# REBATE_APPROVALS holds one row per SOP (uq_approvals_sop): approving again -- after a
+# revision request, or after the sync already created the row -- updates it instead.
+# Payment columns are left alone so an earlier disbursement isn't lost.
+SQL_UPSERT_APPROVAL = """
+    INSERT INTO REBATE_APPROVALS
+    (Approved_Amount, Office_Notes, Start_Date, Reviewer_ID, Sponsor_ID, SOP_Number)
+    VALUES (%s, %s, CURDATE(), %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        Approved_Amount = VALUES(Approved_Amount),
+        Office_Notes = VALUES(Office_Notes),
+        Start_Date = VALUES(Start_Date),
+        Reviewer_ID = VALUES(Reviewer_ID),
+        Sponsor_ID = VALUES(Sponsor_ID)
+"""
+
 @app.route('/process-decision/<string:application_id>', methods=['POST'])
 def process_decision(application_id):
     """
@@ -735,7 +1577,10 @@ def process_decision(application_id):
         # --- 2. Update the REBATE table (Status and Notes) ---
         sql_update_rebate = "UPDATE REBATE SET Status = %s, Office_Notes = %s WHERE SOP_Number = %s"
         data_update_rebate = (new_status, notes, application_id)
+        previous = status_leaving(cursor, application_id)
+        campaign_metrics_leaving(cursor, application_id)
         cursor.execute(sql_update_rebate, data_update_rebate)
+        status_entered(cursor, application_id, previous)
 
         
         # --- 3. If Approved, Create a Record in REBATE_APPROVALS ---
@@ -749,12 +1594,7 @@ def process_decision(application_id):
             
             sponsor_id = rebate_details.get('Sponsor_ID') if rebate_details else None
             
-            # Insert into the REBATE_APPROVALS table
-            sql_insert_approval = """
-            INSERT INTO REBATE_APPROVALS
-            (Approved_Amount, Office_Notes, Start_Date, Reviewer_ID, Sponsor_ID, SOP_Number)
-            VALUES (%s, %s, CURDATE(), %s, %s, %s) 
-            """
+            # Insert (or update) the REBATE_APPROVALS row
             data_insert_approval = (
                 approved_amount, 
                 f"Application approved: {notes}", 
@@ -763,10 +1603,14 @@ def process_decision(application_id):
                 application_id 
             )
             
-            cursor.execute(sql_insert_approval, data_insert_approval)
+            cursor.execute(SQL_UPSERT_APPROVAL, data_insert_approval)
             flash(f"Rebate {application_id} approved. Financial approval record created for ${approved_amount:.2f}.", 'success')
         
+        # --- 4. Keep the campaign's materialized metrics in step ---
+        campaign_metrics_entered(cursor, application_id)
+
         conn.commit()
+        report_cache.invalidate('REBATE', 'REBATE_APPROVALS')
         cursor.close()
         
         return redirect(url_for('view_all_applications'))
@@ -781,6 +1625,229 @@ def process_decision(application_id):
         if conn and conn.is_connected():
             conn.close()
 
+# --- BATCH REVIEW DECISIONS ---
+# Reviewers can clear a backlog in one post: every row is validated first, then all
+# decisions are written in a single transaction (one CASE-based UPDATE per chunk and
+# one multi-row INSERT for the approval records).
+DECISION_ACTIONS = {
+    'Approve': 'Approved', 'Approved': 'Approved',
+    'Reject': 'Rejected', 'Rejected': 'Rejected',
+    'Request revision': 'Request revision', 'Request Revision': 'Request revision'
+}
+BATCH_DECISION_LIMIT = 500
+# Only undecided applications can be decided in a batch (never Drafts or Approved/Disbursed ones)
+BATCH_REVIEWABLE_STATUSES = ('Pending', 'Request revision')
+
+def parse_batch_decisions(form):
+    """Reads the batch review form: checked sop_number boxes + per-row action/amount/notes fields."""
+    decisions = []
+    for sop in form.getlist('sop_number'):
+        decisions.append({
+            'sop_number': sop,
+            'action': form.get(f'action_{sop}') or form.get('bulk_action'),
+            'approved_amount': form.get(f'amount_{sop}'),
+            'notes': form.get(f'notes_{sop}') or form.get('bulk_notes', '')
+        })
+    return decisions
+
+def validate_decisions(cursor, decisions):
+    """
+    Checks every row before anything is written. Returns (valid rows, per-row results);
+    results carry 'ok' False and an 'error' for rows that failed.
+    """
+    results = []
+    parsed = []
+    seen = set()
+    for raw in decisions:
+        result = {'sop_number': raw.get('sop_number'), 'ok': False}
+        results.append(result)
+        try:
+            sop = int(raw.get('sop_number'))
+        except (ValueError, TypeError):
+            result['error'] = 'Invalid SOP number.'
+            continue
+        result['sop_number'] = sop
+        if sop in seen:
+            result['error'] = 'Duplicate SOP number in batch.'
+            continue
+        seen.add(sop)
+
+        new_status = DECISION_ACTIONS.get((raw.get('action') or '').strip())
+        if new_status is None:
+            result['error'] = 'Unknown action.'
+            continue
+
+        amount = 0.00  # Set to zero for non-approved actions
+        if new_status == 'Approved':
+            try:
+                amount = float(raw.get('approved_amount'))
+            except (ValueError, TypeError):
+                result['error'] = 'Approval requires a valid Approved Amount.'
+                continue
+            if amount <= 0:
+                result['error'] = 'Approved Amount must be greater than zero.'
+                continue
+
+        parsed.append((result, {'sop_number': sop, 'status': new_status,
+                                'amount': amount, 'notes': (raw.get('notes') or '').strip()}))
+
+    # One lookup for every SOP in the batch; the rows stay locked until the batch is written,
+    # so a concurrent decision can't slip in between the checks and the writes
+    if parsed:
+        sops = [d['sop_number'] for _, d in parsed]
+        placeholders = ', '.join(['%s'] * len(sops))
+        cursor.execute(f"""
+            SELECT R.SOP_Number, R.Sponsor_ID, R.Category, R.Status, RA.SOP_Number AS Approval_SOP
+            FROM REBATE R
+            LEFT JOIN REBATE_APPROVALS RA ON R.SOP_Number = RA.SOP_Number
+            WHERE R.SOP_Number IN ({placeholders})
+            FOR UPDATE
+        """, sops)
+        existing = {row['SOP_Number']: row for row in cursor.fetchall()}
+        for result, decision in parsed:
+            row = existing.get(decision['sop_number'])
+            if row is None:
+                result['error'] = 'Application not found.'
+                continue
+            if row['Status'] not in BATCH_REVIEWABLE_STATUSES:
+                result['error'] = f"Application is {row['Status']}; only pending applications can be decided here."
+                continue
+            if row['Approval_SOP'] is not None:
+                result['error'] = 'Application already has an approval record; decide it from its review page.'
+                continue
+            decision['sponsor_id'] = row['Sponsor_ID']
+            decision['category'] = row['Category']
+
+    valid = [d for result, d in parsed if 'error' not in result]
+    return valid, results
+
+def apply_decisions(conn, cursor, decisions):
+    """Writes validated decisions in one transaction."""
+    for start in range(0, len(decisions), BATCH_DECISION_LIMIT):
+        chunk = decisions[start:start + BATCH_DECISION_LIMIT]
+        status_cases = ' '.join(['WHEN %s THEN %s'] * len(chunk))
+        notes_cases = ' '.join(['WHEN %s THEN %s'] * len(chunk))
+        placeholders = ', '.join(['%s'] * len(chunk))
+        params = []
+        for d in chunk:
+            params += [d['sop_number'], d['status']]
+        for d in chunk:
+            params += [d['sop_number'], d['notes']]
+        params += [d['sop_number'] for d in chunk]
+        chunk_sops = [d['sop_number'] for d in chunk]
+        previous = status_leaving(cursor, chunk_sops)
+        campaign_metrics_leaving(cursor, chunk_sops)
+        cursor.execute(f"""
+            UPDATE REBATE
+            SET Status = CASE SOP_Number {status_cases} END,
+                Office_Notes = CASE SOP_Number {notes_cases} END
+            WHERE SOP_Number IN ({placeholders})
+        """, params)
+        status_entered(cursor, chunk_sops, previous)
+
+    approvals = [d for d in decisions if d['status'] == 'Approved']
+    if approvals:
+        # executemany turns this into a single multi-row INSERT ... ON DUPLICATE KEY UPDATE
+        cursor.executemany(SQL_UPSERT_APPROVAL, [(d['amount'], f"Application approved: {d['notes']}", session.get('employee_id'),
+               d['sponsor_id'], d['sop_number']) for d in approvals])
+
+    for start in range(0, len(decisions), BATCH_DECISION_LIMIT):
+        campaign_metrics_entered(cursor, [d['sop_number'] for d in decisions[start:start + BATCH_DECISION_LIMIT]])
+
+    conn.commit()
+    report_cache.invalidate('REBATE', 'REBATE_APPROVALS')
+
+@app.route('/batch-review')
+def batch_review():
+    """Lists pending applications with per-row decision controls."""
+    if 'contractor_logged_in' not in session:
+        return redirect(url_for('contractor_login'))
+
+    pending = []
+    conn = get_db_connection()
+    if conn is None:
+        flash('Could not connect to the database.', 'error')
+    else:
+        try:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute("""
+                SELECT SOP_Number, Category, Building, Submission_Date, Office_Notes
+                FROM REBATE
+                WHERE Status = 'Pending'
+                ORDER BY Submission_Date ASC
+                LIMIT %s
+            """, (BATCH_DECISION_LIMIT,))
+            pending = cursor.fetchall()
+            cursor.close()
+        except mysql.connector.Error as err:
+            print(f"Database query error fetching batch review queue: {err}")
+            flash('Error fetching pending applications.', 'error')
+        finally:
+            conn.close()
+
+    return render_template('batch_review.html', applications=pending, results=None)
+
+@app.route('/process-decisions', methods=['POST'])
+def process_decisions():
+    """
+    Applies many review decisions at once. Accepts the batch review form, or JSON:
+    {"decisions": [{"sop_number": 12, "action": "Approve", "approved_amount": 500, "notes": "..."}]}
+    Nothing is written unless every row validates; the response lists per-row results.
+    """
+    if 'contractor_logged_in' not in session:
+        if request.is_json:
+            return jsonify({'error': 'Authorization required.'}), 401
+        return redirect(url_for('contractor_login'))
+
+    if request.is_json:
+        decisions = (request.get_json(silent=True) or {}).get('decisions') or []
+    else:
+        decisions = parse_batch_decisions(request.form)
+
+    def respond(results, status_code=200):
+        if request.is_json:
+            return jsonify({'applied': status_code == 200, 'results': results}), status_code
+        if status_code == 200:
+            flash(f"{len(results)} decisions saved.", 'success')
+            return redirect(url_for('batch_review'))
+        if not results:
+            flash('Select at least one application.', 'warning')
+            return redirect(url_for('batch_review'))
+        failed = [r for r in results if not r['ok']]
+        flash(f"No decisions were saved: {len(failed)} of {len(results)} rows need attention.", 'error')
+        return render_template('batch_review.html', applications=[], results=results), status_code
+
+    if not decisions:
+        return respond([], 400)
+    if len(decisions) > BATCH_DECISION_LIMIT:
+        return respond([{'sop_number': None, 'ok': False,
+                         'error': f'At most {BATCH_DECISION_LIMIT} decisions per batch.'}], 400)
+
+    conn = get_db_connection()
+    if conn is None:
+        return respond([{'sop_number': None, 'ok': False, 'error': 'Database connection error.'}], 503)
+
+    try:
+        cursor = conn.cursor(dictionary=True)
+        valid, results = validate_decisions(cursor, decisions)
+        if len(valid) != len(results):
+            cursor.close()
+            return respond(results, 400)
+
+        apply_decisions(conn, cursor, valid)
+        cursor.close()
+        for result in results:
+            result['ok'] = True
+        return respond(results)
+
+    except mysql.connector.Error as err:
+        print(f"Database update error in process_decisions: {err}")
+        conn.rollback()
+        return respond([{'sop_number': None, 'ok': False,
+                         'error': 'Error saving decisions; nothing was changed.'}], 500)
+    finally:
+        conn.close()
+
 @app.route('/update-status/<int:sop_number>', methods=['POST'])
 def update_status(sop_number):
     if 'contractor_logged_in' not in session:
@@ -796,54 +1863,104 @@ def update_status(sop_number):
             cursor = conn.cursor()
             # Update both status and notes in one go
             query = "UPDATE REBATE SET Status = %s, Office_Notes = %s WHERE SOP_Number = %s"
+            previous = status_leaving(cursor, sop_number)
+            campaign_metrics_leaving(cursor, sop_number)
             cursor.execute(query, (new_status, notes, sop_number))
+            status_entered(cursor, sop_number, previous)
+            campaign_metrics_entered(cursor, sop_number)
             conn.commit()
+            report_cache.invalidate('REBATE')
             cursor.close()
         finally:
             conn.close()
 
     return redirect(url_for('view_all_applications'))
 
+# --- PAYMENT IDEMPOTENCY ---
+# Every disburse form carries a one-time token. It is claimed inside the payment's own
+# transaction, so a double-click or browser retry finds it taken and does nothing,
+# while a payment that failed (and rolled back) can simply be retried.
+@app.context_processor
+def inject_idempotency_token():
+    return {'idempotency_token': lambda: uuid.uuid4().hex}
+
+def claim_idempotency_key(cursor, token, scope):
+    """Returns False if this token was already used (i.e. the request is a repeat)."""
+    if not token:
+        return True  # Forms rendered before tokens existed still work
+    cursor.execute("INSERT IGNORE INTO IDEMPOTENCY_KEYS (Token, Scope) VALUES (%s, %s)", (token[:64], scope))
+    claimed = cursor.rowcount == 1
+    if claimed and random.random() < 0.01:
+        # Occasional housekeeping instead of a separate cron job
+        cursor.execute("DELETE FROM IDEMPOTENCY_KEYS WHERE Created_At < NOW() - INTERVAL 7 DAY")
+    return claimed
+
+# Row lock + everything a payout needs to validate it and keep the counters in step
+SQL_LOCK_PAYABLE = """
+    SELECT R.SOP_Number, R.Sponsor_ID, R.Status, R.Building, R.Category,
+           RA.Approved_Amount, RA.Payment_Date
+""" + queries.REBATE_WITH_APPROVAL
+
+# Single statement: creates the approval row if the sync never did, otherwise pays it
+SQL_UPSERT_PAYMENT = """
+    INSERT INTO REBATE_APPROVALS (SOP_Number, Approved_Amount, Payment_Date, Disbursed_Date, Sponsor_ID)
+    VALUES (%s, %s, NOW(), NOW(), %s)
+    ON DUPLICATE KEY UPDATE
+        Approved_Amount = VALUES(Approved_Amount),
+        Payment_Date = VALUES(Payment_Date),
+        Disbursed_Date = VALUES(Disbursed_Date)
+"""
+
 @app.route('/disburse-payment/<string:sop_number>', methods=['POST'])
 def disburse_payment(sop_number):
     """Handles the final payout step performed by a Sponsor."""
     if 'sponsor_logged_in' not in session:
         flash("Unauthorized access.")
-        return redirect(url_for('login_page'))
+        return redirect(url_for('contractor_login'))
 
     amount = request.form.get('approved_amount')
     sponsor_id = session.get('sponsor_id')
+    token = request.form.get('idempotency_key')
     
     conn = get_db_connection()
     if conn is None: return "DB Error", 500
 
+    try:
+        amount = float(amount)
+    except (ValueError, TypeError):
+        flash("Enter a valid payment amount.", 'danger')
+        return redirect(url_for('sponsor_approvals'))
+
     try:
         cursor = conn.cursor()
-        
-        # 1. Update REBATE_APPROVALS with the actual payment date and final amount
-        # Check if record exists (from your sync function), if so UPDATE, else INSERT
-        sql_check = "SELECT SOP_Number FROM REBATE_APPROVALS WHERE SOP_Number = %s"
-        cursor.execute(sql_check, (sop_number,))
-        
-        if cursor.fetchone():
-            sql_action = """
-                UPDATE REBATE_APPROVALS 
-                SET Approved_Amount = %s, Payment_Date = NOW(), Disbursed_Date = NOW() 
-                WHERE SOP_Number = %s
-            """
-            cursor.execute(sql_action, (amount, sop_number))
-        else:
-            sql_action = """
-                INSERT INTO REBATE_APPROVALS (SOP_Number, Approved_Amount, Payment_Date, Sponsor_ID)
-                VALUES (%s, %s, NOW(), %s)
-            """
-            cursor.execute(sql_action, (sop_number, amount, sponsor_id))
 
-        # 2. Update the main REBATE table status to 'Disbursed'
-        sql_status = "UPDATE REBATE SET Status = 'Disbursed' WHERE SOP_Number = %s"
-        cursor.execute(sql_status, (sop_number,))
+        # 0. A repeated submit of the same form is a cheap no-op
+        if not claim_idempotency_key(cursor, token, 'disburse_payment'):
+            conn.rollback()
+            flash(f"Payment for application {sop_number} was already processed.", 'info')
+            return redirect(url_for('sponsor_approvals'))
+
+        # 1. Lock the rebate and its approval row: a concurrent payout of the same SOP
+        #    (with a different form token) waits here, then finds it already paid
+        cursor.execute(SQL_LOCK_PAYABLE + " WHERE R.SOP_Number = %s FOR UPDATE", (sop_number,))
+        row = cursor.fetchone()
+        if row is None or row[1] != sponsor_id or row[2] != 'Approved' or row[6] is not None:
+            conn.rollback()
+            flash(f"Application {sop_number} is not awaiting payment.", 'info')
+            return redirect(url_for('sponsor_approvals'))
+        _, _, old_status, building, category, old_amount, _ = row
+
+        # 2. Record the payment date and final amount, and mark the rebate 'Disbursed'
+        cursor.execute(SQL_UPSERT_PAYMENT, (sop_number, amount, sponsor_id))
+        cursor.execute("UPDATE REBATE SET Status = 'Disbursed' WHERE SOP_Number = %s", (sop_number,))
+
+        # 3. Bookkeeping straight from the locked row, without reading the rebate again
+        move_status_count(cursor, old_status, 'Disbursed')
+        campaign_metrics_paid(cursor, category, amount - float(old_amount or 0))
+        log_activity(cursor, sop_number, building, category, 'Disbursed')
 
         conn.commit()
+        report_cache.invalidate('REBATE', 'REBATE_APPROVALS')
         flash(f"Funds successfully disbursed for application {sop_number}.", 'success')
     except Exception as e:
         conn.rollback()
@@ -854,16 +1971,367 @@ def disburse_payment(sop_number):
 
     return redirect(url_for('sponsor_approvals'))
 
+@app.route('/disburse-payments', methods=['POST'])
+def disburse_payments():
+    """
+    Bulk "Pay Selected": disburses many of the sponsor's approved, unpaid applications in
+    one transaction. Form: checked sop_number boxes (+ optional amount_<sop>); JSON:
+    {"payments": [{"sop_number": 12, "amount": 500}], "idempotency_key": "..."}.
+    Rows without an amount are paid at the Approved_Amount already on record.
+    """
+    if 'sponsor_logged_in' not in session:
+        if request.is_json:
+            return jsonify({'error': 'Authorization required.'}), 401
+        flash("Unauthorized access.")
+        return redirect(url_for('contractor_login'))
+
+    sponsor_id = session.get('sponsor_id')
+    if request.is_json:
+        body = request.get_json(silent=True) or {}
+        requested = body.get('payments') or []
+        token = body.get('idempotency_key')
+    else:
+        requested = [{'sop_number': sop, 'amount': request.form.get(f'amount_{sop}')}
+                     for sop in request.form.getlist('sop_number')]
+        token = request.form.get('idempotency_key')
+
+    def respond(results, message, category, status_code=200):
+        if request.is_json:
+            return jsonify({'applied': status_code == 200, 'message': message, 'results': results}), status_code
+        flash(message, category)
+        return redirect(url_for('sponsor_dashboard'))
+
+    # --- 1. Validate input shape ---
+    results = []
+    payments = {}
+    for raw in requested:
+        result = {'sop_number': raw.get('sop_number'), 'ok': False}
+        results.append(result)
+        try:
+            sop = int(raw.get('sop_number'))
+            result['sop_number'] = sop
+            amount = raw.get('amount')
+            amount = float(amount) if amount not in (None, '') else None
+        except (ValueError, TypeError):
+            result['error'] = 'Invalid SOP number or amount.'
+            continue
+        if amount is not None and amount <= 0:
+            result['error'] = 'Amount must be greater than zero.'
+        elif sop in payments:
+            result['error'] = 'Duplicate SOP number in batch.'
+        else:
+            payments[sop] = amount
+    if not results:
+        return respond([], 'Select at least one application to pay.', 'warning', 400)
+
+    conn = get_db_connection()
+    if conn is None:
+        return respond(results, 'Database connection error.', 'error', 503)
+
+    try:
+        cursor = conn.cursor(dictionary=True)
+
+        # --- 2. Check (and lock) every SOP in one query ---
+        if payments:
+            placeholders = ', '.join(['%s'] * len(payments))
+            # FOR UPDATE: the rows stay locked until this transaction pays them, so two
+            # bulk payouts (different form tokens) can't both see the same SOP unpaid
+            cursor.execute(f"{SQL_LOCK_PAYABLE} WHERE R.SOP_Number IN ({placeholders}) FOR UPDATE",
+                           list(payments))
+            found = {row['SOP_Number']: row for row in cursor.fetchall()}
+        else:
+            found = {}
+
+        rows_to_pay = []
+        for result in results:
+            if 'error' in result:
+                continue
+            sop = result['sop_number']
+            row = found.get(sop)
+            if row is None or row['Sponsor_ID'] != sponsor_id:
+                result['error'] = 'Application not found for this sponsor.'
+            elif row['Status'] != 'Approved' or row['Payment_Date'] is not None:
+                result['error'] = 'Application is not awaiting payment.'
+            else:
+                amount = payments[sop] if payments[sop] is not None else row['Approved_Amount']
+                if amount is None:
+                    result['error'] = 'No approved amount on record; enter an amount.'
+                else:
+                    result['amount'] = float(amount)
+                    rows_to_pay.append((sop, amount, sponsor_id))
+
+        failed = [r for r in results if 'error' in r]
+        if failed:
+            cursor.close()
+            return respond(results, f"No payments were made: {len(failed)} of {len(results)} rows need attention.",
+                           'error', 400)
+
+        # --- 3. Pay everything in one transaction ---
+        if not claim_idempotency_key(cursor, token, 'disburse_payments'):
+            conn.rollback()
+            cursor.close()
+            return respond(results, 'These payments were already processed.', 'info')
+
+        placeholders = ', '.join(['%s'] * len(rows_to_pay))
+        paid_sops = [row[0] for row in rows_to_pay]
+        previous = status_leaving(cursor, paid_sops)
+        campaign_metrics_leaving(cursor, paid_sops)
+        cursor.executemany(SQL_UPSERT_PAYMENT, rows_to_pay)  # One multi-row INSERT ... ON DUPLICATE KEY UPDATE
+        cursor.execute(f"UPDATE REBATE SET Status = 'Disbursed' WHERE SOP_Number IN ({placeholders})", paid_sops)
+        status_entered(cursor, paid_sops, previous)
+        campaign_metrics_entered(cursor, paid_sops)
+
+        conn.commit()
+        cursor.close()
+        report_cache.invalidate('REBATE', 'REBATE_APPROVALS')
+        for result in results:
+            result['ok'] = True
+        return respond(results, f"Funds disbursed for {len(rows_to_pay)} applications.", 'success')
+
+    except mysql.connector.Error as err:
+        conn.rollback()
+        print(f"Bulk Disbursement Error: {err}")
+        return respond(results, 'Error processing disbursements; nothing was paid.', 'danger', 500)
+    finally:
+        conn.close()
+
+# ==============================================================================
+# 📎 ATTACHMENT UPLOAD ROUTES
+# ==============================================================================
+# The application form uploads each file before the form itself is posted:
+#   POST /uploads                 {"filename", "size"} -> {"upload_id", "chunk_bytes"}
+#   PUT  /uploads/<id>            one chunk; Upload-Offset header says where it starts
+#   GET  /uploads/<id>            {"offset"} to resume after a dropped connection
+#   POST /uploads/<id>/complete   hashes the file into its SHA-256 blob
+# The form then posts the finished upload ids as attachment_upload_id fields, and the
+# submit route records them in ATTACHMENT inside its own transaction.
+
+@app.errorhandler(UploadError)
+def upload_error(err):
+    response = jsonify({'error': str(err), 'offset': err.offset})
+    if err.offset is not None:
+        response.headers['Upload-Offset'] = str(err.offset)
+    return response, err.status
+
+def upload_owner():
+    """Uploads belong to the logged-in account; anonymous visitors can't upload."""
+    owner = session_principal(session)
+    if owner is None:
+        raise UploadError("Authorization required.", 401)
+    return owner
+
+def claimed_uploads(field='attachment_upload_id'):
+    """[(upload_id, metadata)] for the finished uploads named in the posted form."""
+    owner = session_principal(session)
+    upload_ids = list(dict.fromkeys(request.form.getlist(field)))
+    return [(upload_id, upload_store.completed(upload_id, owner)) for upload_id in upload_ids]
+
+def record_attachments(cursor, sop_number, uploads):
+    if not uploads:
+        return
+    owner = session_principal(session)
+    cursor.executemany("""
+        INSERT INTO ATTACHMENT (SOP_Number, Sha256, Original_Name, Content_Type, Size_Bytes, Uploaded_By)
+        VALUES (%s, %s, %s, %s, %s, %s)
+    """, [(sop_number, meta['sha256'], meta['filename'], meta['content_type'], meta['size'], owner)
+          for _, meta in uploads])
+
+def release_uploads(uploads):
+    """Called after commit: the blobs stay, the per-upload bookkeeping goes."""
+    for upload_id, _ in uploads:
+        upload_store.discard(upload_id)
+
+def can_access_application(cursor, sop_number):
+    """Reviewers see every application; applicants and sponsors only their own."""
+    if session.get('contractor_logged_in'):
+        return True
+    cursor.execute("SELECT Department_ID, Sponsor_ID FROM REBATE WHERE SOP_Number = %s", (sop_number,))
+    row = cursor.fetchone()
+    if row is None:
+        return False
+    if session.get('user_logged_in') and str(row[0]) == str(session.get('user_id')):
+        return True
+    return bool(session.get('sponsor_logged_in')) and str(row[1]) == str(session.get('sponsor_id'))
+
+@app.route('/uploads', methods=['POST'])
+def upload_start():
+    owner = upload_owner()
+    payload = request.get_json(silent=True) or request.form
+    started = upload_store.start(owner, payload.get('filename'), payload.get('size'))
+    started['max_bytes'] = upload_store.max_bytes
+    return jsonify(started), 201
+
+@app.route('/uploads/<string:upload_id>', methods=['GET', 'PUT'])
+def upload_chunk(upload_id):
+    owner = upload_owner()
+    if request.method == 'GET':
+        status = upload_store.status(upload_id, owner)
+        response = jsonify(status)
+        response.headers['Upload-Offset'] = str(status['offset'])
+        response.cache_control.no_store = True
+        return response
+
+    try:
+        offset = int(request.headers.get('Upload-Offset', ''))
+    except ValueError:
+        offset = None
+    # request.stream is read in blocks straight into the partial file
+    new_offset = upload_store.write_chunk(upload_id, owner, offset, request.stream, request.content_length)
+    response = jsonify({'offset': new_offset})
+    response.headers['Upload-Offset'] = str(new_offset)
+    return response
+
+@app.route('/uploads/<string:upload_id>/complete', methods=['POST'])
+def upload_complete(upload_id):
+    meta = upload_store.finish(upload_id, upload_owner())
+    # Start rendering right away so the preview is ready by the time a reviewer looks
+    preview_cache.schedule(meta['sha256'], meta['content_type'], upload_store.blob_path(meta['sha256']))
+    return jsonify({'upload_id': upload_id, 'sha256': meta['sha256'], 'filename': meta['filename'],
+                    'size': meta['size'], 'deduplicated': meta['deduplicated']})
+
+@app.route('/applications/<int:sop_number>/attachments', methods=['POST'])
+def add_attachments(sop_number):
+    """Attaches finished uploads to an application that already exists (e.g. a late invoice)."""
+    upload_owner()
+    uploads = claimed_uploads()
+    if not uploads:
+        return jsonify({'error': 'No finished uploads given.'}), 400
+
+    conn = get_db_connection()
+    if conn is None:
+        return jsonify({'error': 'Database connection error.'}), 503
+    try:
+        cursor = conn.cursor()
+        if not can_access_application(cursor, sop_number):
+            return jsonify({'error': 'Application not found.'}), 404
+        record_attachments(cursor, sop_number, uploads)
+        conn.commit()
+        cursor.close()
+    except mysql.connector.Error as err:
+        print(f"Attachment Error: {err}")
+        conn.rollback()
+        return jsonify({'error': 'Could not save attachments.'}), 500
+    finally:
+        conn.close()
+
+    release_uploads(uploads)
+    return jsonify({'attached': len(uploads)}), 201
+
+def fetch_accessible_attachment(attachment_id):
+    """The ATTACHMENT row if the current session may see its application, else None."""
+    conn = get_db_connection()
+    if conn is None:
+        return None
+    try:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute("""
+            SELECT SOP_Number, Sha256, Original_Name, Content_Type
+            FROM ATTACHMENT WHERE Attachment_ID = %s
+        """, (attachment_id,))
+        attachment = cursor.fetchone()
+        allowed = attachment is not None and can_access_application(cursor, attachment['SOP_Number'])
+        cursor.close()
+        return attachment if allowed else None
+    except mysql.connector.Error as err:
+        print(f"Attachment Error: {err}")
+        return None
+    finally:
+        conn.close()
+
+@app.route('/attachments/<int:attachment_id>')
+def download_attachment(attachment_id):
+    if session_principal(session) is None:
+        return redirect(url_for('index'))
+
+    attachment = fetch_accessible_attachment(attachment_id)
+    if attachment is None:
+        return "Attachment not found.", 404
+    # Blobs never change, so browsers can keep them (privately) and revalidate cheaply
+    response = send_file(upload_store.blob_path(attachment['Sha256']), mimetype=attachment['Content_Type'],
+                         download_name=attachment['Original_Name'], conditional=True,
+                         etag=attachment['Sha256'], max_age=24 * 3600)
+    response.cache_control.private = True
+    response.cache_control.public = None
+    return response
+
+@app.route('/attachments/<int:attachment_id>/<any(thumb, preview):kind>.webp')
+def attachment_preview(attachment_id, kind):
+    """
+    Thumbnail or first-page preview. The URL carries ?v=<sha256 prefix>, so a given
+    URL always means the same image and browsers may keep it for a year.
+    """
+    if session_principal(session) is None:
+        return redirect(url_for('index'))
+
+    attachment = fetch_accessible_attachment(attachment_id)
+    if attachment is None:
+        return "Attachment not found.", 404
+    path = preview_cache.get(attachment['Sha256'], kind)
+    if path is None:
+        preview_cache.schedule(attachment['Sha256'], attachment['Content_Type'],
+                               upload_store.blob_path(attachment['Sha256']))
+        response = Response("Preview not ready yet.", status=404)
+        response.headers['Retry-After'] = '2'
+        return response
+    response = send_file(path, mimetype='image/webp', conditional=True,
+                         etag=f"{attachment['Sha256']}-{kind}", max_age=assets.CACHE_FOREVER)
+    response.cache_control.private = True
+    response.cache_control.public = None
+    response.cache_control.immutable = True
+    return response
+
+@app.cli.command('build-previews')
+def build_previews_command():
+    """Renders missing previews for every attachment (e.g. after clearing the preview folder)."""
+    with db_connection() as conn:
+        if conn is None:
+            raise click.ClickException("Could not connect to the database.")
+        cursor = conn.cursor()
+        cursor.execute("SELECT DISTINCT Sha256, Content_Type FROM ATTACHMENT")
+        rows = cursor.fetchall()
+        cursor.close()
+    queued = sum(preview_cache.schedule(sha256, content_type, upload_store.blob_path(sha256))
+                 for sha256, content_type in rows)
+    preview_cache.shutdown(wait=True)
+    click.echo(f"Rendered {queued} preview set(s); {preview_cache.failed} failed.")
+
+def move_legacy_attachments():
+    """Attachments used to be stored under static/uploads, where anyone could fetch them; moves them out."""
+    for name in ('blobs', 'partial'):
+        legacy = os.path.join(UPLOAD_FOLDER, name)
+        if os.path.isdir(legacy):
+            shutil.copytree(legacy, os.path.join(ATTACHMENT_FOLDER, name), dirs_exist_ok=True)
+            shutil.rmtree(legacy)
+            print(f"Moved {legacy} to {ATTACHMENT_FOLDER}")
+
+@app.cli.command('purge-uploads')
+def purge_uploads_command():
+    """Deletes stale unfinished uploads and blobs no attachment points at any more."""
+    removed = upload_store.purge_stale()
+    click.echo(f"Purged {removed} stale upload(s).")
+    with db_connection() as conn:
+        if conn is None:
+            raise click.ClickException("Could not connect to the database.")
+        cursor = conn.cursor()
+        cursor.execute("SELECT DISTINCT Sha256 FROM ATTACHMENT")
+        referenced = {row[0] for row in cursor.fetchall()}
+        cursor.close()
+    removed = upload_store.purge_orphaned_blobs(referenced)
+    click.echo(f"Purged {removed} unreferenced blob(s).")
+
+
 # ==============================================================================
 # 📄 PUBLIC & MISC ROUTES
 # ==============================================================================
 
 @app.route('/impact')
+@page_cache.cached
 def impact():
     """Renders the Impact page template."""
     return render_template('impact.html')
 
 @app.route('/opportunities')
+@page_cache.cached
 def opportunities():
     """Renders the Opportunities page template."""
     return render_template('opportunities.html')
@@ -874,6 +2342,7 @@ def rebates():
     return "<h1>Rebates Page Coming Soon!</h1><p>This is where users can find details on available rebates.</p>"
 
 @app.route('/about')
+@page_cache.cached
 def about():
     """Renders the About page."""
     return render_template('about.html')
@@ -884,6 +2353,7 @@ def forgot_password():
     return "<h1>Forgot Password Page</h1><p>Instructions for resetting the password will go here.</p>"
 
 @app.route('/user-signup', methods=['GET'])
+@page_cache.cached
 def user_signup():
     """Renders the standard user registration page template."""
     return render_template('user_signup.html')
@@ -891,6 +2361,370 @@ def user_signup():
 
 # --- REPORT AND ADMIN ROUTES (PLACEHOLDERS) ---
 
+# --- REPORT QUERIES ---
+# Each fetch_* function runs one report's SQL and returns plain rows (or None if the
+# DB is unreachable, which is never cached). Routes read them through the report cache.
+REPORT_TABLES = {
+    'aging': ('REBATE',),
+    'aging_buckets': ('REBATE',),
+    'high_value': ('REBATE', 'REBATE_APPROVALS'),
+    'energy': ('CAMPAIGN', 'REBATE', 'REBATE_APPROVALS'),
+    'payment': ('REBATE', 'REBATE_APPROVALS'),
+}
+
+# --- CAMPAIGN METRICS (MATERIALIZED) ---
+# CAMPAIGN_METRICS holds one row per campaign so /energy-report reads one small table.
+# Write routes maintain it incrementally, inside their own transaction: before touching
+# a rebate (or its approval row) campaign_metrics_leaving() subtracts what those SOPs
+# contribute, and campaign_metrics_entered() adds it back once the writes are done.
+# Only the changed SOPs are read (primary-key lookups), never the whole Category.
+# Migration 10 fills it the first time; the report route only ever reads it.
+# `flask rebuild-campaign-metrics` recomputes everything, e.g. after adding a campaign.
+def _apply_campaign_deltas(cursor, sop_numbers, sign):
+    sops, placeholders = _sop_params(sop_numbers)
+    if not sops: return
+    cursor.execute(f"""
+        UPDATE CAMPAIGN_METRICS CM
+        JOIN (
+            SELECT R.Category, COUNT(*) AS Applications,
+                   COALESCE(SUM(CASE WHEN R.Status = 'Approved' THEN 1 ELSE 0 END), 0) AS Approved,
+                   COALESCE(SUM(RA.Approved_Amount), 0) AS Rebates
+            FROM REBATE R
+            LEFT JOIN REBATE_APPROVALS RA ON R.SOP_Number = RA.SOP_Number
+            WHERE R.SOP_Number IN ({placeholders})
+            GROUP BY R.Category
+        ) D ON CM.Category = D.Category
+        SET CM.Total_Applications = CM.Total_Applications + %s * D.Applications,
+            CM.Approved_Applications = CM.Approved_Applications + %s * D.Approved,
+            CM.Total_Approved_Rebates = CM.Total_Approved_Rebates + %s * D.Rebates
+    """, sops + [sign, sign, sign])
+
+def campaign_metrics_leaving(cursor, sop_numbers):
+    """Takes these rebates' current contribution out of their campaigns (call before changing them)."""
+    _apply_campaign_deltas(cursor, sop_numbers, -1)
+
+def campaign_metrics_entered(cursor, sop_numbers):
+    """Adds these rebates' contribution back as it stands now (call after the writes)."""
+    _apply_campaign_deltas(cursor, sop_numbers, 1)
+
+def campaign_metrics_paid(cursor, category, amount_change):
+    """A payout: the rebate leaves 'Approved' and its amount may change (row already locked by the caller)."""
+    cursor.execute("""
+        UPDATE CAMPAIGN_METRICS
+        SET Approved_Applications = Approved_Applications - 1,
+            Total_Approved_Rebates = Total_Approved_Rebates + %s
+        WHERE Category = %s
+    """, (amount_change, category))
+
+def rebuild_campaign_metrics(conn):
+    """Full rebuild of CAMPAIGN_METRICS in one transaction (also drops deleted campaigns)."""
+    cursor = conn.cursor()
+    try:
+        rebuilt = migrations.rebuild_campaign_metrics(cursor)
+        conn.commit()
+    except mysql.connector.Error:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+    report_cache.invalidate('CAMPAIGN')
+    return rebuilt
+
+@app.cli.command('rebuild-campaign-metrics')
+def rebuild_campaign_metrics_command():
+    """Recomputes CAMPAIGN_METRICS from scratch: flask --app Web rebuild-campaign-metrics"""
+    with db_connection() as conn:
+        if conn is None:
+            raise click.ClickException("Could not connect to the database.")
+        started = time.perf_counter()
+        rebuilt = rebuild_campaign_metrics(conn)
+        click.echo(f"Rebuilt {rebuilt} campaign rows in {int((time.perf_counter() - started) * 1000)} ms.")
+
+
+# --- DASHBOARD COUNTERS (INCREMENTAL) ---
+# STATUS_COUNTS holds one row per REBATE.Status and RECENT_ACTIVITY a bounded ring of
+# the latest status changes, so contractor_dashboard reads two tiny tables. Every route
+# that inserts, re-statuses or deletes a rebate updates them on its own cursor, inside
+# its transaction: status_leaving() before the change, status_entered() after it.
+# Pass status_entered() what status_leaving() returned so that rebates whose status
+# did not actually change (e.g. a notes-only edit) stay out of the activity ring.
+RECENT_ACTIVITY_LIMIT = 50
+
+def _sop_params(sop_numbers):
+    sops = list(sop_numbers) if isinstance(sop_numbers, (list, tuple, set)) else [sop_numbers]
+    return sops, ', '.join(['%s'] * len(sops))
+
+def _columns(row, *names):
+    # Routes hand these helpers plain or dictionary cursors; read rows the same way from both
+    return tuple(row[name] for name in names) if isinstance(row, dict) else tuple(row)
+
+def adjust_status_count(cursor, status, delta):
+    cursor.execute("""
+        INSERT INTO STATUS_COUNTS (Status, Total) VALUES (%s, %s)
+        ON DUPLICATE KEY UPDATE Total = Total + VALUES(Total)
+    """, (status, delta))
+
+def move_status_count(cursor, old_status, new_status, count=1):
+    """One statement for a known status change (the caller already holds the row lock)."""
+    cursor.execute("""
+        INSERT INTO STATUS_COUNTS (Status, Total) VALUES (%s, %s), (%s, %s)
+        ON DUPLICATE KEY UPDATE Total = Total + VALUES(Total)
+    """, (old_status, -count, new_status, count))
+
+def status_leaving(cursor, sop_numbers):
+    """Locks the rebates, takes them out of their current status counts and returns {SOP: old status}."""
+    sops, placeholders = _sop_params(sop_numbers)
+    if not sops: return {}
+    cursor.execute(f"SELECT SOP_Number, Status FROM REBATE WHERE SOP_Number IN ({placeholders}) FOR UPDATE", sops)
+    previous = dict(_columns(row, 'SOP_Number', 'Status') for row in cursor.fetchall())
+    cursor.execute(f"""
+        UPDATE STATUS_COUNTS SC
+        JOIN (SELECT Status, COUNT(*) AS N FROM REBATE WHERE SOP_Number IN ({placeholders}) GROUP BY Status) R
+          ON SC.Status = R.Status
+        SET SC.Total = SC.Total - R.N
+    """, sops)
+    return previous
+
+def trim_recent_activity(cursor):
+    """Keeps only the newest RECENT_ACTIVITY_LIMIT rows of the activity ring."""
+    # Ids are not contiguous (rolled-back inserts leave gaps), so find the first id past
+    # the newest N by walking the primary key backwards, then range-delete from there.
+    # The derived table is materialized first, which lets MySQL delete from the same table.
+    cursor.execute("""
+        DELETE FROM RECENT_ACTIVITY WHERE Activity_ID <= (
+            SELECT Activity_ID FROM (
+                SELECT Activity_ID FROM RECENT_ACTIVITY ORDER BY Activity_ID DESC LIMIT 1 OFFSET %s
+            ) Oldest_Kept
+        )
+    """, (RECENT_ACTIVITY_LIMIT,))
+
+def log_activity(cursor, sop_number, building, category, status):
+    """Appends one known status change to the activity ring."""
+    cursor.execute("INSERT INTO RECENT_ACTIVITY (SOP_Number, Building, Category, Status) VALUES (%s, %s, %s, %s)",
+                   (sop_number, building, category, status))
+    trim_recent_activity(cursor)
+
+def status_entered(cursor, sop_numbers, previous=None):
+    """Counts the rebates under their (new) status and logs the ones whose status changed."""
+    sops, placeholders = _sop_params(sop_numbers)
+    if not sops: return
+    cursor.execute(f"""
+        INSERT INTO STATUS_COUNTS (Status, Total)
+        SELECT Status, COUNT(*) FROM REBATE WHERE SOP_Number IN ({placeholders}) GROUP BY Status
+        ON DUPLICATE KEY UPDATE Total = Total + VALUES(Total)
+    """, sops)
+    if previous is not None:
+        cursor.execute(f"SELECT SOP_Number, Status FROM REBATE WHERE SOP_Number IN ({placeholders})", sops)
+        rows = (_columns(row, 'SOP_Number', 'Status') for row in cursor.fetchall())
+        sops = [sop for sop, status in rows if previous.get(sop) != status]
+        if not sops: return
+        placeholders = ', '.join(['%s'] * len(sops))
+    cursor.execute(f"""
+        INSERT INTO RECENT_ACTIVITY (SOP_Number, Building, Category, Status)
+        SELECT SOP_Number, Building, Category, Status FROM REBATE WHERE SOP_Number IN ({placeholders})
+    """, sops)
+    trim_recent_activity(cursor)
+
+@app.cli.command('rebuild-status-counts')
+def rebuild_status_counts_command():
+    """Recounts STATUS_COUNTS from REBATE (e.g. after editing rebates by hand in phpMyAdmin)."""
+    with db_connection() as conn:
+        if conn is None:
+            raise click.ClickException("Could not connect to the database.")
+        cursor = conn.cursor()
+        try:
+            migrations.rebuild_status_counts(cursor)
+            conn.commit()
+        except mysql.connector.Error:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+    click.echo("Status counters rebuilt.")
+
+
+def fetch_aging_report(days_threshold):
+    conn = get_db_connection()
+    if conn is None:
+        return None
+    try:
+        cursor = conn.cursor(dictionary=True)
+        # Parameterized query (R-10)
+        cursor.execute(queries.AGING_REPORT_QUERY, (days_threshold,))
+        rows = cursor.fetchall()
+        cursor.close()
+        return rows
+    finally:
+        conn.close()
+
+def fetch_aging_buckets():
+    """Pending applications per Building/Category, bucketed by age (0-30, 31-60, 61-90, 90+ days)."""
+    conn = get_db_connection()
+    if conn is None:
+        return None
+    try:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(queries.AGING_BUCKETS_QUERY)
+        rows = cursor.fetchall()
+        cursor.close()
+        return rows
+    finally:
+        conn.close()
+
+
+def fetch_high_value_audit(threshold):
+    conn = get_db_connection()
+    if conn is None:
+        return None
+    try:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(queries.HIGH_VALUE_QUERY, (threshold,))
+        rows = cursor.fetchall()
+        cursor.close()
+        return rows
+    finally:
+        conn.close()
+
+def fetch_energy_report():
+    conn = get_db_connection()
+    if conn is None:
+        return None
+    try:
+        cursor = conn.cursor(dictionary=True)
+        # Backward scan of the covering idx_campaign_metrics_date index (migration 9):
+        # one row per campaign, already in date order, so no join-aggregate and no filesort
+        cursor.execute(queries.ENERGY_REPORT_QUERY)
+        rows = cursor.fetchall()
+        cursor.close()
+        return rows
+    finally:
+        conn.close()
+
+
+def fetch_payment_report(start_date, end_date):
+    conn = get_db_connection()
+    if conn is None:
+        return None
+    try:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(queries.PAYMENT_REPORT_QUERY, (start_date, end_date))
+        rows = cursor.fetchall()
+        cursor.close()
+        return rows
+    finally:
+        conn.close()
+
+def stream_query_rows(query, params=(), batch_size=500):
+    """Yields row tuples from an unbuffered cursor so large exports never sit in memory."""
+    conn = get_db_connection()
+    if conn is None:
+        return
+    try:
+        cursor = conn.cursor()  # Unbuffered: rows are pulled from the server as we go
+        cursor.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield from rows
+        cursor.close()
+    finally:
+        conn.close()
+
+def fetch_one_row(query, params=()):
+    """Runs a single-row query (e.g. a COUNT/SUM total) and returns the tuple, or None."""
+    conn = get_db_connection()
+    if conn is None:
+        return None
+    try:
+        cursor = conn.cursor()
+        cursor.execute(query, params)
+        row = cursor.fetchone()
+        cursor.close()
+        return row
+    finally:
+        conn.close()
+
+def report_download(export_format, basename, header, rows, footer=None):
+    """Wraps a row iterator in a streamed CSV/XLSX attachment response."""
+    mimetype, writer = EXPORT_FORMATS[export_format]
+    basename = secure_filename(basename) or 'report'
+    options = {'sheet_name': basename} if export_format == 'xlsx' else {}
+    return Response(stream_with_context(writer(header, rows, footer=footer, **options)),
+                    mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename={basename}.{export_format}'})
+
+def cached_report(name, params, fetch):
+    """Reads a report through the cache; the key covers `params` and the generations of its tables."""
+    def compute():
+        # With the per-process memory cache, a background job that just ran this
+        # report in another worker left its rows in the job table -- usable only if
+        # that run started after the last write to the report's tables
+        since = report_cache.invalidated_at(REPORT_TABLES[name])
+        rows = report_jobs.result_for(name, params, since=since)
+        return rows if rows is not None else fetch(**params)
+    return report_cache.get_or_compute(name, params, compute, tags=REPORT_TABLES[name])
+
+# --- BACKGROUND REPORT JOBS ---
+# ?async=1 on a report page queues the run and returns a job id instead of blocking
+# the worker. The job warms the report cache; the finished page is served from there.
+# With a shared (sqlite or redis://) cache any worker finds it. With the default per-process
+# memory cache the rows are also kept in the job table for result_ttl seconds, so
+# the redirect can land on any worker without running the report again.
+# max_concurrent: reports running at once on this host, across all worker processes
+REPORT_JOB_CONFIG = {
+    'db_path': os.path.join(app.instance_path, 'report_jobs.sqlite3'),
+    'max_concurrent': int(os.environ.get('REPORT_JOBS_MAX_CONCURRENT', 2)),
+    'max_queued': int(os.environ.get('REPORT_JOBS_MAX_QUEUED', 20)),
+    'stale_after': int(os.environ.get('REPORT_JOBS_STALE_AFTER', 30)),
+    'result_ttl': 0 if report_cache.backend.shared else int(os.environ.get('REPORT_JOBS_RESULT_TTL', 120))
+}
+
+REPORT_FETCHERS = {
+    'aging': fetch_aging_report,
+    'energy': fetch_energy_report,
+    'payment': fetch_payment_report,
+}
+
+def run_report_job(name, params):
+    with instrumentation.track(f"report_job.{name}"):
+        return cached_report(name, params, REPORT_FETCHERS[name])
+
+report_jobs = ReportJobQueue(
+    REPORT_JOB_CONFIG['db_path'],
+    {name: (lambda name=name, **params: run_report_job(name, params)) for name in REPORT_FETCHERS},
+    max_concurrent=REPORT_JOB_CONFIG['max_concurrent'],
+    max_queued=REPORT_JOB_CONFIG['max_queued'],
+    stale_after=REPORT_JOB_CONFIG['stale_after'],
+    result_ttl=REPORT_JOB_CONFIG['result_ttl']
+)
+report_jobs.purge()
+
+def enqueue_report(name, params, result_url):
+    """Queues a report and sends the browser to its status page."""
+    try:
+        job_id = report_jobs.submit(name, params, result_url=result_url)
+    except JobQueueFull:
+        flash('Too many reports are running right now. Please try again in a minute.', 'warning')
+        return redirect(url_for('contractor_dashboard'))
+    return redirect(url_for('report_job_status', job_id=job_id))
+
+@app.route('/reports/jobs/<string:job_id>')
+def report_job_status(job_id):
+    """Job progress as JSON (?format=json) or a self-refreshing page that forwards to the result."""
+    if 'contractor_logged_in' not in session:
+        return redirect(url_for('contractor_login'))
+
+    job = report_jobs.get(job_id)
+    if job is None:
+        return "Report job not found.", 404
+
+    if request.args.get('format') == 'json':
+        return jsonify(job)
+    if job['status'] == 'done':
+        return redirect(job['result_url'])
+    return render_template('report_job.html', job=job)
+
 @app.route('/admin/aging-report', methods=['GET', 'POST'])
 def aging_report():
     if 'contractor_logged_in' not in session:
@@ -898,36 +2732,40 @@ def aging_report():
 
     # 1. Look for the 'days' parameter in the URL
     days_param = request.args.get('days')
+    show_histogram = request.args.get('histogram') == '1'
     
     aging_apps = []
+    age_buckets = []
     days_threshold = 0  # Default display value for the input box
 
     # 2. ONLY run the query if the user has actually submitted the form
     if days_param is not None:
         try:
             days_threshold = int(days_param)
-            conn = get_db_connection()
-            if conn:
-                cursor = conn.cursor(dictionary=True)
-                # Parameterized query (R-10)
-                query = """
-                    SELECT SOP_Number, Building, Category, Submission_Date,
-                           DATEDIFF(CURDATE(), Submission_Date) AS Days_Old
-                    FROM REBATE
-                    WHERE Status = 'Pending' 
-                    AND DATEDIFF(CURDATE(), Submission_Date) > %s
-                    ORDER BY Days_Old DESC
-                """
-                cursor.execute(query, (days_threshold,))
-                aging_apps = cursor.fetchall()
-                cursor.close()
-                conn.close()
+
+            # Auditor export: stream the full set straight from the cursor
+            if request.args.get('format') in EXPORT_FORMATS:
+                return report_download(request.args['format'], f"aging_report_{days_threshold}_days",
+                                    ['SOP_Number', 'Building', 'Category', 'Submission_Date', 'Days_Old'],
+                                    stream_query_rows(queries.AGING_REPORT_QUERY, (days_threshold,)))
+
+            if request.args.get('async') == '1':
+                return enqueue_report('aging', {'days_threshold': days_threshold},
+                                      url_for('aging_report', days=days_threshold))
+
+            aging_apps = cached_report('aging', {'days_threshold': days_threshold}, fetch_aging_report) or []
+            if show_histogram:
+                age_buckets = cached_report('aging_buckets', {}, fetch_aging_buckets) or []
         except ValueError:
             days_threshold = 0
+        except mysql.connector.Error as err:
+            print(f"Database query error fetching aging report: {err}")
 
     # 3. Pass a boolean 'has_searched' so the HTML knows whether to show results
     return render_template('aging_report.html', 
                            apps=aging_apps, 
+                           buckets=age_buckets,
+                           show_histogram=show_histogram,
                            threshold=days_threshold, 
                            has_searched=(days_param is not None))
 
@@ -947,24 +2785,24 @@ def high_value_audit():
     if amount_param is not None:
         try:
             threshold = float(amount_param)
-            conn = get_db_connection()
-            cursor = conn.cursor(dictionary=True)
 
-            sql = """
-                SELECT 
-                    r.SOP_Number, r.Building, r.Category, 
-                    ra.Approved_Amount, ra.Payment_Date, ra.Office_Notes
-                FROM REBATE r
-                INNER JOIN REBATE_APPROVALS ra ON r.SOP_Number = ra.SOP_Number
-                WHERE ra.Approved_Amount >= %s
-                ORDER BY ra.Approved_Amount DESC
-            """
-            cursor.execute(sql, (threshold,))
-            apps = cursor.fetchall()
-            cursor.close()
-            conn.close()
+            # Spreadsheet export: streamed rows + a grand total computed in SQL
+            export_format = request.args.get('format')
+            if export_format in EXPORT_FORMATS:
+                def grand_total_row():
+                    count, total = fetch_one_row(queries.HIGH_VALUE_TOTAL_QUERY, (threshold,)) or (0, 0)
+                    return ['GRAND TOTAL', f"{count} records", '', total, '', '']
+                return report_download(export_format, f"high_value_audit_{threshold:g}",
+                                       ['SOP_Number', 'Building', 'Category', 'Approved_Amount',
+                                        'Payment_Date', 'Office_Notes'],
+                                       stream_query_rows(queries.HIGH_VALUE_QUERY, (threshold,)),
+                                       footer=grand_total_row)
+
+            apps = cached_report('high_value', {'threshold': threshold}, fetch_high_value_audit) or []
         except ValueError:
             threshold = 0.00
+        except mysql.connector.Error as err:
+            print(f"Database query error fetching high-value audit: {err}")
 
     # 3. Pass has_searched to the template
     return render_template('high_value_audit.html', 
@@ -979,41 +2817,19 @@ def energy_report():
     if 'contractor_logged_in' not in session:
         return redirect(url_for('contractor_login'))
     
-    conn = get_db_connection()
     campaign_metrics = []
-    
-    if conn is None:
-        flash('Could not connect to the database.', 'error')
-        return render_template('energy_report.html', metrics=campaign_metrics)
+
+    if request.args.get('async') == '1':
+        return enqueue_report('energy', {}, url_for('energy_report'))
 
     try:
-        cursor = conn.cursor(dictionary=True)
-        
-        query = """
-        SELECT 
-            C.Campaign_Name,
-            C.Category, -- Use the new, renamed column
-            COUNT(R.SOP_Number) AS Total_Applications,
-            SUM(CASE WHEN R.Status = 'Approved' THEN 1 ELSE 0 END) AS Approved_Applications,
-            COALESCE(SUM(RA.Approved_Amount), 0) AS Total_Approved_Rebates
-        FROM CAMPAIGN C
-        -- FINAL FIXED JOIN: Joining Category to Category
-        LEFT JOIN REBATE R ON C.Category = R.Category
-        LEFT JOIN REBATE_APPROVALS RA ON R.SOP_Number = RA.SOP_Number
-        GROUP BY C.Campaign_ID, C.Campaign_Name, C.Category
-        ORDER BY C.Campaign_Date DESC;
-        """
-        cursor.execute(query)
-        campaign_metrics = cursor.fetchall()
-        cursor.close()
-        
+        campaign_metrics = cached_report('energy', {}, fetch_energy_report)
+        if campaign_metrics is None:
+            flash('Could not connect to the database.', 'error')
+            campaign_metrics = []
     except mysql.connector.Error as err:
         print(f"Database query error fetching energy report: {err}")
         flash('Error fetching energy report data.', 'error')
-        
-    finally:
-        if conn and conn.is_connected():
-            conn.close()
 
     # Pass the calculated metrics to the template
     return render_template('energy_report.html', metrics=campaign_metrics)
@@ -1028,40 +2844,33 @@ def payment_report():
     start_date = request.args.get('start_date', '2024-01-01')
     end_date = request.args.get('end_date', '2025-12-31')
 
-    conn = get_db_connection()
     payments = [] 
     grand_total = 0
 
-    if conn:
-        try:
-            cursor = conn.cursor(dictionary=True)
-            
-            # 2. The JOIN Query - MUST have exactly two %s if passing start/end dates
-            query = """
-                SELECT 
-                    R.SOP_Number, 
-                    R.Department_ID, 
-                    R.Category, 
-                    R.Status,
-                    RA.Payment_Date, 
-                    COALESCE(RA.Approved_Amount, 0) AS Approved_Amount
-                FROM REBATE R
-                LEFT JOIN REBATE_APPROVALS RA ON R.SOP_Number = RA.SOP_Number
-                WHERE R.Status = 'Approved' 
-                AND (RA.Payment_Date BETWEEN %s AND %s OR RA.Payment_Date IS NULL)
-                ORDER BY RA.Payment_Date DESC
-            """
-            
-            # Ensure these two variables match the two %s above
-            cursor.execute(query, (start_date, end_date))
-            payments = cursor.fetchall()
-            
-            # 3. Calculate total safely using float conversion
-            grand_total = sum(float(p['Approved_Amount'] or 0) for p in payments)
-            
-            cursor.close()
-        finally:
-            conn.close()
+    if request.args.get('async') == '1':
+        return enqueue_report('payment', {'start_date': start_date, 'end_date': end_date},
+                              url_for('payment_report', start_date=start_date, end_date=end_date))
+
+    # Spreadsheet export: streamed rows + a grand total computed in SQL
+    export_format = request.args.get('format')
+    if export_format in EXPORT_FORMATS:
+        def grand_total_row():
+            count, total = fetch_one_row(queries.PAYMENT_TOTAL_QUERY, (start_date, end_date)) or (0, 0)
+            return ['GRAND TOTAL', '', '', f"{count} records", '', total]
+        return report_download(export_format, f"payment_report_{start_date}_to_{end_date}",
+                               ['SOP_Number', 'Department_ID', 'Category', 'Status',
+                                'Payment_Date', 'Approved_Amount'],
+                               stream_query_rows(queries.PAYMENT_REPORT_QUERY, (start_date, end_date)),
+                               footer=grand_total_row)
+
+    try:
+        payments = cached_report('payment', {'start_date': start_date, 'end_date': end_date},
+                                 fetch_payment_report) or []
+    except mysql.connector.Error as err:
+        print(f"Database query error fetching payment report: {err}")
+
+    # 3. Calculate total safely using float conversion
+    grand_total = sum(float(p['Approved_Amount'] or 0) for p in payments)
 
     return render_template('payment_report.html', 
                            payments=payments, 
@@ -1072,5 +2881,28 @@ def payment_report():
 # ==============================================================================
 #  RUN APPLICATION
 # ==============================================================================
+def create_app(config=None):
+    """
+    Entry point for WSGI servers (see wsgi.py / gunicorn.conf.py). Applies config
+    overrides and pending migrations up front, so a preloading server migrates
+    once in the master; requests never run migrations.
+    """
+    if config:
+        app.config.update(config)
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    move_legacy_attachments()
+    warm_templates()
+    with db_connection() as conn:
+        if conn is None:
+            print("Startup: database unavailable; /healthz/startup will keep retrying.")
+        elif not ensure_app_schema(conn):
+            print("Startup: schema not up to date; run `flask db-upgrade` (/healthz/startup answers 503 until then).")
+    return app
+
+def release_before_fork():
+    """Called in a preloading master before forking: workers must not inherit open MySQL sockets."""
+    db_pool.dispose()
+
+# Dev server only; use `gunicorn -c gunicorn.conf.py wsgi:app` in production
 if __name__ == "__main__":
-    app.run(debug=True)
\ No newline at end of file
+    create_app().run(debug=os.environ.get('FLASK_DEBUG') == '1')
\ No newline at end of file
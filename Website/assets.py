@@ -0,0 +1,231 @@
+# ==============================================================================
+# 🎨 STATIC ASSET PIPELINE
+# ==============================================================================
+# `flask --app Web build-assets` writes production copies of static files into
+# static/dist/:
+#   * CSS minified, images copied, every file renamed with a content hash
+#   * WebP (and AVIF, when the installed Pillow supports it) variants at a few
+#     widths plus a thumbnail for each JPG/PNG -- only if Pillow is installed
+#   * dist/manifest.json mapping "css/index.css" -> "dist/css/index.1a2b3c4d.css"
+# At runtime url_for('static', filename=...) is rewritten through the manifest,
+# so templates keep using the original names and hashed files can be cached
+# forever. Without a manifest everything is served from the source files.
+import hashlib
+import io
+import json
+import os
+import re
+import shutil
+
+from markupsafe import Markup, escape
+
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+IMAGE_WIDTHS = (480, 960, 1600)
+THUMBNAIL_WIDTH = 240
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+HASH_LENGTH = 10
+CACHE_FOREVER = 365 * 24 * 3600
+
+
+def _content_hash(data):
+    return hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+
+
+def _hashed_name(relative_path, data, suffix=''):
+    stem, ext = os.path.splitext(relative_path)
+    return f"{stem}{suffix}.{_content_hash(data)}{ext}"
+
+
+# --- CSS ---
+_CSS_COMMENT = re.compile(r'/\*.*?\*/', re.S)
+_CSS_STRING = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')')
+_CSS_SPACE = re.compile(r'\s+')
+_CSS_PUNCTUATION = re.compile(r'\s*([{};,>])\s*')
+_CSS_URL = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+
+
+def minify_css(text):
+    """Drops comments and whitespace that don't change meaning; quoted strings are left alone."""
+    text = _CSS_COMMENT.sub('', text)
+    parts = _CSS_STRING.split(text)
+    for i in range(0, len(parts), 2):  # even indexes are outside quotes
+        chunk = _CSS_SPACE.sub(' ', parts[i])
+        chunk = _CSS_PUNCTUATION.sub(r'\1', chunk)
+        # "color: red" -> "color:red" (a space *before* ':' can matter in selectors)
+        chunk = chunk.replace(': ', ':')
+        parts[i] = chunk.replace(';}', '}')
+    return ''.join(parts).strip()
+
+
+def _rewrite_css_urls(css, css_path, manifest):
+    """Points url(../img/x.jpg) at the hashed copy of x.jpg inside dist/."""
+    css_dir = os.path.dirname(css_path)
+
+    def replace(match):
+        target = match.group(2)
+        if target.startswith(('data:', 'http:', 'https:', '//', '/')):
+            return match.group(0)
+        source = os.path.normpath(os.path.join(css_dir, target)).replace(os.sep, '/')
+        hashed = manifest.get(source)
+        if hashed is None:
+            return match.group(0)
+        # dist/ mirrors the source layout, so the relative path still works
+        hashed_rel = os.path.relpath(hashed, os.path.join(DIST_DIR, css_dir)).replace(os.sep, '/')
+        return f"url('{hashed_rel}')"
+
+    return _CSS_URL.sub(replace, css)
+
+
+# --- IMAGES ---
+def _image_variants(source_path, relative_path, dist_root):
+    """Writes resized WebP/AVIF copies; returns {format: [{'width', 'path'}]} (empty without Pillow)."""
+    try:
+        from PIL import Image  # Optional dependency, only needed for image variants
+    except ImportError:
+        return {}, None
+
+    formats = ['webp']
+    try:
+        from PIL import features
+        if features.check('avif'):
+            formats.append('avif')
+    except Exception:
+        pass
+
+    variants = {fmt: [] for fmt in formats}
+    thumbnail = None
+    stem = os.path.splitext(relative_path)[0]
+    with Image.open(source_path) as original:
+        original.load()
+        image = original.convert('RGBA' if original.mode in ('RGBA', 'LA', 'P') else 'RGB')
+        # Never upscale; anything wider than the largest breakpoint is capped to it
+        widths = [w for w in IMAGE_WIDTHS if w < image.width] + [min(image.width, IMAGE_WIDTHS[-1])]
+        for width in sorted(set(widths)):
+            height = max(1, round(image.height * width / image.width))
+            resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+            for fmt in formats:
+                data = _encode(resized, fmt)
+                path = _hashed_name(f"{stem}.{fmt}", data, suffix=f"-{width}w")
+                _write(dist_root, path, data)
+                variants[fmt].append({'width': width, 'path': f"{DIST_DIR}/{path}"})
+
+        thumb = image.copy()
+        thumb.thumbnail((THUMBNAIL_WIDTH, THUMBNAIL_WIDTH * 4))
+        data = _encode(thumb, 'webp')
+        path = _hashed_name(f"{stem}.webp", data, suffix='-thumb')
+        _write(dist_root, path, data)
+        thumbnail = f"{DIST_DIR}/{path}"
+    return variants, thumbnail
+
+
+def _encode(image, fmt):
+    buffer = io.BytesIO()
+    image.save(buffer, format=fmt.upper(), quality=80 if fmt == 'webp' else 55)
+    return buffer.getvalue()
+
+
+def _write(dist_root, relative_path, data):
+    path = os.path.join(dist_root, relative_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+# --- BUILD ---
+def build(static_folder, log=print):
+    """Rebuilds static/dist/ from scratch and returns the manifest."""
+    dist_root = os.path.join(static_folder, DIST_DIR)
+    if os.path.isdir(dist_root):
+        shutil.rmtree(dist_root)
+    os.makedirs(dist_root)
+
+    files = {}
+    variants = {}
+    thumbnails = {}
+    sources = []
+    for folder, dirs, names in os.walk(static_folder):
+        dirs[:] = [d for d in dirs if os.path.join(folder, d) != dist_root and d != 'uploads']
+        for name in sorted(names):
+            full = os.path.join(folder, name)
+            sources.append((full, os.path.relpath(full, static_folder).replace(os.sep, '/')))
+
+    # Everything except CSS first, so stylesheets can point at hashed images
+    for full, rel in sources:
+        if rel.endswith('.css'):
+            continue
+        with open(full, 'rb') as f:
+            data = f.read()
+        hashed = _hashed_name(rel, data)
+        _write(dist_root, hashed, data)
+        files[rel] = f"{DIST_DIR}/{hashed}"
+        if rel.lower().endswith(IMAGE_EXTENSIONS):
+            image_variants, thumbnail = _image_variants(full, rel, dist_root)
+            if image_variants:
+                variants[rel] = image_variants
+                thumbnails[rel] = thumbnail
+
+    for full, rel in sources:
+        if not rel.endswith('.css'):
+            continue
+        with open(full, encoding='utf-8') as f:
+            original = f.read()
+        css = _rewrite_css_urls(minify_css(original), rel, files)
+        data = css.encode('utf-8')
+        hashed = _hashed_name(rel, data)
+        _write(dist_root, hashed, data)
+        files[rel] = f"{DIST_DIR}/{hashed}"
+        log(f"{rel}: {len(original.encode('utf-8'))} -> {len(data)} bytes")
+
+    manifest = {'files': files, 'variants': variants, 'thumbnails': thumbnails}
+    with open(os.path.join(dist_root, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    if not variants:
+        log("Pillow not installed: skipped WebP/AVIF variants.")
+    return manifest
+
+
+# --- RUNTIME ---
+class AssetManifest:
+    """Looks up hashed file names and image variants written by build()."""
+
+    def __init__(self, static_folder):
+        self.static_folder = static_folder
+        self.load()
+
+    def load(self):
+        path = os.path.join(self.static_folder, DIST_DIR, MANIFEST_NAME)
+        try:
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+        self.files = data.get('files', {})
+        self.variants = data.get('variants', {})
+        self.thumbnails = data.get('thumbnails', {})
+
+    def resolve(self, filename):
+        return self.files.get(filename, filename)
+
+    def is_fingerprinted(self, filename):
+        return filename.startswith(DIST_DIR + '/')
+
+    def responsive_image(self, url_for, filename, alt, sizes='100vw', **attrs):
+        """
+        <picture> with AVIF/WebP srcsets when variants exist, else a plain <img>.
+        Images are lazy-loaded unless loading='eager' is passed.
+        """
+        attrs.setdefault('loading', 'lazy')
+        attrs.setdefault('decoding', 'async')
+        extra = ''.join(f' {escape(k.replace("_", "-"))}="{escape(v)}"' for k, v in attrs.items())
+        img = f'<img src="{escape(url_for("static", filename=filename))}" alt="{escape(alt)}"{extra}>'
+        variants = self.variants.get(filename)
+        if not variants:
+            return Markup(img)
+        sources = []
+        for fmt in ('avif', 'webp'):
+            if fmt not in variants:
+                continue
+            srcset = ', '.join(f"{url_for('static', filename=v['path'])} {v['width']}w" for v in variants[fmt])
+            sources.append(f'<source type="image/{fmt}" srcset="{escape(srcset)}" sizes="{escape(sizes)}">')
+        return Markup(f"<picture>{''.join(sources)}{img}</picture>")
@@ -0,0 +1,124 @@
+# ==============================================================================
+# ⚡ ASYNC DATA ACCESS
+# ==============================================================================
+# mysql.connector is blocking, so coroutines don't talk to MySQL directly: each
+# query is handed to a small thread pool and runs on its own pooled connection.
+# A view that needs several independent result sets can then await them
+# together, and its latency becomes that of the slowest query instead of the
+# sum of all of them:
+#
+#   totals, page = await asyncio.gather(
+#       async_db.run(queries.fetch_one, queries.APPLICATION_TOTALS, ...),
+#       async_db.run(queries.fetch_all, queries.APPLICATION_PAGE, ...),
+#   )
+#
+# Each awaited query holds a pooled connection of its own, so this only pays off
+# for reads slow enough to overlap; a couple of tiny reads are cheaper back to
+# back on one connection.
+#
+# Async views need Flask's async extra (requirements.txt installs flask[async]).
+# Without it @async_view runs the coroutine on a private event loop instead, so
+# the same view works either way.
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import mysql.connector
+
+from instrumentation import Instrumentation, QueryStats, charged_to
+
+try:
+    import asgiref  # Installed by flask[async]; lets Flask run `async def` views itself
+except ImportError:
+    asgiref = None
+
+
+class DatabaseUnavailable(mysql.connector.errors.InterfaceError):
+    """No connection could be checked out of the pool."""
+
+
+def async_view(view):
+    """Marks an `async def` view; falls back to asyncio.run() when Flask can't await it."""
+    if asgiref is not None:
+        return view
+
+    @functools.wraps(view)
+    def run_to_completion(*args, **kwargs):
+        return asyncio.run(view(*args, **kwargs))
+    return run_to_completion
+
+
+class AsyncDB:
+    """Awaitable queries on top of a blocking connect() function, one pooled connection per query."""
+
+    def __init__(self, connect, workers=8):
+        """
+        connect: function() returning a DB-API connection, or None if the database is down.
+        workers: queries that may run at the same time in this process (keep it within
+                 the connection pool's size + overflow).
+        """
+        self.connect = connect
+        self.workers = workers
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        # Created lazily so forked WSGI workers each start their own threads
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='async-db')
+            return self._executor
+
+    async def run(self, work, *args):
+        """Awaits work(conn, *args) on a worker thread with a connection of its own."""
+        # Gathered tasks run on several threads at once, so each fills a QueryStats of its
+        # own; it is merged into the request's stats back here, on the caller's thread
+        parent = Instrumentation.current()
+        stats = QueryStats()
+
+        def call():
+            with charged_to(stats):
+                conn = self.connect()
+                if conn is None:
+                    raise DatabaseUnavailable("Could not connect to the database.")
+                try:
+                    return work(conn, *args)
+                finally:
+                    conn.close()
+
+        context = contextvars.copy_context()
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self._pool(), context.run, call)
+        finally:
+            if parent is not None:
+                parent.merge(stats)
+
+    async def fetchall(self, sql, params=(), dictionary=True):
+        def query(conn):
+            cursor = conn.cursor(dictionary=dictionary)
+            try:
+                cursor.execute(sql, params)
+                return cursor.fetchall()
+            finally:
+                cursor.close()
+        return await self.run(query)
+
+    async def fetchone(self, sql, params=(), dictionary=True):
+        def query(conn):
+            # Buffered, so closing the cursor doesn't trip over rows left unread
+            cursor = conn.cursor(dictionary=dictionary, buffered=True)
+            try:
+                cursor.execute(sql, params)
+                return cursor.fetchone()
+            finally:
+                cursor.close()
+        return await self.run(query)
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
@@ -0,0 +1,140 @@
+# ==============================================================================
+# 🔑 PASSWORD HASHING
+# ==============================================================================
+# Password_ID columns hold "scrypt$n$r$p$salt$hash" strings. Rows still holding
+# a plaintext value keep working: they're compared in constant time and flagged
+# for rehashing, so the login route can upgrade them in place.
+# Hashing runs on the request's own thread (hashlib.scrypt releases the GIL), but
+# only `workers` hashes may run at once per process: each one takes ~16 MB and a
+# core. A login that can't get a slot within `queue_timeout` seconds is turned
+# away with HashingBusy (a 503) instead of piling up behind the others.
+import base64
+import hashlib
+import hmac
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+HASH_PREFIX = 'scrypt'
+
+
+class HashingBusy(Exception):
+    """Every hashing slot stayed taken for queue_timeout seconds."""
+
+    def __init__(self, retry_after=1):
+        super().__init__("Too many password checks in progress")
+        self.retry_after = retry_after
+
+
+def _b64(data):
+    return base64.b64encode(data).decode('ascii').rstrip('=')
+
+
+def _unb64(text):
+    return base64.b64decode(text + '=' * (-len(text) % 4))
+
+
+def _as_bytes(value):
+    return str(value).encode('utf-8')
+
+
+class PasswordHasher:
+    """scrypt hashing with a tunable work factor and a per-process cap on concurrent hashes."""
+
+    def __init__(self, n=2 ** 14, r=8, p=1, salt_bytes=16, key_bytes=32, workers=2, queue_timeout=2.0):
+        """
+        workers: hashes allowed to run at the same time in this process.
+        queue_timeout: seconds a caller may wait for a free slot before HashingBusy.
+        """
+        self.n = n
+        self.r = r
+        self.p = p
+        self.salt_bytes = salt_bytes
+        self.key_bytes = key_bytes
+        self.workers = workers
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(workers)
+        # Verified against when an identifier has no account, so "no such user"
+        # takes as long as "wrong password"
+        self._dummy_hash = self._hash(os.urandom(16).hex())
+
+    # --- RAW (CALLER'S THREAD) ---
+    def _derive(self, password, salt, n, r, p, key_bytes):
+        return hashlib.scrypt(_as_bytes(password), salt=salt, n=n, r=r, p=p,
+                              maxmem=128 * r * (n + p + 2), dklen=key_bytes)
+
+    def _hash(self, password, n=None):
+        n = n or self.n
+        salt = os.urandom(self.salt_bytes)
+        key = self._derive(password, salt, n, self.r, self.p, self.key_bytes)
+        return f"{HASH_PREFIX}${n}${self.r}${self.p}${_b64(salt)}${_b64(key)}"
+
+    def _verify(self, stored, password):
+        """Returns (matches, needs_rehash)."""
+        if stored is None:
+            return False, False
+        stored = str(stored)
+        if not self.is_hashed(stored):
+            # Legacy plaintext value: still compared in constant time
+            matches = hmac.compare_digest(_as_bytes(stored), _as_bytes(password))
+            return matches, matches
+        try:
+            _, n, r, p, salt, key = stored.split('$')
+            n, r, p = int(n), int(r), int(p)
+            expected = _unb64(key)
+            actual = self._derive(password, _unb64(salt), n, r, p, len(expected))
+        except (ValueError, TypeError):
+            return False, False
+        matches = hmac.compare_digest(actual, expected)
+        return matches, matches and (n, r, p) != (self.n, self.r, self.p)
+
+    @staticmethod
+    def is_hashed(stored):
+        return str(stored).startswith(HASH_PREFIX + '$')
+
+    # --- BOUNDED ---
+    @contextmanager
+    def _slot(self):
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            raise HashingBusy(retry_after=max(1, int(self.queue_timeout)))
+        try:
+            yield
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        """Salted hash of a new password, ready to store in a Password_ID column."""
+        with self._slot():
+            return self._hash(password)
+
+    def verify(self, stored, password):
+        """
+        Checks a password against a stored value (hash or legacy plaintext).
+        Returns (matches, needs_rehash); needs_rehash is True for plaintext or an
+        outdated work factor.
+        """
+        with self._slot():
+            return self._verify(stored, password)
+
+    def verify_dummy(self, password):
+        """Burns the same time as a real verify; use when the account doesn't exist."""
+        self.verify(self._dummy_hash, password)
+        return False
+
+    # --- TUNING ---
+    def benchmark(self, costs=None, samples=20):
+        """Times hashing at several work factors: {n: {'p50_ms', 'p99_ms'}}."""
+        results = {}
+        for n in costs or (2 ** 12, 2 ** 13, 2 ** 14, 2 ** 15, 2 ** 16):
+            timings = []
+            for _ in range(samples):
+                started = time.perf_counter()
+                self._hash('benchmark-password', n=n)
+                timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+            results[n] = {
+                'p50_ms': round(timings[len(timings) // 2], 2),
+                'p99_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.99))], 2),
+            }
+        return results
@@ -0,0 +1,267 @@
+# ==============================================================================
+# 🔌 MYSQL CONNECTION POOL
+# ==============================================================================
+# A small managed pool that sits behind get_db_connection() in Web.py.
+# Routes keep calling conn.close() as before -- on a pooled connection that
+# hands the socket back to the pool instead of tearing it down.
+import threading
+import time
+from collections import OrderedDict, deque
+
+import mysql.connector
+
+
+class PoolTimeout(mysql.connector.Error):
+    """Raised when no connection frees up within the checkout timeout."""
+
+
+def socket_open(raw):
+    """
+    Whether the connector still holds its socket, from local state only. Unlike
+    raw.is_connected() this costs no round trip; a socket the server has dropped
+    is caught by the ping on the next checkout instead.
+    """
+    if hasattr(raw, '_socket'):  # Pure-Python connector
+        return raw._socket is not None
+    return getattr(raw, '_cmysql', None) is not None  # C extension
+
+
+# --- POOLED CONNECTION WRAPPER ---
+class PooledConnection:
+    """Proxy around a raw MySQL connection whose close() returns it to the pool."""
+
+    def __init__(self, pool, raw_conn, created_at):
+        self._pool = pool
+        self._raw = raw_conn
+        self._created_at = created_at
+        self._released = False
+
+    def __getattr__(self, name):
+        # Everything we don't override (cursor, commit, rollback...) goes to the real connection
+        return getattr(self._raw, name)
+
+    def is_connected(self):
+        # Local check: routes call this right before close(), which must stay free of round trips
+        return not self._released and socket_open(self._raw)
+
+    def prepared_cursor(self, sql):
+        """Cursor holding a server-side prepared statement for `sql`, reused while this socket lives."""
+        return self._pool._prepared_cursor(self._raw, sql)
+
+    def close(self):
+        """Returns the connection to the pool. Safe to call more than once."""
+        if self._released:
+            return
+        self._released = True
+        self._pool._release(self._raw, self._created_at)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+# --- THE POOL ---
+class ConnectionPool:
+    """
+    Fixed-size pool with overflow. Up to `pool_size` idle connections are kept
+    warm; up to `max_overflow` extra ones may be opened under load and are closed
+    as soon as they come back. Connections are pinged on checkout and replaced
+    once they are older than `recycle` seconds.
+    """
+
+    def __init__(self, db_config, pool_size=5, max_overflow=10, timeout=30,
+                 recycle=3600, pre_ping=True, max_prepared=64):
+        """max_prepared: prepared statements kept per connection (least recently used are closed)."""
+        self.db_config = dict(db_config)
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.recycle = recycle
+        self.pre_ping = pre_ping
+        self.max_prepared = max_prepared
+        self._statements = {}  # id(raw_conn) -> OrderedDict(sql -> prepared cursor)
+
+        self._idle = deque()  # (raw_conn, created_at)
+        self._lock = threading.Condition()
+        self._open = 0  # idle + checked out
+
+        # Monitoring counters
+        self._in_use = 0
+        self._peak_in_use = 0
+        self._created = 0
+        self._recycled = 0
+        self._invalidated = 0
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_time = 0.0
+        self._timeouts = 0
+        self._prepares = 0
+        self._prepared_reuses = 0
+
+    # --- CHECKOUT ---
+    def acquire(self, timeout=None):
+        """Checks out a healthy connection, waiting up to `timeout` (default: the pool's) seconds if exhausted."""
+        timeout = self.timeout if timeout is None else timeout
+        deadline = None
+        waited_since = None
+        with self._lock:
+            while True:
+                if self._idle:
+                    raw, created_at = self._idle.pop()
+                    break
+                if self._open < self.pool_size + self.max_overflow:
+                    # Reserve the slot now, open the socket outside the lock
+                    self._open += 1
+                    raw, created_at = None, None
+                    break
+                if waited_since is None:
+                    waited_since = time.monotonic()
+                    deadline = waited_since + timeout
+                    self._waits += 1
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    self._wait_time += time.monotonic() - waited_since
+                    raise PoolTimeout(msg=f"Connection pool exhausted after {timeout}s")
+                self._lock.wait(remaining)
+
+            if waited_since is not None:
+                self._wait_time += time.monotonic() - waited_since
+            self._in_use += 1
+            self._checkouts += 1
+            self._peak_in_use = max(self._peak_in_use, self._in_use)
+
+        try:
+            if raw is not None:
+                raw, created_at = self._validate(raw, created_at)
+            else:
+                raw, created_at = self._connect()
+        except Exception:
+            with self._lock:
+                self._open -= 1
+                self._in_use -= 1
+                self._lock.notify()
+            raise
+
+        return PooledConnection(self, raw, created_at)
+
+    def _connect(self):
+        raw = mysql.connector.connect(**self.db_config)
+        with self._lock:
+            self._created += 1
+        return raw, time.monotonic()
+
+    def _validate(self, raw, created_at):
+        """Swaps out connections that are too old or fail a ping."""
+        if self.recycle is not None and time.monotonic() - created_at > self.recycle:
+            self._discard(raw)
+            with self._lock:
+                self._recycled += 1
+            return self._connect()
+        if self.pre_ping:
+            try:
+                raw.ping(reconnect=False)
+            except mysql.connector.Error:
+                self._discard(raw)
+                with self._lock:
+                    self._invalidated += 1
+                return self._connect()
+        return raw, created_at
+
+    # --- CHECKIN ---
+    def _release(self, raw, created_at):
+        keep = False
+        try:
+            # Decided from local state: the one ping per checkout happens in _validate().
+            # A streamed result abandoned half-way can't be reused without draining it
+            if socket_open(raw) and not raw.unread_result:
+                # Never hand the next request someone else's open transaction
+                if raw.in_transaction:
+                    raw.rollback()
+                keep = True
+        except mysql.connector.Error:
+            keep = False
+
+        with self._lock:
+            self._in_use -= 1
+            if keep and len(self._idle) < self.pool_size:
+                self._idle.append((raw, created_at))
+                raw = None
+            else:
+                self._open -= 1
+            self._lock.notify()
+
+        if raw is not None:
+            self._discard(raw)
+
+    def _discard(self, raw):
+        # Prepared statements die with their connection
+        with self._lock:
+            self._statements.pop(id(raw), None)
+        try:
+            raw.close()
+        except mysql.connector.Error:
+            pass
+
+    # --- PREPARED STATEMENTS ---
+    def _prepared_cursor(self, raw, sql):
+        """
+        Only the thread that checked `raw` out calls this. mysql.connector re-prepares
+        whenever a cursor is given a different string object, so callers should pass
+        the same (e.g. sys.intern'ed) string each time.
+        """
+        with self._lock:
+            statements = self._statements.setdefault(id(raw), OrderedDict())
+        cursor = statements.get(sql)
+        if cursor is not None:
+            statements.move_to_end(sql)
+            with self._lock:
+                self._prepared_reuses += 1
+            return cursor
+
+        cursor = raw.cursor(prepared=True)
+        statements[sql] = cursor
+        while len(statements) > self.max_prepared:
+            _, oldest = statements.popitem(last=False)
+            try:
+                oldest.close()  # DEALLOCATE on the server
+            except mysql.connector.Error:
+                pass
+        with self._lock:
+            self._prepares += 1
+        return cursor
+
+    def dispose(self):
+        """Closes every idle connection (checked-out ones close when returned)."""
+        with self._lock:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._open -= len(idle)
+        for raw, _ in idle:
+            self._discard(raw)
+
+    # --- METRICS ---
+    def metrics(self):
+        """Snapshot of pool usage for the monitoring endpoint."""
+        with self._lock:
+            return {
+                'pool_size': self.pool_size,
+                'max_overflow': self.max_overflow,
+                'open': self._open,
+                'idle': len(self._idle),
+                'in_use': self._in_use,
+                'peak_in_use': self._peak_in_use,
+                'overflow': max(0, self._open - self.pool_size),
+                'checkouts': self._checkouts,
+                'created': self._created,
+                'recycled': self._recycled,
+                'invalidated': self._invalidated,
+                'waits': self._waits,
+                'wait_time_seconds': round(self._wait_time, 4),
+                'timeouts': self._timeouts,
+                'prepared_statements': sum(len(s) for s in self._statements.values()),
+                'prepares': self._prepares,
+                'prepared_reuses': self._prepared_reuses,
+            }
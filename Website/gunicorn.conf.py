@@ -0,0 +1,76 @@
+# ==============================================================================
+# 🦄 GUNICORN SETTINGS
+# ==============================================================================
+#   gunicorn -c gunicorn.conf.py wsgi:app
+#
+# Sizing: each worker process runs `threads` request threads, and each thread
+# needs at most one pooled MySQL connection, so threads follow DB_POOL_SIZE and
+# the worker count is capped by what the MySQL server allows in total
+# (DB_MAX_CONNECTIONS, minus headroom for admin tools and CLI jobs).
+# WEB_CONCURRENCY / WEB_THREADS override the computed values.
+#
+# The app is preloaded in the master so workers share its memory copy-on-write.
+# Graceful reload: `kill -HUP <master pid>` starts fresh workers and lets the old
+# ones finish in-flight requests. With preload_app the master keeps the code it
+# loaded, so deploy new code with a full restart (or USR2 + QUIT of the old master).
+import multiprocessing
+import os
+
+cpu_count = multiprocessing.cpu_count()
+pool_size = int(os.environ.get('DB_POOL_SIZE', 5))
+max_overflow = int(os.environ.get('DB_POOL_MAX_OVERFLOW', 10))
+db_budget = int(os.environ.get('DB_MAX_CONNECTIONS', 151)) - int(os.environ.get('DB_RESERVED_CONNECTIONS', 10))
+
+
+def auto_workers():
+    by_cpu = cpu_count * 2 + 1
+    by_db = max(1, db_budget // (pool_size + max_overflow))
+    return max(1, min(by_cpu, by_db))
+
+
+bind = os.environ.get('BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', auto_workers()))
+threads = int(os.environ.get('WEB_THREADS', pool_size))
+# Async views hand their queries to a per-worker thread pool (AsyncDB) whose queries
+# take pooled connections too: give it what the request threads leave of the pool
+os.environ.setdefault('ASYNC_DB_WORKERS', str(max(1, pool_size + max_overflow - threads)))
+worker_class = 'gthread'
+preload_app = True
+
+# The in-process report cache can't see invalidations made by other workers, so with
+# several of them the cache defaults to a SQLite file they all share (see report_cache.py)
+if workers > 1:
+    os.environ.setdefault('REPORT_CACHE_BACKEND', 'sqlite')
+
+timeout = int(os.environ.get('WEB_TIMEOUT', 60))
+graceful_timeout = int(os.environ.get('WEB_GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+# Recycle workers now and then so slow leaks can't build up; jitter avoids all restarting at once
+max_requests = int(os.environ.get('WEB_MAX_REQUESTS', 5000))
+max_requests_jitter = max_requests // 10
+
+accesslog = os.environ.get('WEB_ACCESS_LOG', '-')
+errorlog = '-'
+
+
+def when_ready(server):
+    server.log.info(f"Serving with {workers} workers x {threads} threads "
+                    f"({cpu_count} CPUs, pool {pool_size}+{max_overflow} per worker, DB budget {db_budget})")
+    if workers > 1 and os.environ.get('REPORT_CACHE_BACKEND') == 'memory':
+        server.log.warning("REPORT_CACHE_BACKEND=memory with several workers: a write only clears the "
+                           "reports cached by the worker that handled it; the others serve stale "
+                           "reports until REPORT_CACHE_TTL. Use 'sqlite' or a redis:// URL.")
+
+
+def pre_fork(server, worker):
+    # Connections opened by create_app() in the master must not be shared with children
+    import Web
+    Web.release_before_fork()
+
+
+def worker_exit(server, worker):
+    import Web
+    Web.report_jobs.shutdown(wait=False)
+    Web.preview_cache.shutdown(wait=False)
+    Web.async_db.shutdown(wait=False)
+    Web.db_pool.dispose()
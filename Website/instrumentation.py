@@ -0,0 +1,291 @@
+# ==============================================================================
+# 📈 REQUEST & QUERY INSTRUMENTATION
+# ==============================================================================
+# Every connection handed out by get_db_connection() is wrapped so its cursors
+# time each statement and count the rows fetched. The numbers are charged to
+# whatever is being tracked at the time -- the current request, or a named
+# task such as sync_rebate_approvals -- and rolled up per route for the
+# Prometheus-style /metrics endpoint. Anything slower than `slow_ms` is also
+# written out as a one-line JSON record.
+import json
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def _one_line(sql, limit=300):
+    if isinstance(sql, (bytes, bytearray)):
+        sql = sql.decode('utf-8', 'replace')
+    return _WHITESPACE.sub(' ', str(sql)).strip()[:limit]
+
+
+# --- PER-REQUEST COUNTERS ---
+class QueryStats:
+    """SQL work done while handling one request or task."""
+
+    __slots__ = ('statements', 'db_seconds', 'rows', 'slowest_seconds', 'slowest_sql')
+
+    def __init__(self):
+        self.statements = 0
+        self.db_seconds = 0.0
+        self.rows = 0
+        self.slowest_seconds = 0.0
+        self.slowest_sql = None
+
+    def record(self, sql, seconds):
+        self.statements += 1
+        self.db_seconds += seconds
+        if seconds > self.slowest_seconds:
+            self.slowest_seconds = seconds
+            self.slowest_sql = sql
+
+    def merge(self, other):
+        self.statements += other.statements
+        self.db_seconds += other.db_seconds
+        self.rows += other.rows
+        if other.slowest_seconds > self.slowest_seconds:
+            self.slowest_seconds = other.slowest_seconds
+            self.slowest_sql = other.slowest_sql
+
+
+_current = ContextVar('gtc_query_stats', default=None)
+
+
+@contextmanager
+def charged_to(stats):
+    """Charges SQL run in this block to `stats` instead of whatever is tracked right now."""
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+# --- CURSOR / CONNECTION WRAPPERS ---
+class InstrumentedCursor:
+    """Times execute/executemany and counts fetched rows; everything else passes through."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def _timed(self, method, operation, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return method(operation, *args, **kwargs)
+        finally:
+            stats = _current.get()
+            if stats is not None:
+                stats.record(operation, time.perf_counter() - started)
+
+    def execute(self, operation, *args, **kwargs):
+        return self._timed(self._cursor.execute, operation, *args, **kwargs)
+
+    def executemany(self, operation, *args, **kwargs):
+        return self._timed(self._cursor.executemany, operation, *args, **kwargs)
+
+    def _fetched(self, started, count):
+        stats = _current.get()
+        if stats is not None:
+            stats.db_seconds += time.perf_counter() - started
+            stats.rows += count
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = self._cursor.fetchone()
+        self._fetched(started, 0 if row is None else 1)
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        started = time.perf_counter()
+        rows = self._cursor.fetchmany(*args, **kwargs)
+        self._fetched(started, len(rows))
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = self._cursor.fetchall()
+        self._fetched(started, len(rows))
+        return rows
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._cursor.close()
+
+
+class InstrumentedConnection:
+    """Connection proxy whose cursors are instrumented."""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def cursor(self, *args, **kwargs):
+        return InstrumentedCursor(self._conn.cursor(*args, **kwargs))
+
+    def prepared_cursor(self, sql):
+        return InstrumentedCursor(self._conn.prepared_cursor(sql))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._conn.close()
+
+
+# --- ROLL-UP + EXPORT ---
+class RouteMetric:
+    __slots__ = ('requests', 'statuses', 'seconds', 'buckets', 'statements', 'db_seconds',
+                 'rows', 'max_rows', 'max_statements')
+
+    def __init__(self, bucket_count):
+        self.requests = 0
+        self.statuses = {}
+        self.seconds = 0.0
+        self.buckets = [0] * bucket_count
+        self.statements = 0
+        self.db_seconds = 0.0
+        self.rows = 0
+        self.max_rows = 0
+        self.max_statements = 0
+
+
+class Instrumentation:
+    """Collects per-route timings and SQL counters; renders them for Prometheus."""
+
+    def __init__(self, slow_ms=500, log=print, buckets=DEFAULT_BUCKETS):
+        """
+        slow_ms: requests/tasks slower than this are logged as one JSON line.
+        log: function(str) that receives the slow-request lines.
+        """
+        self.slow_ms = slow_ms
+        self.log = log
+        self.buckets = tuple(buckets)
+        self._routes = {}
+        self._lock = threading.Lock()
+
+    def wrap(self, conn):
+        return InstrumentedConnection(conn)
+
+    @staticmethod
+    def current():
+        """QueryStats being filled right now, or None outside a tracked request/task."""
+        return _current.get()
+
+    # --- REQUESTS ---
+    def start(self):
+        stats = QueryStats()
+        _current.set(stats)
+        return stats
+
+    def finish(self, route, stats, seconds, status='ok', **context):
+        _current.set(None)
+        self.observe(route, stats, seconds, status, **context)
+
+    # --- NAMED TASKS (CLI commands, background jobs) ---
+    @contextmanager
+    def track(self, name):
+        """Measures a block of work as if it were a route; nested work also counts toward the parent."""
+        parent = _current.get()
+        stats = QueryStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        status = 'ok'
+        try:
+            yield stats
+        except BaseException:
+            status = 'error'
+            raise
+        finally:
+            _current.reset(token)
+            self.observe(name, stats, time.perf_counter() - started, status)
+            if parent is not None:
+                parent.merge(stats)
+
+    def observe(self, route, stats, seconds, status='ok', **context):
+        with self._lock:
+            metric = self._routes.get(route)
+            if metric is None:
+                metric = self._routes[route] = RouteMetric(len(self.buckets))
+            metric.requests += 1
+            metric.statuses[str(status)] = metric.statuses.get(str(status), 0) + 1
+            metric.seconds += seconds
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    metric.buckets[i] += 1
+            metric.statements += stats.statements
+            metric.db_seconds += stats.db_seconds
+            metric.rows += stats.rows
+            metric.max_rows = max(metric.max_rows, stats.rows)
+            metric.max_statements = max(metric.max_statements, stats.statements)
+
+        if seconds * 1000 >= self.slow_ms:
+            record = {
+                'event': 'slow_request',
+                'route': route,
+                'status': status,
+                'duration_ms': round(seconds * 1000, 1),
+                'sql_statements': stats.statements,
+                'db_ms': round(stats.db_seconds * 1000, 1),
+                'rows_fetched': stats.rows,
+                'slowest_sql_ms': round(stats.slowest_seconds * 1000, 1),
+                'slowest_sql': _one_line(stats.slowest_sql) if stats.slowest_sql else None,
+            }
+            record.update(context)
+            self.log(json.dumps(record, default=str))
+
+    def render_prometheus(self, gauges=None, prefix='gtc'):
+        """Text exposition format: per-route histograms/counters plus any extra {name: value} gauges."""
+        with self._lock:
+            routes = sorted(self._routes.items())
+            lines = []
+
+            def family(name, kind, help_text):
+                lines.append(f"# HELP {prefix}_{name} {help_text}")
+                lines.append(f"# TYPE {prefix}_{name} {kind}")
+
+            family('route_requests_total', 'counter', 'Requests handled per route and status.')
+            for route, m in routes:
+                for status, count in sorted(m.statuses.items()):
+                    lines.append(f'{prefix}_route_requests_total{{route="{route}",status="{status}"}} {count}')
+
+            family('route_duration_seconds', 'histogram', 'Wall time per request.')
+            for route, m in routes:
+                for bound, count in zip(self.buckets, m.buckets):
+                    lines.append(f'{prefix}_route_duration_seconds_bucket{{route="{route}",le="{bound}"}} {count}')
+                lines.append(f'{prefix}_route_duration_seconds_bucket{{route="{route}",le="+Inf"}} {m.requests}')
+                lines.append(f'{prefix}_route_duration_seconds_sum{{route="{route}"}} {m.seconds:.6f}')
+                lines.append(f'{prefix}_route_duration_seconds_count{{route="{route}"}} {m.requests}')
+
+            for name, attr, kind, help_text, fmt in (
+                ('route_sql_statements_total', 'statements', 'counter', 'SQL statements executed.', '{}'),
+                ('route_db_seconds_total', 'db_seconds', 'counter', 'Time spent in MySQL calls.', '{:.6f}'),
+                ('route_rows_fetched_total', 'rows', 'counter', 'Rows fetched from MySQL.', '{}'),
+                ('route_rows_fetched_max', 'max_rows', 'gauge', 'Most rows fetched by a single request.', '{}'),
+                ('route_sql_statements_max', 'max_statements', 'gauge', 'Most statements in a single request.', '{}'),
+            ):
+                family(name, kind, help_text)
+                for route, m in routes:
+                    lines.append(f'{prefix}_{name}{{route="{route}"}} {fmt.format(getattr(m, attr))}')
+
+        for name, value in sorted((gauges or {}).items()):
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            lines.append(f"# TYPE {prefix}_{name} gauge")
+            lines.append(f"{prefix}_{name} {value}")
+        return '\n'.join(lines) + '\n'
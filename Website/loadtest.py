@@ -0,0 +1,372 @@
+# ==============================================================================
+# 🏋️ LOAD TEST & BENCHMARK HARNESS
+# ==============================================================================
+# 1. Seed a throwaway database with realistic volumes (never the real one):
+#      DB_NAME=Rebates_Bench python loadtest.py seed --rebates 50000
+# 2. Start the app against it:
+#      DB_NAME=Rebates_Bench flask --app Web run --port 5000
+# 3. Drive a mix of routes with concurrent clients and compare to a baseline:
+#      python loadtest.py run --clients 20 --duration 60 --baseline bench_baseline.json
+#      python loadtest.py run ... --save-baseline bench_baseline.json
+# The run prints p50/p95/p99 latency and requests/second per route and exits
+# non-zero if any route's p95 regressed past --tolerance versus the baseline.
+import argparse
+import http.cookiejar
+import json
+import os
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import datetime, timedelta
+
+CATEGORIES = ['Lighting', 'HVAC', 'Water Systems', 'Solar PV', 'Building Envelope', 'Controls']
+STATUSES = [('Pending', 40), ('Approved', 30), ('Rejected', 10), ('Request revision', 10), ('Draft', 10)]
+BUILDINGS = [f"{name} Hall" for name in ('Bilger', 'Hamilton', 'Keller', 'Kuykendall', 'Moore',
+                                         'Saunders', 'Holmes', 'Webster', 'Sakamaki', 'Watanabe')]
+BENCH_PASSWORD = 'benchmark'
+DEFAULT_MANIFEST = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'loadtest_manifest.json')
+
+
+# ==============================================================================
+# 🌱 SEEDER
+# ==============================================================================
+def _batched(cursor, sql, rows, batch_size=1000):
+    for start in range(0, len(rows), batch_size):
+        cursor.executemany(sql, rows[start:start + batch_size])
+
+
+def seed(args):
+    """Fills DB_NAME with deterministic fake data and writes a manifest the runner reads."""
+    import mysql.connector
+    import migrations
+    from Web import DB_CONFIG, password_hasher, rebuild_campaign_metrics, RECENT_ACTIVITY_LIMIT
+
+    if DB_CONFIG['database'] == 'Rebates' and not args.allow_main_db:
+        sys.exit("Refusing to seed the main 'Rebates' database; set DB_NAME=Rebates_Bench "
+                 "(or pass --allow-main-db).")
+
+    server_config = {k: v for k, v in DB_CONFIG.items() if k != 'database'}
+    conn = mysql.connector.connect(**server_config)
+    cursor = conn.cursor()
+    cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{DB_CONFIG['database']}`")
+    cursor.close()
+    conn.close()
+
+    conn = mysql.connector.connect(**DB_CONFIG)
+    migrations.upgrade(conn)
+    rng = random.Random(args.seed)
+    password_hash = password_hasher.hash(BENCH_PASSWORD)  # one hash is plenty for fake users
+    cursor = conn.cursor()
+    started = time.perf_counter()
+    try:
+        for table in ('REBATE_APPROVALS', 'REBATE', 'CAMPAIGN', 'APPLICANT', 'APPLICATION_SPONSOR', 'REVIEWER',
+                      'REBATE_RATES', 'CAMPAIGN_METRICS', 'SYNC_STATE', 'IDEMPOTENCY_KEYS', 'ATTACHMENT'):
+            cursor.execute(f"DELETE FROM {table}")
+
+        reviewers = [(i, f"Reviewer {i}", f"reviewer{i}@bench.gtc.test", password_hash)
+                     for i in range(1, args.reviewers + 1)]
+        _batched(cursor, "INSERT INTO REVIEWER (Reviewer_ID, Employee_Name, Email, Password_ID) "
+                         "VALUES (%s, %s, %s, %s)", reviewers)
+        sponsors = [(i, f"Sponsor {i}", f"sponsor{i}@bench.gtc.test", password_hash)
+                    for i in range(1, args.sponsors + 1)]
+        _batched(cursor, "INSERT INTO APPLICATION_SPONSOR (Sponsor_ID, Sponsor_Name, Email, Password_ID) "
+                         "VALUES (%s, %s, %s, %s)", sponsors)
+        applicants = [(1000 + i, f"Department {i}", f"dept{i}@bench.gtc.test", password_hash)
+                      for i in range(1, args.applicants + 1)]
+        _batched(cursor, "INSERT INTO APPLICANT (Department_ID, Department_Name, Email, Password_ID) "
+                         "VALUES (%s, %s, %s, %s)", applicants)
+
+        cursor.executemany("INSERT INTO REBATE_RATES (Category, Rate_Per_Application) VALUES (%s, %s)",
+                           [(category, rng.choice([250, 500, 750, 1000])) for category in CATEGORIES])
+        today = datetime.now()
+        campaigns = [(f"{rng.choice(CATEGORIES)} Campaign {i}", rng.choice(CATEGORIES),
+                      (today - timedelta(days=rng.randint(0, 730))).date())
+                     for i in range(1, args.campaigns + 1)]
+        _batched(cursor, "INSERT INTO CAMPAIGN (Campaign_Name, Category, Campaign_Date) VALUES (%s, %s, %s)",
+                 campaigns)
+
+        status_names = [s for s, _ in STATUSES]
+        status_weights = [w for _, w in STATUSES]
+        rebates, approvals = [], []
+        for sop in range(1, args.rebates + 1):
+            status = rng.choices(status_names, status_weights)[0]
+            submitted = today - timedelta(days=rng.randint(0, 730), minutes=rng.randint(0, 1439))
+            sponsor_id = rng.randint(1, args.sponsors)
+            rebates.append((sop, rng.choice(CATEGORIES), status, rng.choice(BUILDINGS), submitted,
+                            rng.choice(applicants)[0], sponsor_id, f"Benchmark application {sop}",
+                            rng.randint(1, 5)))
+            if status == 'Approved':
+                amount = rng.choice([500, 1500, 5000, 25000, 150000])
+                paid = submitted + timedelta(days=rng.randint(5, 90)) if rng.random() < 0.6 else None
+                approvals.append((sop, sponsor_id, rng.randint(1, args.reviewers), amount, amount, paid, paid))
+        _batched(cursor, "INSERT INTO REBATE (SOP_Number, Category, Status, Building, Submission_Date, "
+                         "Department_ID, Sponsor_ID, Office_Notes, Num_Of_Applications) "
+                         "VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)", rebates)
+        _batched(cursor, "INSERT INTO REBATE_APPROVALS (SOP_Number, Sponsor_ID, Reviewer_ID, Approved_Amount, "
+                         "Disbursed_Amount_Display, Disbursed_Date, Payment_Date) "
+                         "VALUES (%s, %s, %s, %s, %s, %s, %s)", approvals)
+        # The routes only maintain these incrementally, so start them from the seeded rows
+        migrations.rebuild_status_counts(cursor)
+        migrations.rebuild_recent_activity(cursor, RECENT_ACTIVITY_LIMIT)
+        conn.commit()
+        rebuild_campaign_metrics(conn)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+    manifest = {
+        'database': DB_CONFIG['database'],
+        'seed': args.seed,
+        'password': BENCH_PASSWORD,
+        'reviewers': [r[2] for r in reviewers],
+        'sponsors': [s[2] for s in sponsors],
+        'applicants': [a[2] for a in applicants],
+        'sop_range': [1, args.rebates],
+        'pending_sops': [r[0] for r in rebates if r[2] == 'Pending'][:5000],
+    }
+    os.makedirs(os.path.dirname(args.manifest), exist_ok=True)
+    with open(args.manifest, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+    print(f"Seeded {len(rebates)} rebates, {len(approvals)} approvals, {len(campaigns)} campaigns, "
+          f"{len(reviewers) + len(sponsors) + len(applicants)} users in "
+          f"{time.perf_counter() - started:.1f}s -> {args.manifest}")
+
+
+# ==============================================================================
+# 🚦 LOAD RUNNER
+# ==============================================================================
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    """Times each request on its own instead of folding in the redirect target."""
+
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class Results:
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self._lock = threading.Lock()
+
+    def add(self, route, seconds, ok):
+        with self._lock:
+            self.latencies.setdefault(route, []).append(seconds)
+            if not ok:
+                self.errors[route] = self.errors.get(route, 0) + 1
+
+
+class VirtualClient:
+    """One browser: its own cookie jar, logged in as one role, looping over a weighted route mix."""
+
+    def __init__(self, base_url, role, email, manifest, rng, read_only):
+        self.base_url = base_url.rstrip('/')
+        self.role = role
+        self.email = email
+        self.manifest = manifest
+        self.rng = rng
+        self.read_only = read_only
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _NoRedirect())
+
+    def request(self, results, route, path, data=None):
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        started = time.perf_counter()
+        try:
+            with self.opener.open(self.base_url + path, data=body, timeout=60) as response:
+                response.read()
+                ok = response.status < 400
+                location = None
+        except urllib.error.HTTPError as e:
+            # Redirects surface here because _NoRedirect declines to follow them
+            e.read()
+            ok = e.code in (301, 302, 303)
+            location = e.headers.get('Location')
+        except (urllib.error.URLError, OSError):
+            ok, location = False, None
+        if results is not None:
+            results.add(route, time.perf_counter() - started, ok)
+        return ok, location
+
+    def login(self, results):
+        ok, location = self.request(results, 'login', '/login-submit',
+                                    {'username': self.email, 'password': self.manifest['password']})
+        # A failed login bounces back to a login page
+        return ok and location is not None and 'login' not in location
+
+    def actions(self):
+        sop = self.rng.choice(self.manifest['pending_sops'] or [self.manifest['sop_range'][1]])
+        if self.role == 'reviewer':
+            mix = [
+                (20, 'contractor_dashboard', '/dashboard', None),
+                (20, 'view_all_applications', '/view-all-applications?status_filter=pending', None),
+                (15, 'review_application', f'/review-application/{sop}', None),
+                (8, 'aging_report', '/admin/aging-report?days=30', None),
+                (6, 'energy_report', '/energy-report', None),
+                (6, 'payment_report', '/payment-report?start_date=2024-01-01&end_date=2025-12-31', None),
+                (5, 'high_value_audit', '/high-value-audit?amount=100000', None),
+            ]
+            if not self.read_only:
+                mix.append((5, 'process_decision', f'/process-decision/{sop}',
+                            {'action': 'Request revision', 'notes_to_applicant': 'Load test', 'approved_amount': ''}))
+        elif self.role == 'sponsor':
+            mix = [(30, 'sponsor_dashboard', '/sponsor-dashboard', None),
+                   (10, 'sponsor_approvals', '/sponsor-approvals', None)]
+        else:
+            mix = [(30, 'user_dashboard', '/user-dashboard', None)]
+            if not self.read_only:
+                mix.append((5, 'user_submit_eia', '/user-submit-eia',
+                            {'project_type': self.rng.choice(CATEGORIES), 'building': self.rng.choice(BUILDINGS),
+                             'sponsor': 1, 'description': 'Load test retrofit application'}))
+        mix.append((2, 'index', '/', None))
+        return mix
+
+    def run(self, results, stop_at, record_after, think_time):
+        if not self.login(results if time.monotonic() >= record_after else None):
+            results.add('login_failed', 0.0, False)
+            return
+        while time.monotonic() < stop_at:
+            mix = self.actions()
+            _, route, path, data = self.rng.choices(mix, [weight for weight, *_ in mix])[0]
+            self.request(results if time.monotonic() >= record_after else None, route, path, data)
+            if think_time:
+                time.sleep(self.rng.uniform(0, think_time))
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def summarize(results, measured_seconds):
+    summary = {}
+    for route, values in sorted(results.latencies.items()):
+        values.sort()
+        summary[route] = {
+            'requests': len(values),
+            'errors': results.errors.get(route, 0),
+            'rps': round(len(values) / measured_seconds, 2),
+            'p50_ms': round(percentile(values, 50) * 1000, 2),
+            'p95_ms': round(percentile(values, 95) * 1000, 2),
+            'p99_ms': round(percentile(values, 99) * 1000, 2),
+        }
+    return summary
+
+
+def compare(summary, baseline, tolerance):
+    """Routes whose p95 grew by more than `tolerance` (0.2 = 20%) over the baseline."""
+    regressions = []
+    for route, stats in summary.items():
+        before = baseline.get('routes', {}).get(route)
+        if before and before['p95_ms'] > 0 and stats['p95_ms'] > before['p95_ms'] * (1 + tolerance):
+            regressions.append((route, before['p95_ms'], stats['p95_ms']))
+    return regressions
+
+
+def run(args):
+    with open(args.manifest, encoding='utf-8') as f:
+        manifest = json.load(f)
+
+    rng = random.Random(args.seed)
+    role_weights = [('reviewer', args.reviewer_share), ('sponsor', args.sponsor_share),
+                    ('applicant', 1 - args.reviewer_share - args.sponsor_share)]
+    results = Results()
+    started = time.monotonic()
+    record_after = started + args.warmup
+    stop_at = record_after + args.duration
+
+    threads = []
+    for i in range(args.clients):
+        role = rng.choices([r for r, _ in role_weights], [max(w, 0) for _, w in role_weights])[0]
+        email = rng.choice(manifest[role + 's'])
+        client = VirtualClient(args.base_url, role, email, manifest, random.Random(args.seed + i), args.read_only)
+        thread = threading.Thread(target=client.run, args=(results, stop_at, record_after, args.think_time),
+                                  daemon=True)
+        threads.append(thread)
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    summary = summarize(results, args.duration)
+    report = {
+        'recorded_at': datetime.now().isoformat(timespec='seconds'),
+        'base_url': args.base_url,
+        'clients': args.clients,
+        'duration_s': args.duration,
+        'read_only': args.read_only,
+        'total_rps': round(sum(s['rps'] for s in summary.values()), 2),
+        'routes': summary,
+    }
+
+    print(f"{'route':<24}{'reqs':>8}{'errs':>6}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for route, s in summary.items():
+        print(f"{route:<24}{s['requests']:>8}{s['errors']:>6}{s['rps']:>9}"
+              f"{s['p50_ms']:>10}{s['p95_ms']:>10}{s['p99_ms']:>10}")
+    print(f"Total: {report['total_rps']} req/s with {args.clients} clients")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {args.save_baseline}")
+    if args.baseline and os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(summary, json.load(f), args.tolerance)
+        for route, before, after in regressions:
+            print(f"REGRESSION  {route}: p95 {before} ms -> {after} ms")
+        if regressions:
+            sys.exit(1)
+        print(f"No p95 regressions beyond {args.tolerance:.0%} of {args.baseline}.")
+
+
+# ==============================================================================
+# 🧰 CLI
+# ==============================================================================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Seed a benchmark database and load-test the GTC app.")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    seed_parser = sub.add_parser('seed', help='Fill DB_NAME with fake users, rebates, approvals and campaigns.')
+    seed_parser.add_argument('--rebates', type=int, default=20000)
+    seed_parser.add_argument('--applicants', type=int, default=200)
+    seed_parser.add_argument('--sponsors', type=int, default=25)
+    seed_parser.add_argument('--reviewers', type=int, default=10)
+    seed_parser.add_argument('--campaigns', type=int, default=24)
+    seed_parser.add_argument('--seed', type=int, default=42, help='Random seed (same seed, same data).')
+    seed_parser.add_argument('--manifest', default=DEFAULT_MANIFEST)
+    seed_parser.add_argument('--allow-main-db', action='store_true')
+    seed_parser.set_defaults(func=seed)
+
+    run_parser = sub.add_parser('run', help='Drive concurrent clients against a running app.')
+    run_parser.add_argument('--base-url', default='http://127.0.0.1:5000')
+    run_parser.add_argument('--clients', type=int, default=10)
+    run_parser.add_argument('--duration', type=float, default=30, help='Measured seconds (after warm-up).')
+    run_parser.add_argument('--warmup', type=float, default=5)
+    run_parser.add_argument('--think-time', type=float, default=0.0, help='Max random pause between requests.')
+    run_parser.add_argument('--reviewer-share', type=float, default=0.3)
+    run_parser.add_argument('--sponsor-share', type=float, default=0.2)
+    run_parser.add_argument('--read-only', action='store_true', help='Skip submit/decision POSTs.')
+    run_parser.add_argument('--seed', type=int, default=42)
+    run_parser.add_argument('--manifest', default=DEFAULT_MANIFEST)
+    run_parser.add_argument('--output', help='Write this run as JSON.')
+    run_parser.add_argument('--baseline', help='Compare p95s against this JSON baseline.')
+    run_parser.add_argument('--save-baseline', help='Write this run as the new baseline.')
+    run_parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed p95 growth (0.2 = 20%%).')
+    run_parser.set_defaults(func=run)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
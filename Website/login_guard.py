@@ -0,0 +1,94 @@
+# ==============================================================================
+# 🛡️ LOGIN GUARD
+# ==============================================================================
+# Keeps typo storms and brute-force attempts away from MySQL:
+#   * a short-TTL negative cache of identifiers that matched no account at all
+#   * a per-identifier sliding window of failed attempts that locks the
+#     identifier out for a while once it is exceeded
+# State is per worker process, which is enough to absorb bursts.
+import threading
+import time
+from collections import deque
+
+
+class LoginGuard:
+
+    def __init__(self, max_failures=5, window=300, lockout=300, negative_ttl=30, max_tracked=10000):
+        self.max_failures = max_failures
+        self.window = window
+        self.lockout = lockout
+        self.negative_ttl = negative_ttl
+        self.max_tracked = max_tracked
+        self._failures = {}      # identifier -> deque of failure timestamps
+        self._locked_until = {}  # identifier -> unlock time
+        self._unknown = {}       # identifier -> negative cache expiry
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(identifier):
+        return identifier.strip().lower()
+
+    # --- RATE LIMITING ---
+    def retry_after(self, identifier):
+        """Seconds until this identifier may try again (0 if it isn't locked out)."""
+        key = self._key(identifier)
+        with self._lock:
+            until = self._locked_until.get(key)
+            if until is None:
+                return 0
+            remaining = until - time.monotonic()
+            if remaining <= 0:
+                del self._locked_until[key]
+                return 0
+            return int(remaining) + 1
+
+    def record_failure(self, identifier):
+        key = self._key(identifier)
+        now = time.monotonic()
+        with self._lock:
+            self._prune(now)
+            attempts = self._failures.setdefault(key, deque())
+            attempts.append(now)
+            while attempts and attempts[0] < now - self.window:
+                attempts.popleft()
+            if len(attempts) >= self.max_failures:
+                self._locked_until[key] = now + self.lockout
+                attempts.clear()
+
+    def record_success(self, identifier):
+        key = self._key(identifier)
+        with self._lock:
+            self._failures.pop(key, None)
+            self._locked_until.pop(key, None)
+            self._unknown.pop(key, None)
+
+    # --- NEGATIVE CACHE ---
+    def is_known_unknown(self, identifier):
+        """True if this identifier recently matched no account, so the lookup can be skipped."""
+        key = self._key(identifier)
+        with self._lock:
+            expires = self._unknown.get(key)
+            if expires is None:
+                return False
+            if expires < time.monotonic():
+                del self._unknown[key]
+                return False
+            return True
+
+    def remember_unknown(self, identifier):
+        with self._lock:
+            self._prune(time.monotonic())
+            self._unknown[self._key(identifier)] = time.monotonic() + self.negative_ttl
+
+    def forget(self, identifier):
+        """Drop cached state for an identifier (e.g. right after an account is created)."""
+        self.record_success(identifier)
+
+    def _prune(self, now):
+        # Keep memory bounded when someone sprays random identifiers
+        if len(self._unknown) > self.max_tracked:
+            self._unknown = {k: v for k, v in self._unknown.items() if v > now}
+        if len(self._failures) > self.max_tracked:
+            self._failures = {k: v for k, v in self._failures.items() if v and v[-1] > now - self.window}
+        if len(self._locked_until) > self.max_tracked:
+            self._locked_until = {k: v for k, v in self._locked_until.items() if v > now}
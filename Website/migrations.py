@@ -0,0 +1,481 @@
+# ==============================================================================
+# 🧱 SCHEMA MIGRATIONS
+# ==============================================================================
+# Versioned, forward-only migrations for the Rebates database. Each migration is
+# a function registered with @migration(version, description); applied versions
+# are recorded in SCHEMA_MIGRATIONS. Base tables use CREATE TABLE IF NOT EXISTS so
+# an existing phpMyAdmin-built database is adopted as-is.
+#
+#   flask --app Web db-upgrade         apply pending migrations
+#   flask --app Web db-status          show applied / pending versions
+#   flask --app Web db-explain-check   fail if a route query does a full table scan
+import mysql.connector
+
+import queries
+
+MIGRATIONS = []
+MIGRATION_LOCK = 'rebates_schema_migrations'
+
+
+def migration(version, description):
+    """Registers a migration function(cursor) under a unique, increasing version number."""
+    def register(func):
+        if any(m[0] == version for m in MIGRATIONS):
+            raise ValueError(f"Duplicate migration version {version}")
+        MIGRATIONS.append((version, description, func))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return func
+    return register
+
+
+# --- DDL HELPERS (MySQL has no IF NOT EXISTS for columns/indexes) ---
+def column_exists(cursor, table, column):
+    cursor.execute("""
+        SELECT COUNT(*) FROM INFORMATION_SCHEMA.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s
+    """, (table, column))
+    return cursor.fetchone()[0] > 0
+
+
+def index_exists(cursor, table, index_name):
+    cursor.execute("""
+        SELECT COUNT(*) FROM INFORMATION_SCHEMA.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s
+    """, (table, index_name))
+    return cursor.fetchone()[0] > 0
+
+
+def add_column(cursor, table, column, definition):
+    if not column_exists(cursor, table, column):
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+
+def add_index(cursor, table, index_name, columns, unique=False, fulltext=False):
+    if not index_exists(cursor, table, index_name):
+        kind = "FULLTEXT INDEX" if fulltext else "UNIQUE INDEX" if unique else "INDEX"
+        cursor.execute(f"CREATE {kind} {index_name} ON {table} ({', '.join(columns)})")
+
+
+def rebuild_status_counts(cursor):
+    """Recounts STATUS_COUNTS from REBATE."""
+    cursor.execute("DELETE FROM STATUS_COUNTS")
+    cursor.execute("INSERT INTO STATUS_COUNTS (Status, Total) SELECT Status, COUNT(*) FROM REBATE GROUP BY Status")
+
+
+def rebuild_recent_activity(cursor, limit=50):
+    """Refills the RECENT_ACTIVITY ring with the newest submissions, oldest first."""
+    cursor.execute("DELETE FROM RECENT_ACTIVITY")
+    cursor.execute("""
+        INSERT INTO RECENT_ACTIVITY (SOP_Number, Building, Category, Status, Changed_At)
+        SELECT SOP_Number, Building, Category, Status, Changed_At FROM (
+            SELECT SOP_Number, Building, Category, Status, COALESCE(Submission_Date, NOW()) AS Changed_At
+            FROM REBATE ORDER BY Submission_Date DESC, SOP_Number DESC LIMIT %s
+        ) Latest
+        ORDER BY Changed_At ASC, SOP_Number ASC
+    """, (limit,))
+
+
+def rebuild_campaign_metrics(cursor):
+    """Recomputes CAMPAIGN_METRICS from CAMPAIGN, REBATE and REBATE_APPROVALS (drops deleted campaigns)."""
+    cursor.execute("DELETE FROM CAMPAIGN_METRICS")
+    cursor.execute("""
+        INSERT INTO CAMPAIGN_METRICS
+        (Campaign_ID, Campaign_Name, Category, Campaign_Date,
+         Total_Applications, Approved_Applications, Total_Approved_Rebates)
+        SELECT C.Campaign_ID, C.Campaign_Name, C.Category, C.Campaign_Date,
+               COUNT(R.SOP_Number),
+               COALESCE(SUM(CASE WHEN R.Status = 'Approved' THEN 1 ELSE 0 END), 0),
+               COALESCE(SUM(RA.Approved_Amount), 0)
+        FROM CAMPAIGN C
+        LEFT JOIN REBATE R ON C.Category = R.Category
+        LEFT JOIN REBATE_APPROVALS RA ON R.SOP_Number = RA.SOP_Number
+        GROUP BY C.Campaign_ID, C.Campaign_Name, C.Category, C.Campaign_Date
+    """)
+    return cursor.rowcount
+
+
+# ==============================================================================
+# 📜 MIGRATIONS
+# ==============================================================================
+
+@migration(1, "Base Rebates tables")
+def base_tables(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS APPLICANT (
+            Department_ID INT NOT NULL PRIMARY KEY,
+            Department_Name VARCHAR(255) NOT NULL,
+            Email VARCHAR(255) NULL,
+            Password_ID VARCHAR(255) NULL
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS DEPARTMENT_USERS (
+            Department_ID INT NOT NULL PRIMARY KEY,
+            Password_ID VARCHAR(255) NULL
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS REVIEWER (
+            Reviewer_ID INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+            Employee_Name VARCHAR(255) NOT NULL,
+            Email VARCHAR(255) NOT NULL,
+            Password_ID VARCHAR(255) NULL
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS APPLICATION_SPONSOR (
+            Sponsor_ID INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+            Sponsor_Name VARCHAR(255) NOT NULL,
+            Email VARCHAR(255) NOT NULL,
+            Password_ID VARCHAR(255) NULL
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS CAMPAIGN (
+            Campaign_ID INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+            Campaign_Name VARCHAR(255) NOT NULL,
+            Category VARCHAR(100) NULL,
+            Campaign_Date DATE NULL
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS REBATE (
+            SOP_Number INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+            Category VARCHAR(100) NULL,
+            Status VARCHAR(50) NOT NULL DEFAULT 'Pending',
+            Building VARCHAR(255) NULL,
+            Submission_Date DATETIME NULL,
+            Department_ID INT NULL,
+            Sponsor_ID INT NULL,
+            Office_Notes TEXT NULL,
+            Num_Of_Applications INT NULL
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS REBATE_APPROVALS (
+            Approval_ID INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+            SOP_Number INT NOT NULL,
+            Sponsor_ID INT NULL,
+            Reviewer_ID INT NULL,
+            Approved_Amount DECIMAL(12, 2) NULL,
+            Disbursed_Amount_Display DECIMAL(12, 2) NULL,
+            Office_Notes TEXT NULL,
+            Start_Date DATE NULL,
+            Disbursed_Date DATETIME NULL,
+            Payment_Date DATETIME NULL
+        )
+    """)
+
+
+@migration(2, "App-owned helper tables: rates, sync state, campaign metrics")
+def helper_tables(cursor):
+    # Per-category payout rate used by sync_rebate_approvals (edit rows here instead of the code)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS REBATE_RATES (
+            Category VARCHAR(100) NOT NULL PRIMARY KEY,
+            Rate_Per_Application DECIMAL(10, 2) NOT NULL
+        )
+    """)
+    # One row per background job holding its high-water mark and last-run stats
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS SYNC_STATE (
+            Sync_Name VARCHAR(64) NOT NULL PRIMARY KEY,
+            High_Water_Mark DATETIME NULL,
+            Last_Run_At DATETIME NULL,
+            Rows_Inserted INT NOT NULL DEFAULT 0,
+            Duration_Ms INT NOT NULL DEFAULT 0
+        )
+    """)
+    # Materialized per-campaign totals behind /energy-report (see campaign_metrics_leaving/entered)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS CAMPAIGN_METRICS (
+            Campaign_ID INT NOT NULL PRIMARY KEY,
+            Campaign_Name VARCHAR(255) NULL,
+            Category VARCHAR(100) NULL,
+            Campaign_Date DATE NULL,
+            Total_Applications INT NOT NULL DEFAULT 0,
+            Approved_Applications INT NOT NULL DEFAULT 0,
+            Total_Approved_Rebates DECIMAL(14, 2) NOT NULL DEFAULT 0,
+            Refreshed_At TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        )
+    """)
+    # Bumped by MySQL on every UPDATE (including phpMyAdmin edits); the sync's high-water mark
+    add_column(cursor, 'REBATE', 'Last_Modified',
+               "TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP")
+
+
+@migration(3, "Composite indexes matching each route's WHERE / ORDER BY")
+def route_indexes(cursor):
+    # user_dashboard: WHERE Department_ID = ? ORDER BY Submission_Date DESC
+    add_index(cursor, 'REBATE', 'idx_rebate_dept_submitted', ['Department_ID', 'Submission_Date'])
+    # sponsor_dashboard: WHERE Sponsor_ID = ? ORDER BY Submission_Date DESC
+    add_index(cursor, 'REBATE', 'idx_rebate_sponsor_submitted', ['Sponsor_ID', 'Submission_Date'])
+    # aging_report: WHERE Status = 'Pending' AND Submission_Date < ?
+    add_index(cursor, 'REBATE', 'idx_rebate_status_submitted', ['Status', 'Submission_Date'])
+    # sync_rebate_approvals: WHERE Status = 'Approved' AND Last_Modified >= ?
+    add_index(cursor, 'REBATE', 'idx_rebate_status_modified', ['Status', 'Last_Modified'])
+    # energy metrics refresh + hub category filter: WHERE Category = ?
+    add_index(cursor, 'REBATE', 'idx_rebate_category_status', ['Category', 'Status'])
+    # contractor_dashboard recent activity: ORDER BY Submission_Date DESC LIMIT 5
+    add_index(cursor, 'REBATE', 'idx_rebate_submitted', ['Submission_Date'])
+    # Every REBATE R LEFT JOIN REBATE_APPROVALS RA ON R.SOP_Number = RA.SOP_Number
+    add_index(cursor, 'REBATE_APPROVALS', 'idx_approvals_sop', ['SOP_Number'])
+    # payment_report: Payment_Date BETWEEN ? AND ? (covering the amount)
+    add_index(cursor, 'REBATE_APPROVALS', 'idx_approvals_paid', ['Payment_Date', 'Approved_Amount'])
+    # high_value_audit: WHERE Approved_Amount >= ? ORDER BY Approved_Amount DESC
+    add_index(cursor, 'REBATE_APPROVALS', 'idx_approvals_amount', ['Approved_Amount'])
+    # sponsor_approvals: WHERE Sponsor_ID = ? ORDER BY SOP_Number DESC
+    add_index(cursor, 'REBATE_APPROVALS', 'idx_approvals_sponsor_sop', ['Sponsor_ID', 'SOP_Number'])
+    # energy metrics: CAMPAIGN joined on Category
+    add_index(cursor, 'CAMPAIGN', 'idx_campaign_category', ['Category'])
+    # Login lookups by email
+    add_index(cursor, 'REVIEWER', 'idx_reviewer_email', ['Email'])
+    add_index(cursor, 'APPLICATION_SPONSOR', 'idx_sponsor_email', ['Email'])
+    add_index(cursor, 'APPLICANT', 'idx_applicant_email', ['Email'])
+
+
+@migration(4, "One approval row per SOP_Number + idempotency keys for payment forms")
+def approvals_unique_sop(cursor):
+    # ON DUPLICATE KEY UPDATE in disburse_payment needs SOP_Number to be unique
+    cursor.execute("""
+        SELECT SOP_Number, COUNT(*) FROM REBATE_APPROVALS
+        GROUP BY SOP_Number HAVING COUNT(*) > 1 LIMIT 10
+    """)
+    duplicates = cursor.fetchall()
+    if duplicates:
+        listed = ', '.join(str(row[0]) for row in duplicates)
+        raise RuntimeError(f"REBATE_APPROVALS has duplicate rows for SOP_Number {listed}; "
+                           "merge them before running this migration.")
+    add_index(cursor, 'REBATE_APPROVALS', 'uq_approvals_sop', ['SOP_Number'], unique=True)
+    # The unique index covers every lookup the plain one served
+    if index_exists(cursor, 'REBATE_APPROVALS', 'idx_approvals_sop'):
+        cursor.execute("DROP INDEX idx_approvals_sop ON REBATE_APPROVALS")
+
+    # One row per submitted payment form; a repeat token means "already done"
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS IDEMPOTENCY_KEYS (
+            Token VARCHAR(64) NOT NULL PRIMARY KEY,
+            Scope VARCHAR(64) NOT NULL,
+            Created_At TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            INDEX idx_idempotency_created (Created_At)
+        )
+    """)
+
+
+@migration(5, "Password_ID columns wide enough for salted password hashes")
+def password_hash_columns(cursor):
+    # Hashes look like scrypt$16384$8$1$<salt>$<key> (~90 chars); hand-built tables
+    # may have used a short VARCHAR or even an INT for Password_ID
+    for table in ('REVIEWER', 'APPLICATION_SPONSOR', 'APPLICANT', 'DEPARTMENT_USERS'):
+        cursor.execute("""
+            SELECT DATA_TYPE, CHARACTER_MAXIMUM_LENGTH FROM INFORMATION_SCHEMA.COLUMNS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = 'Password_ID'
+        """, (table,))
+        row = cursor.fetchone()
+        if row is None:
+            continue
+        data_type, length = row
+        if data_type != 'varchar' or (length or 0) < 255:
+            cursor.execute(f"ALTER TABLE {table} MODIFY Password_ID VARCHAR(255) NULL")
+
+
+@migration(6, "Dashboard status counters and recent-activity ring")
+def dashboard_counters(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS STATUS_COUNTS (
+            Status VARCHAR(50) NOT NULL PRIMARY KEY,
+            Total INT NOT NULL DEFAULT 0
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS RECENT_ACTIVITY (
+            Activity_ID BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+            SOP_Number INT NOT NULL,
+            Building VARCHAR(255) NULL,
+            Category VARCHAR(100) NULL,
+            Status VARCHAR(50) NOT NULL,
+            Changed_At DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    # Start both from the current data; routes keep them up to date from here on
+    rebuild_status_counts(cursor)
+    rebuild_recent_activity(cursor)
+
+
+@migration(7, "Attachment metadata for uploaded documents")
+def attachments(cursor):
+    # The file itself lives on disk under ATTACHMENT_FOLDER/blobs/, named by Sha256;
+    # several rows (applications) can point at the same blob
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS ATTACHMENT (
+            Attachment_ID INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+            SOP_Number INT NOT NULL,
+            Sha256 CHAR(64) NOT NULL,
+            Original_Name VARCHAR(255) NOT NULL,
+            Content_Type VARCHAR(100) NOT NULL,
+            Size_Bytes BIGINT NOT NULL,
+            Uploaded_By VARCHAR(64) NULL,
+            Uploaded_At TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            INDEX idx_attachment_sop (SOP_Number, Attachment_ID),
+            INDEX idx_attachment_sha (Sha256)
+        )
+    """)
+
+
+@migration(8, "Full-text index for application search")
+def rebate_fulltext(cursor):
+    # MATCH() in queries.py must name exactly these columns, in this order. The first
+    # FULLTEXT index on an InnoDB table rebuilds it once (hidden FTS_DOC_ID column).
+    add_index(cursor, 'REBATE', 'ft_rebate_search', queries.SEARCH_COLUMNS, fulltext=True)
+
+
+@migration(9, "Indexes for incremental campaign metrics and the energy report")
+def campaign_metrics_indexes(cursor):
+    # Write routes apply deltas by Category; the energy report reads every row newest
+    # first, which a covering (Campaign_Date, ...) index serves without a filesort
+    add_index(cursor, 'CAMPAIGN_METRICS', 'idx_campaign_metrics_category', ['Category'])
+    add_index(cursor, 'CAMPAIGN_METRICS', 'idx_campaign_metrics_date',
+              ['Campaign_Date', 'Campaign_Name', 'Category', 'Total_Applications',
+               'Approved_Applications', 'Total_Approved_Rebates'])
+
+
+@migration(10, "Populate CAMPAIGN_METRICS from the existing rebates")
+def campaign_metrics_backfill(cursor):
+    # Built once here; from then on write routes and the approval sync keep it
+    # current, and `flask rebuild-campaign-metrics` recomputes it after adding a campaign
+    rebuild_campaign_metrics(cursor)
+
+
+# ==============================================================================
+# 🚚 RUNNER
+# ==============================================================================
+
+def ensure_migrations_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS SCHEMA_MIGRATIONS (
+            Version INT NOT NULL PRIMARY KEY,
+            Description VARCHAR(255) NOT NULL,
+            Applied_At TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def applied_versions(cursor):
+    ensure_migrations_table(cursor)
+    cursor.execute("SELECT Version FROM SCHEMA_MIGRATIONS")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def pending_migrations(conn):
+    cursor = conn.cursor()
+    try:
+        done = applied_versions(cursor)
+    finally:
+        cursor.close()
+    return [m for m in MIGRATIONS if m[0] not in done]
+
+
+def upgrade(conn, target=None, log=print):
+    """
+    Applies pending migrations in order (up to `target`) and returns the versions applied.
+    A MySQL named lock keeps several workers starting at once from racing each other.
+    """
+    cursor = conn.cursor()
+    applied = []
+    cursor.execute("SELECT GET_LOCK(%s, 60)", (MIGRATION_LOCK,))
+    if cursor.fetchone()[0] != 1:
+        cursor.close()
+        raise mysql.connector.Error(msg="Timed out waiting for the schema migration lock")
+    try:
+        done = applied_versions(cursor)
+        for version, description, func in MIGRATIONS:
+            if version in done or (target is not None and version > target):
+                continue
+            log(f"Applying migration {version}: {description}")
+            # DDL commits implicitly in MySQL, so each migration must be safe to re-run
+            func(cursor)
+            cursor.execute("INSERT INTO SCHEMA_MIGRATIONS (Version, Description) VALUES (%s, %s)",
+                           (version, description))
+            conn.commit()
+            applied.append(version)
+    finally:
+        cursor.execute("SELECT RELEASE_LOCK(%s)", (MIGRATION_LOCK,))
+        cursor.fetchone()
+        cursor.close()
+    return applied
+
+
+# ==============================================================================
+# 🔍 EXPLAIN CHECK
+# ==============================================================================
+# Representative shape of each hot route query with sample parameters. The check
+# EXPLAINs every one and reports any table read with access type ALL (full scan).
+# Tables listed in `allow_full_scan` are small by design and may be scanned.
+ROUTE_QUERIES = []
+
+
+def route_query(name, sql, params=(), allow_full_scan=()):
+    ROUTE_QUERIES.append({'name': name, 'sql': sql, 'params': params,
+                          'allow_full_scan': set(allow_full_scan)})
+
+
+route_query('user_dashboard', queries.USER_APPLICATIONS.sql, (1,))
+route_query('sponsor_dashboard', queries.SPONSOR_APPLICATIONS.sql, (1,))
+route_query('contractor_dashboard_counts', """
+    SELECT Status, Total FROM STATUS_COUNTS
+""", allow_full_scan=('STATUS_COUNTS',))
+route_query('contractor_dashboard_recent', """
+    SELECT Building, Category, Status, Changed_At
+    FROM RECENT_ACTIVITY ORDER BY Activity_ID DESC LIMIT 5
+""")
+route_query('aging_report', queries.AGING_REPORT_QUERY, (30,))
+route_query('aging_buckets', queries.AGING_BUCKETS_QUERY)
+route_query('high_value_audit', queries.HIGH_VALUE_QUERY, (100000,))
+route_query('high_value_total', queries.HIGH_VALUE_TOTAL_QUERY, (100000,))
+route_query('payment_report', queries.PAYMENT_REPORT_QUERY, ('2024-01-01', '2024-03-31'))
+route_query('payment_total', queries.PAYMENT_TOTAL_QUERY, ('2024-01-01', '2024-03-31'))
+route_query('sponsor_approvals', queries.SPONSOR_APPROVALS.with_suffix(
+    " WHERE Sponsor_ID = %s ORDER BY SOP_Number DESC"), (1,))
+route_query('review_application', queries.APPLICATION_DETAILS.sql, (1,))
+route_query('review_attachments', queries.ATTACHMENTS_FOR_SOP.sql, (1,))
+route_query('view_all_applications_page', queries.APPLICATION_PAGE.with_suffix(
+    " WHERE R.SOP_Number < %s ORDER BY R.SOP_Number DESC LIMIT 51"), (1000000,))
+route_query('application_search', queries.APPLICATION_SEARCH.with_suffix(
+    " ORDER BY Score DESC, R.SOP_Number DESC LIMIT %s OFFSET %s"), ('+led*', '+led*', 21, 0))
+route_query('search_typeahead', queries.SEARCH_TYPEAHEAD.with_suffix(
+    " AND R.Sponsor_ID = %s ORDER BY Score DESC, R.SOP_Number DESC LIMIT %s"), ('+bilg*', '+bilg*', 1, 8))
+route_query('energy_report', queries.ENERGY_REPORT_QUERY, allow_full_scan=('CAMPAIGN_METRICS',))
+# The per-SOP delta subquery behind campaign_metrics_leaving()/entered() in Web.py
+route_query('campaign_metrics_delta', """
+    SELECT R.Category, COUNT(*), COALESCE(SUM(RA.Approved_Amount), 0)
+    FROM REBATE R
+    LEFT JOIN REBATE_APPROVALS RA ON R.SOP_Number = RA.SOP_Number
+    WHERE R.SOP_Number IN (%s) GROUP BY R.Category
+""", (1,))
+route_query('login_resolver', """
+    SELECT 1 AS Priority, Employee_Name, Password_ID FROM REVIEWER WHERE Email = %s
+    UNION ALL SELECT 2, Sponsor_Name, Password_ID FROM APPLICATION_SPONSOR WHERE Email = %s
+    UNION ALL SELECT 3, Department_Name, Password_ID FROM APPLICANT WHERE Email = %s
+    UNION ALL SELECT 4, Department_Name, Password_ID FROM APPLICANT WHERE Department_ID = %s
+    ORDER BY Priority
+""", ('someone@hawaii.edu', 'someone@hawaii.edu', 'someone@hawaii.edu', 1))
+
+
+def explain_check(conn):
+    """EXPLAINs every registered route query; returns a list of (query name, table) full scans."""
+    cursor = conn.cursor(dictionary=True)
+    failures = []
+    try:
+        for entry in ROUTE_QUERIES:
+            cursor.execute("EXPLAIN " + entry['sql'], entry['params'])
+            for row in cursor.fetchall():
+                table = row.get('table')
+                # EXPLAIN reports the alias (R, RA...) when the query uses one; <union1,2>
+                # style rows are MySQL's own temporary tables, not base-table scans
+                if table and table.startswith('<'):
+                    continue
+                if row.get('type') == 'ALL' and table not in entry['allow_full_scan']:
+                    failures.append((entry['name'], table))
+    finally:
+        cursor.close()
+    return failures
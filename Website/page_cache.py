@@ -0,0 +1,151 @@
+# ==============================================================================
+# 📄 PUBLIC PAGE CACHE
+# ==============================================================================
+# Anonymous GETs of the public pages (index, impact, about...) are rendered
+# once, compressed once (gzip, plus brotli when the package is installed) and
+# then served from memory with ETag / Last-Modified so browsers get 304s.
+# Any request that carries a non-empty session -- a logged-in user, a pending
+# flash message -- bypasses the cache and renders normally.
+# Shared partials (the public header) are cached as rendered fragments too.
+# Pages are keyed on their path plus only the query parameters the view reads
+# (vary_args), so ?utm_source=... or cache-busting junk can't flood the cache.
+import gzip
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import Response, make_response, request, session
+from markupsafe import Markup
+
+try:
+    import brotli  # Optional dependency, only needed for Content-Encoding: br
+except ImportError:
+    brotli = None
+
+
+class CachedPage:
+    __slots__ = ('body', 'encoded', 'mimetype', 'etag', 'last_modified', 'expires_at')
+
+    def __init__(self, body, mimetype, ttl, min_compress_bytes):
+        self.body = body
+        self.mimetype = mimetype
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+        self.last_modified = datetime.now(timezone.utc).replace(microsecond=0)
+        self.expires_at = time.monotonic() + ttl
+        self.encoded = {}
+        if len(body) >= min_compress_bytes:
+            self.encoded['gzip'] = gzip.compress(body, compresslevel=6)
+            if brotli is not None:
+                self.encoded['br'] = brotli.compress(body, quality=11)
+
+    def is_fresh(self):
+        return self.expires_at > time.monotonic()
+
+
+class PageCache:
+    """In-process cache of whole anonymous pages and of shared template fragments."""
+
+    def __init__(self, ttl=300, max_age=60, max_entries=128, min_compress_bytes=512):
+        """
+        ttl: seconds a rendered page is reused before rendering again.
+        max_age: Cache-Control max-age sent to browsers (they revalidate with 304s after).
+        """
+        self.ttl = ttl
+        self.max_age = max_age
+        self.max_entries = max_entries
+        self.min_compress_bytes = min_compress_bytes
+        self._pages = OrderedDict()
+        self._fragments = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bypasses = 0
+        self.not_modified = 0
+
+    # --- WHOLE PAGES ---
+    def cached(self, view=None, vary_args=()):
+        """
+        Decorator for views whose output only depends on the URL when nobody is logged in.
+        vary_args: query parameters the view reads; every other parameter is ignored
+        in the cache key. Use as @page_cache.cached or @page_cache.cached(vary_args=('page',)).
+        """
+        if view is None:
+            return lambda view: self.cached(view, vary_args)
+
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or session:
+                self.bypasses += 1
+                return view(*args, **kwargs)
+
+            key = (request.path,) + tuple((name, tuple(request.args.getlist(name))) for name in vary_args)
+            with self._lock:
+                page = self._pages.get(key)
+                if page is not None and page.is_fresh():
+                    self._pages.move_to_end(key)
+                    self.hits += 1
+                else:
+                    page = None
+
+            if page is None:
+                response = make_response(view(*args, **kwargs))
+                # Only plain 200 pages that didn't touch the session are shareable
+                if response.status_code != 200 or response.direct_passthrough or session:
+                    return response
+                page = CachedPage(response.get_data(), response.mimetype, self.ttl, self.min_compress_bytes)
+                with self._lock:
+                    self.misses += 1
+                    self._pages[key] = page
+                    while len(self._pages) > self.max_entries:
+                        self._pages.popitem(last=False)
+            return self._respond(page)
+        return wrapper
+
+    def _respond(self, page):
+        if request.if_none_match:
+            unchanged = request.if_none_match.contains_weak(page.etag)
+        else:
+            since = request.if_modified_since
+            unchanged = since is not None and since >= page.last_modified
+
+        if unchanged:
+            self.not_modified += 1
+            response = Response(status=304)
+        else:
+            encoding = request.accept_encodings.best_match([e for e in ('br', 'gzip') if e in page.encoded])
+            response = Response(page.encoded[encoding] if encoding else page.body, mimetype=page.mimetype)
+            if encoding:
+                response.headers['Content-Encoding'] = encoding
+
+        # Weak: the gzip/br/plain bodies are different bytes of the same page
+        response.set_etag(page.etag, weak=True)
+        response.last_modified = page.last_modified
+        response.cache_control.public = True
+        response.cache_control.max_age = self.max_age
+        response.vary.update(('Accept-Encoding', 'Cookie'))
+        return response
+
+    # --- FRAGMENTS ---
+    def fragment(self, key, render):
+        """Returns the cached markup for `key`, rendering it with render() the first time."""
+        with self._lock:
+            markup = self._fragments.get(key)
+        if markup is None:
+            markup = Markup(render())
+            with self._lock:
+                self._fragments[key] = markup
+        return markup
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
+            self._fragments.clear()
+
+    def stats(self):
+        with self._lock:
+            pages, fragments = len(self._pages), len(self._fragments)
+        return {'hits': self.hits, 'misses': self.misses, 'bypasses': self.bypasses,
+                'not_modified': self.not_modified, 'pages': pages, 'fragments': fragments}
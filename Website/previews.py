@@ -0,0 +1,234 @@
+# ==============================================================================
+# 🖼️ ATTACHMENT PREVIEWS
+# ==============================================================================
+# Reviewers triage applications from small renderings instead of downloading
+# every scan. As soon as an upload is finished its blob is handed to a small
+# background pool that writes two WebP files per SHA-256:
+#   thumb    ~320 px wide, shown in the attachment list
+#   preview  ~1200 px wide, opened when a reviewer clicks the thumbnail
+# Images are rendered with Pillow; the first page of a PDF with PyMuPDF, or
+# poppler's `pdftoppm` when PyMuPDF isn't installed. Without those tools no
+# preview is made and the page falls back to the original file.
+#
+# Previews live on disk under <root>/ab/ab12...-thumb.webp and the directory is
+# capped at `max_bytes`: serving a preview bumps its mtime, and the least
+# recently used SHA-256s lose both files at once once the cap is exceeded. An
+# evicted (or never made) preview is simply scheduled again the next time it is
+# asked for.
+#
+# Uploads are untrusted: images whose header claims more than MAX_IMAGE_PIXELS
+# are refused before decoding, and JPEGs are decoded at reduced scale (draft), so
+# a small "decompression bomb" file can't balloon a preview thread's memory.
+import io
+import math
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from PIL import Image  # Optional dependency, needed for every preview
+except ImportError:
+    Image = None
+
+try:
+    import fitz  # PyMuPDF, optional: fastest way to rasterise a PDF page
+except ImportError:
+    fitz = None
+
+PREVIEW_WIDTHS = {'thumb': 320, 'preview': 1200}
+MAX_PREVIEW_WIDTH = max(PREVIEW_WIDTHS.values())
+MAX_IMAGE_PIXELS = 25_000_000  # a 25 MP photo; Pillow's own bomb limit is ~7x that
+IMAGE_TYPES = ('image/png', 'image/jpeg', 'image/webp')
+PDF_TYPE = 'application/pdf'
+RESCAN_EVERY = 50
+
+
+class PreviewCache:
+    """Generates thumbnails/first-page previews in the background and keeps them in an LRU-capped folder."""
+
+    def __init__(self, root, max_bytes=256 * 1024 * 1024, workers=2, quality=75, pdf_dpi=100, log=print):
+        """
+        max_bytes: disk budget for all previews; least recently served files go first.
+        workers: previews rendered at the same time in this process.
+        log: function(str) that receives preview failures (they happen off the request thread).
+        """
+        self.root = root
+        self.log = log
+        self.max_bytes = max_bytes
+        self.workers = workers
+        self.quality = quality
+        self.pdf_dpi = pdf_dpi
+        self._executor = None
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._bytes = None  # measured from disk on the first eviction check
+        self._since_scan = 0
+        self.hits = 0
+        self.misses = 0
+        self.generated = 0
+        self.failed = 0
+        self.evicted = 0
+        os.makedirs(root, exist_ok=True)
+
+    # --- LOOKUP ---
+    def supports(self, content_type):
+        if Image is None:
+            return False
+        if content_type in IMAGE_TYPES:
+            return True
+        return content_type == PDF_TYPE and (fitz is not None or shutil.which('pdftoppm') is not None)
+
+    def path_for(self, sha256, kind):
+        return os.path.join(self.root, sha256[:2], f"{sha256}-{kind}.webp")
+
+    def get(self, sha256, kind):
+        """Path of a ready preview (marking it recently used), or None if it isn't there."""
+        path = self.path_for(sha256, kind)
+        try:
+            os.utime(path)
+        except OSError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return path
+
+    def available(self, sha256):
+        """Both sizes exist (one of them may have been evicted or never written)."""
+        return all(os.path.exists(self.path_for(sha256, kind)) for kind in PREVIEW_WIDTHS)
+
+    # --- BACKGROUND GENERATION ---
+    def _pool(self):
+        # Created lazily so forked WSGI workers each start their own threads
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='preview')
+            return self._executor
+
+    def schedule(self, sha256, content_type, source_path):
+        """Queues preview generation unless it's unsupported, already done or already queued."""
+        if not self.supports(content_type) or self.available(sha256):
+            return False
+        with self._lock:
+            if sha256 in self._pending:
+                return False
+            self._pending.add(sha256)
+        self._pool().submit(self._generate, sha256, content_type, source_path)
+        return True
+
+    def _generate(self, sha256, content_type, source_path):
+        try:
+            with self._open(content_type, source_path) as image:
+                if image.width * image.height > MAX_IMAGE_PIXELS:
+                    raise ValueError(f"{image.width}x{image.height} image is too large to preview")
+                # JPEG decodes straight at a reduced scale; everything is shrunk to the
+                # largest preview before the mode conversion copies it
+                image.draft('RGB', (MAX_PREVIEW_WIDTH, MAX_PREVIEW_WIDTH * image.height // max(1, image.width)))
+                image.thumbnail((MAX_PREVIEW_WIDTH, image.height), Image.LANCZOS, reducing_gap=2.0)
+                image = image.convert('RGBA' if image.mode in ('RGBA', 'LA', 'P') else 'RGB')
+                for kind, width in sorted(PREVIEW_WIDTHS.items(), key=lambda item: -item[1]):
+                    self._write(image, self.path_for(sha256, kind), width)
+            self.generated += 1
+        except Exception as err:
+            self.failed += 1
+            self.log(f"Preview Error ({sha256[:12]}): {err}")
+        finally:
+            with self._lock:
+                self._pending.discard(sha256)
+        self.evict()
+
+    def _open(self, content_type, source_path):
+        if content_type != PDF_TYPE:
+            return Image.open(source_path)
+        if fitz is not None:
+            with fitz.open(source_path) as document:
+                page = document[0]
+                width, height = max(1.0, page.rect.width), max(1.0, page.rect.height)
+                # Rendered no wider than the largest preview, whatever size the page claims to be
+                zoom = min(self.pdf_dpi / 72, MAX_PREVIEW_WIDTH / width, math.sqrt(MAX_IMAGE_PIXELS / (width * height)))
+                pixmap = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom))
+                return Image.open(io.BytesIO(pixmap.tobytes('png')))
+        with tempfile.TemporaryDirectory() as workdir:
+            prefix = os.path.join(workdir, 'page')
+            subprocess.run(['pdftoppm', '-png', '-singlefile', '-f', '1', '-l', '1', '-r', str(self.pdf_dpi),
+                            '-scale-to-x', str(MAX_PREVIEW_WIDTH), '-scale-to-y', '-1',
+                            source_path, prefix], check=True, capture_output=True, timeout=60)
+            with Image.open(prefix + '.png') as page:
+                page.load()
+                return page.copy()
+
+    def _write(self, image, path, width):
+        if image.width > width:
+            height = max(1, round(image.height * width / image.width))
+            image = image.resize((width, height), Image.LANCZOS)
+        buffer = io.BytesIO()
+        image.save(buffer, format='WEBP', quality=self.quality)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(buffer.getvalue())
+        os.replace(tmp_path, path)
+        with self._lock:
+            if self._bytes is not None:
+                self._bytes += len(buffer.getvalue())
+            self._since_scan += 1
+
+    # --- LRU EVICTION ---
+    def _scan(self):
+        """[(last used, bytes, [paths])] per SHA-256: its thumb and preview are evicted together."""
+        groups = {}
+        for folder, _, names in os.walk(self.root):
+            for name in names:
+                if not name.endswith('.webp'):
+                    continue
+                path = os.path.join(folder, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                group = groups.setdefault(name.split('-', 1)[0], [0, 0, []])
+                group[0] = max(group[0], stat.st_mtime)
+                group[1] += stat.st_size
+                group[2].append(path)
+        return [tuple(group) for group in groups.values()]
+
+    def evict(self):
+        """Deletes the least recently used previews (both sizes of a file) until the folder fits in max_bytes."""
+        with self._lock:
+            # The running total only sees this process's writes; other workers share
+            # the folder, so it is re-measured from disk every RESCAN_EVERY previews
+            if self._bytes is not None and self._bytes <= self.max_bytes and self._since_scan < RESCAN_EVERY:
+                return 0
+        groups = self._scan()
+        total = sum(size for _, size, _ in groups)
+        removed = 0
+        for _, size, paths in sorted(groups):
+            if total <= self.max_bytes:
+                break
+            for path in paths:
+                try:
+                    os.remove(path)
+                    removed += 1
+                except OSError:
+                    pass
+            total -= size
+        with self._lock:
+            self._bytes = total
+            self._since_scan = 0
+            self.evicted += removed
+        return removed
+
+    def stats(self):
+        with self._lock:
+            pending = len(self._pending)
+            size = self._bytes or 0
+        return {'hits': self.hits, 'misses': self.misses, 'generated': self.generated, 'failed': self.failed,
+                'evicted': self.evicted, 'pending': pending, 'bytes': size}
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
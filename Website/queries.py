@@ -0,0 +1,250 @@
+# ==============================================================================
+# 🗂️ SHARED READ QUERIES
+# ==============================================================================
+# The listing pages' SELECTs live here instead of being pasted into each route.
+# Every query names the columns it needs (no SELECT * / R.*) and comes back as
+# rows of a small namedtuple type rather than one dict per row. Templates don't
+# notice the difference: Jinja reads `app.Status` and `app['Status']` from
+# either.
+#
+# On pooled connections each statement is prepared on the server once and then
+# re-executed with new parameters for as long as the connection stays in the
+# pool (see ConnectionPool.prepared_cursor), so MySQL skips parsing and
+# planning it on every page load. Anything else falls back to a one-off
+# prepared cursor.
+import re
+import sys
+from collections import namedtuple
+
+# The join every application listing uses
+REBATE_WITH_APPROVAL = """
+    FROM REBATE R
+    LEFT JOIN REBATE_APPROVALS RA ON R.SOP_Number = RA.SOP_Number
+"""
+
+
+def _output_name(column):
+    """'R.SOP_Number' -> 'SOP_Number', 'RA.Start_Date AS Decision_Date' -> 'Decision_Date'."""
+    head, _, alias = column.rpartition(' AS ')
+    return (alias if head else column).strip().split('.')[-1]
+
+
+class Query:
+    """A SELECT with an explicit column list and the row type its results are returned as."""
+
+    __slots__ = ('name', 'row', 'sql')
+
+    def __init__(self, name, columns, body):
+        """
+        name: row type name, e.g. 'ApplicationRow'.
+        columns: SQL expressions in SELECT order; aliases become the row's field names.
+        body: everything after the column list (FROM ... WHERE ... ORDER BY ...).
+        """
+        self.name = name
+        self.row = namedtuple(name, [_output_name(column) for column in columns])
+        self.sql = sys.intern("SELECT " + ", ".join(columns) + body)
+
+    def with_suffix(self, suffix):
+        """SQL for this query with filters / ordering appended (same columns, same row type)."""
+        # Interned so each distinct variant is one string object, which is what lets
+        # mysql.connector keep re-using the statement it already prepared
+        return sys.intern(self.sql + suffix) if suffix else self.sql
+
+
+# --- EXECUTION ---
+def _execute(conn, query, params, suffix):
+    sql = query.with_suffix(suffix)
+    prepared_cursor = getattr(conn, 'prepared_cursor', None)
+    if prepared_cursor is not None:
+        cursor, owned = prepared_cursor(sql), False
+    else:
+        cursor, owned = conn.cursor(prepared=True), True
+    try:
+        cursor.execute(sql, tuple(params))
+        # Always drain the result, a half-read statement would block the connection
+        return [query.row._make(row) for row in cursor.fetchall()]
+    finally:
+        if owned:
+            cursor.close()
+
+
+def fetch_all(conn, query, params=(), suffix=''):
+    """All rows of `query` as query.row tuples."""
+    return _execute(conn, query, params, suffix)
+
+
+def fetch_one(conn, query, params=(), suffix=''):
+    """The first row of `query`, or None (use it for queries that return one row)."""
+    rows = _execute(conn, query, params, suffix)
+    return rows[0] if rows else None
+
+
+# ==============================================================================
+# 📋 QUERIES
+# ==============================================================================
+USER_APPLICATIONS = Query('UserApplicationRow', [
+    'SOP_Number', 'Category', 'Building', 'Status',
+], """
+    FROM REBATE
+    WHERE Department_ID = %s
+    ORDER BY Submission_Date DESC
+    LIMIT 10
+""")
+
+SPONSOR_APPLICATIONS = Query('SponsorApplicationRow', [
+    'R.SOP_Number', 'R.Category', 'R.Building', 'R.Status', 'R.Office_Notes',
+    'RA.Payment_Date', 'RA.Approved_Amount',
+], REBATE_WITH_APPROVAL + """
+    WHERE R.Sponsor_ID = %s
+    ORDER BY R.Submission_Date DESC
+""")
+
+# Filters are appended with with_suffix(): "WHERE Sponsor_ID = %s", "... ORDER BY ..."
+SPONSOR_APPROVALS = Query('ApprovalRow', [
+    'SOP_Number', 'Sponsor_ID', 'Approved_Amount', 'Disbursed_Date', 'Payment_Date', 'Office_Notes',
+], """
+    FROM REBATE_APPROVALS
+""")
+
+APPLICATION_DETAILS = Query('ApplicationDetails', [
+    'R.SOP_Number', 'R.Category', 'R.Building', 'R.Department_ID', 'R.Status', 'R.Office_Notes',
+    'RA.Approved_Amount', 'RA.Start_Date AS Decision_Date',
+], REBATE_WITH_APPROVAL + """
+    WHERE R.SOP_Number = %s
+""")
+
+ATTACHMENTS_FOR_SOP = Query('AttachmentRow', [
+    'Attachment_ID', 'Sha256', 'Original_Name', 'Content_Type', 'Size_Bytes', 'Uploaded_At',
+], """
+    FROM ATTACHMENT WHERE SOP_Number = %s ORDER BY Attachment_ID
+""")
+
+# Application hub: the route appends its filter WHERE, keyset clause, ORDER BY and LIMIT
+APPLICATION_PAGE = Query('ApplicationRow', [
+    'R.SOP_Number', 'R.Category', 'R.Status', 'R.Building', 'R.Submission_Date',
+    'RA.Approved_Amount', 'RA.Payment_Date',
+], REBATE_WITH_APPROVAL)
+
+APPLICATION_TOTALS = Query('ApplicationTotals', [
+    'COUNT(*) AS total_count', 'COALESCE(SUM(RA.Approved_Amount), 0) AS total_committed',
+], REBATE_WITH_APPROVAL)
+
+# --- FULL-TEXT SEARCH (FULLTEXT index ft_rebate_search, migration 8) ---
+# Office_Notes holds the applicant's project description
+SEARCH_COLUMNS = ['Building', 'Category', 'Office_Notes']
+SEARCH_MATCH = "MATCH(R.Building, R.Category, R.Office_Notes) AGAINST (%s IN BOOLEAN MODE)"
+# InnoDB doesn't index words shorter than innodb_ft_min_token_size (3 by default)
+SEARCH_MIN_TERM = 3
+SEARCH_MAX_TERMS = 8
+# InnoDB's default stopwords (3+ letters): a required stopword would match nothing
+SEARCH_STOPWORDS = {'about', 'are', 'com', 'for', 'from', 'how', 'that', 'the', 'this',
+                    'was', 'what', 'when', 'where', 'who', 'will', 'with', 'und', 'www'}
+_SEARCH_WORD = re.compile(r'\w+')
+
+
+def boolean_search(text):
+    """
+    'LED retro' -> '+led* +retro*': every word required, each matched as a prefix.
+    Boolean operators typed by the user are dropped rather than interpreted.
+    Returns None when no word is long enough to be in the index.
+    """
+    terms = [word for word in (w.lower() for w in _SEARCH_WORD.findall(text or ''))
+             if len(word) >= SEARCH_MIN_TERM and word not in SEARCH_STOPWORDS]
+    if not terms:
+        return None
+    return ' '.join(f"+{term}*" for term in dict.fromkeys(terms[:SEARCH_MAX_TERMS]))
+
+
+# Params: (expression, expression, ...suffix params); the route appends its
+# sponsor filter, then ORDER BY Score DESC and LIMIT (OFFSET for result pages)
+APPLICATION_SEARCH = Query('SearchResultRow', [
+    'R.SOP_Number', 'R.Category', 'R.Building', 'R.Status', 'R.Submission_Date',
+    f'{SEARCH_MATCH} AS Score',
+], f"""
+    FROM REBATE R
+    WHERE {SEARCH_MATCH}
+""")
+
+SEARCH_TYPEAHEAD = Query('TypeaheadRow', [
+    'R.SOP_Number', 'R.Building', 'R.Category', 'R.Status',
+    f'{SEARCH_MATCH} AS Score',
+], f"""
+    FROM REBATE R
+    WHERE {SEARCH_MATCH}
+""")
+
+APPLICATION_BY_SOP = Query('SearchResultRow', [
+    'R.SOP_Number', 'R.Category', 'R.Building', 'R.Status', 'R.Submission_Date', 'NULL AS Score',
+], """
+    FROM REBATE R
+    WHERE R.SOP_Number = %s
+""")
+
+
+# ==============================================================================
+# 📊 REPORT QUERIES
+# ==============================================================================
+# Plain SQL strings: the report fetchers run them on dictionary cursors and the
+# CSV/XLSX exports stream them. They live here so the EXPLAIN check in
+# migrations.py checks exactly the statements the routes execute.
+
+# Range predicate on the bare column so (Status, Submission_Date) can be used:
+# DATEDIFF(CURDATE(), Submission_Date) > N  <=>  Submission_Date < CURDATE() - INTERVAL N DAY
+AGING_REPORT_QUERY = """
+    SELECT SOP_Number, Building, Category, Submission_Date,
+           DATEDIFF(CURDATE(), Submission_Date) AS Days_Old
+    FROM REBATE
+    WHERE Status = 'Pending' 
+    AND Submission_Date < CURDATE() - INTERVAL %s DAY
+    ORDER BY Submission_Date ASC
+"""
+
+AGING_BUCKETS_QUERY = """
+    SELECT Building, Category,
+           SUM(Submission_Date >= CURDATE() - INTERVAL 30 DAY) AS Days_0_30,
+           SUM(Submission_Date <  CURDATE() - INTERVAL 30 DAY
+               AND Submission_Date >= CURDATE() - INTERVAL 60 DAY) AS Days_31_60,
+           SUM(Submission_Date <  CURDATE() - INTERVAL 60 DAY
+               AND Submission_Date >= CURDATE() - INTERVAL 90 DAY) AS Days_61_90,
+           SUM(Submission_Date <  CURDATE() - INTERVAL 90 DAY) AS Days_90_Plus,
+           COUNT(*) AS Total_Pending
+    FROM REBATE
+    WHERE Status = 'Pending'
+    GROUP BY Building, Category
+    ORDER BY Days_90_Plus DESC, Total_Pending DESC
+"""
+
+HIGH_VALUE_FROM = """
+    FROM REBATE r
+    INNER JOIN REBATE_APPROVALS ra ON r.SOP_Number = ra.SOP_Number
+    WHERE ra.Approved_Amount >= %s
+"""
+HIGH_VALUE_QUERY = """
+    SELECT 
+        r.SOP_Number, r.Building, r.Category, 
+        ra.Approved_Amount, ra.Payment_Date, ra.Office_Notes
+""" + HIGH_VALUE_FROM + " ORDER BY ra.Approved_Amount DESC"
+HIGH_VALUE_TOTAL_QUERY = "SELECT COUNT(*), COALESCE(SUM(ra.Approved_Amount), 0)" + HIGH_VALUE_FROM
+
+# The JOIN Query - MUST have exactly two %s if passing start/end dates
+PAYMENT_REPORT_FROM = REBATE_WITH_APPROVAL + """
+    WHERE R.Status = 'Approved' 
+    AND (RA.Payment_Date BETWEEN %s AND %s OR RA.Payment_Date IS NULL)
+"""
+PAYMENT_REPORT_QUERY = """
+    SELECT 
+        R.SOP_Number, 
+        R.Department_ID, 
+        R.Category, 
+        R.Status,
+        RA.Payment_Date, 
+        COALESCE(RA.Approved_Amount, 0) AS Approved_Amount
+""" + PAYMENT_REPORT_FROM + " ORDER BY RA.Payment_Date DESC"
+PAYMENT_TOTAL_QUERY = "SELECT COUNT(*), COALESCE(SUM(RA.Approved_Amount), 0)" + PAYMENT_REPORT_FROM
+
+ENERGY_REPORT_QUERY = """
+    SELECT Campaign_Name, Category, Total_Applications,
+           Approved_Applications, Total_Approved_Rebates
+    FROM CAMPAIGN_METRICS
+    ORDER BY Campaign_Date DESC
+"""
@@ -0,0 +1,275 @@
+# ==============================================================================
+# 🗃️ REPORT RESULT CACHE
+# ==============================================================================
+# Read-through cache for the contractor report pages. Each cached report is
+# tagged with the tables it reads; write routes call invalidate('REBATE', ...)
+# which bumps those tags' generation numbers so every dependent key misses.
+#
+# The memory backend lives in one worker process: an invalidation there is not
+# seen by the other workers, which keep serving their copy until the TTL runs
+# out. With more than one worker use 'sqlite' (one file shared by the workers of
+# a host; gunicorn.conf.py picks it by default) or a redis:// URL (shared by hosts).
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+# --- IN-PROCESS BACKEND ---
+class MemoryBackend:
+    """Thread-safe TTL + LRU store. Shared by the threads of one worker process."""
+
+    shared = False  # Other worker processes neither see these entries nor their invalidations
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._counters = {}
+        self._marks = {}  # tag -> time.time() of its last invalidation
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def get_counter(self, name):
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def incr(self, name):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + 1
+            return self._counters[name]
+
+    def get_mark(self, name):
+        with self._lock:
+            return self._marks.get(name, 0.0)
+
+    def mark(self, name):
+        with self._lock:
+            self._marks[name] = time.time()
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._counters.clear()
+            self._marks.clear()
+
+
+# --- SQLITE BACKEND ---
+CACHE_SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS report_cache (
+        key TEXT PRIMARY KEY,
+        value BLOB NOT NULL,
+        expires_at REAL NOT NULL,
+        used_at REAL NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_report_cache_used ON report_cache (used_at)",
+    """CREATE TABLE IF NOT EXISTS report_cache_tags (
+        name TEXT PRIMARY KEY,
+        generation INTEGER NOT NULL DEFAULT 0,
+        invalidated_at REAL NOT NULL DEFAULT 0
+    )""",
+)
+
+
+class SQLiteBackend:
+    """Entries and generations in a local SQLite file, shared by every worker process on the host."""
+
+    shared = True
+
+    def __init__(self, db_path, max_entries=256):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        with self._db() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            for statement in CACHE_SCHEMA:
+                db.execute(statement)
+
+    @contextmanager
+    def _db(self):
+        db = sqlite3.connect(self.db_path, timeout=10)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def get(self, key):
+        now = time.time()
+        with self._db() as db:
+            row = db.execute("SELECT value FROM report_cache WHERE key = ? AND expires_at > ?",
+                             (key, now)).fetchone()
+            if row is None:
+                return None
+            db.execute("UPDATE report_cache SET used_at = ? WHERE key = ?", (now, key))
+        return pickle.loads(row[0])
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        with self._db() as db:
+            db.execute("INSERT OR REPLACE INTO report_cache (key, value, expires_at, used_at) VALUES (?, ?, ?, ?)",
+                       (key, pickle.dumps(value), now + ttl, now))
+            # Least recently used entries past max_entries go, expired ones with them
+            db.execute("DELETE FROM report_cache WHERE expires_at <= ? OR key IN ("
+                       "SELECT key FROM report_cache ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+                       (now, self.max_entries))
+
+    def delete(self, key):
+        with self._db() as db:
+            db.execute("DELETE FROM report_cache WHERE key = ?", (key,))
+
+    def get_counter(self, name):
+        with self._db() as db:
+            row = db.execute("SELECT generation FROM report_cache_tags WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else 0
+
+    def incr(self, name):
+        with self._db() as db:
+            db.execute("INSERT INTO report_cache_tags (name, generation) VALUES (?, 1) "
+                       "ON CONFLICT(name) DO UPDATE SET generation = generation + 1", (name,))
+            return db.execute("SELECT generation FROM report_cache_tags WHERE name = ?", (name,)).fetchone()[0]
+
+    def get_mark(self, name):
+        with self._db() as db:
+            row = db.execute("SELECT invalidated_at FROM report_cache_tags WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else 0.0
+
+    def mark(self, name):
+        with self._db() as db:
+            db.execute("INSERT INTO report_cache_tags (name, invalidated_at) VALUES (?, ?) "
+                       "ON CONFLICT(name) DO UPDATE SET invalidated_at = excluded.invalidated_at",
+                       (name, time.time()))
+
+    def clear(self):
+        with self._db() as db:
+            db.execute("DELETE FROM report_cache")
+            db.execute("DELETE FROM report_cache_tags")
+
+
+# --- REDIS-COMPATIBLE BACKEND ---
+class RedisBackend:
+    """
+    Stores entries in Redis (or any server speaking its protocol, e.g. a local
+    Valkey/KeyDB) so every worker process shares one cache. LRU eviction is left
+    to the server's maxmemory-policy (set it to allkeys-lru).
+    """
+
+    shared = True
+
+    def __init__(self, url, prefix='gtc:'):
+        import redis  # Optional dependency, only needed for this backend
+        self._client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self._client.get(self.prefix + key)
+        return pickle.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl):
+        self._client.setex(self.prefix + key, int(max(1, ttl)), pickle.dumps(value))
+
+    def delete(self, key):
+        self._client.delete(self.prefix + key)
+
+    def get_counter(self, name):
+        raw = self._client.get(self.prefix + 'gen:' + name)
+        return int(raw) if raw is not None else 0
+
+    def incr(self, name):
+        return self._client.incr(self.prefix + 'gen:' + name)
+
+    def get_mark(self, name):
+        raw = self._client.get(self.prefix + 'mark:' + name)
+        return float(raw) if raw is not None else 0.0
+
+    def mark(self, name):
+        self._client.set(self.prefix + 'mark:' + name, time.time())
+
+    def clear(self):
+        for key in self._client.scan_iter(self.prefix + '*'):
+            self._client.delete(key)
+
+
+def make_backend(spec, max_entries=256, db_path=None):
+    """
+    'memory' -> MemoryBackend, 'sqlite' -> SQLiteBackend at db_path,
+    'redis://...' -> RedisBackend (falls back to SQLite if redis-py is missing).
+    """
+    if spec and spec.startswith(('redis://', 'rediss://', 'unix://')):
+        try:
+            return RedisBackend(spec)
+        except ImportError:
+            print("Report cache: redis package not installed, using the SQLite cache.")
+            spec = 'sqlite'
+    if spec == 'sqlite' and db_path:
+        return SQLiteBackend(db_path, max_entries=max_entries)
+    return MemoryBackend(max_entries=max_entries)
+
+
+# --- THE CACHE ---
+class ReportCache:
+    """Read-through cache keyed by report name, its query parameters and its tables' generations."""
+
+    def __init__(self, backend, default_ttl=300):
+        self.backend = backend
+        self.default_ttl = default_ttl
+        self.hits = 0
+        self.misses = 0
+
+    def make_key(self, name, params, tags):
+        generations = ':'.join(f"{tag}={self.backend.get_counter(tag)}" for tag in sorted(tags))
+        param_blob = json.dumps(params or {}, sort_keys=True, default=str)
+        digest = hashlib.sha1(f"{generations}|{param_blob}".encode()).hexdigest()
+        return f"report:{name}:{digest}"
+
+    def get_or_compute(self, name, params, compute, tags=(), ttl=None):
+        """Returns the cached result, or runs compute() and stores it. None results are never cached."""
+        key = self.make_key(name, params, tags)
+        value = self.backend.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+        self.misses += 1
+        value = compute()
+        if value is not None:
+            self.backend.set(key, value, ttl or self.default_ttl)
+        return value
+
+    def invalidate(self, *tags):
+        """Makes every cached report that read any of these tables stale."""
+        for tag in tags:
+            self.backend.incr(tag)
+            self.backend.mark(tag)
+
+    def invalidated_at(self, tags):
+        """Wall-clock time of the latest invalidate() of any of these tables (0 if never)."""
+        return max((self.backend.get_mark(tag) for tag in tags), default=0.0)
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses}
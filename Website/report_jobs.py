@@ -0,0 +1,323 @@
+# ==============================================================================
+# ⏳ BACKGROUND REPORT JOBS
+# ==============================================================================
+# Heavy report requests can be queued instead of holding a WSGI worker. Jobs live
+# in a SQLite table in the instance folder, so every worker process on the host
+# sees the same queue: any of them can answer "is job X done yet?", and a job is
+# only started by claiming it in that table, which keeps `max_concurrent` a limit
+# for the whole host rather than for each process.
+#
+# A running job records the pid that claimed it and a heartbeat refreshed every
+# few seconds. A worker that was recycled or killed mid-report stops beating; its
+# job is then requeued (or failed after `max_attempts`) instead of spinning forever.
+#
+# The finished rows are stored with the job for `result_ttl` seconds, so the
+# report page can serve them even when the redirect lands on a different worker
+# than the one that ran the job (the in-memory report cache is per process).
+# Readers pass the time their tables last changed; rows from a run that started
+# before then are ignored.
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+JOB_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS report_jobs (
+        job_id TEXT PRIMARY KEY,
+        report TEXT NOT NULL,
+        params TEXT NOT NULL,
+        status TEXT NOT NULL,            -- queued | running | done | failed
+        progress REAL NOT NULL DEFAULT 0,
+        message TEXT,
+        row_count INTEGER,
+        result_url TEXT,
+        created_at REAL NOT NULL,
+        started_at REAL,
+        finished_at REAL
+    )
+"""
+
+# Added after the first release; existing job databases get them with ALTER TABLE
+JOB_COLUMNS = {
+    'owner_pid': 'INTEGER',
+    'heartbeat_at': 'REAL',
+    'attempts': 'INTEGER NOT NULL DEFAULT 0',
+    'result': 'BLOB',
+}
+
+ACTIVE_STATUSES = ('queued', 'running')
+# Progress estimates are based on the durations of the last few finished runs
+DURATION_SAMPLES = 5
+
+
+class JobQueueFull(Exception):
+    """Raised when too many report jobs are already waiting."""
+
+
+class ReportJobQueue:
+    """SQLite-backed job table shared by all worker processes + a small local pool that runs claimed jobs."""
+
+    def __init__(self, db_path, runners, max_concurrent=2, max_queued=20, retention=24 * 3600,
+                 heartbeat_interval=5, stale_after=30, max_attempts=2, result_ttl=120):
+        """
+        runners: {report name: function(**params)} that computes (and caches) a report.
+        max_concurrent: reports allowed to run at the same time across all processes on this host.
+        max_queued: queued + running jobs allowed before new requests are refused.
+        stale_after: seconds without a heartbeat before a running job is considered abandoned.
+        result_ttl: seconds a finished job's rows can be served to other workers (0 = don't store them).
+        """
+        self.db_path = db_path
+        self.runners = runners
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.retention = retention
+        self.heartbeat_interval = heartbeat_interval
+        self.stale_after = stale_after
+        self.max_attempts = max_attempts
+        self.result_ttl = result_ttl
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._drain_pending = False
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        with self._db() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(JOB_SCHEMA)
+            existing = {row['name'] for row in db.execute("PRAGMA table_info(report_jobs)")}
+            for column, definition in JOB_COLUMNS.items():
+                if column not in existing:
+                    db.execute(f"ALTER TABLE report_jobs ADD COLUMN {column} {definition}")
+
+    @contextmanager
+    def _db(self):
+        """Short-lived connection per call (sqlite3 connections aren't shared across threads); commits on success."""
+        db = sqlite3.connect(self.db_path, timeout=10)
+        db.row_factory = sqlite3.Row
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def _pool(self):
+        # Created lazily so forked WSGI workers each start their own threads
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_concurrent,
+                                                    thread_name_prefix='report-job')
+            return self._executor
+
+    # --- ENQUEUE ---
+    def submit(self, report, params, result_url=None):
+        """
+        Queues a report run and returns its job id. An identical queued/running job is
+        reused. `result_url` is the page that serves the report once it is finished.
+        """
+        if report not in self.runners:
+            raise KeyError(report)
+        params_blob = json.dumps(params, sort_keys=True, default=str)
+        with self._db() as db:
+            db.execute("BEGIN IMMEDIATE")
+            self._recover_stale(db)
+            existing = db.execute(
+                "SELECT job_id FROM report_jobs WHERE report = ? AND params = ? AND status IN (?, ?)",
+                (report, params_blob, *ACTIVE_STATUSES)
+            ).fetchone()
+            if existing:
+                return existing['job_id']
+            active = db.execute(
+                "SELECT COUNT(*) FROM report_jobs WHERE status IN (?, ?)", ACTIVE_STATUSES
+            ).fetchone()[0]
+            if active >= self.max_queued:
+                raise JobQueueFull(f"{active} report jobs already queued")
+            job_id = uuid.uuid4().hex
+            db.execute(
+                "INSERT INTO report_jobs (job_id, report, params, status, result_url, created_at) "
+                "VALUES (?, ?, ?, 'queued', ?, ?)",
+                (job_id, report, params_blob, result_url, time.time())
+            )
+        self._kick()
+        return job_id
+
+    # --- CLAIMING ---
+    def _recover_stale(self, db):
+        """Requeues running jobs whose worker stopped beating; fails them after max_attempts."""
+        cutoff = time.time() - self.stale_after
+        db.execute(
+            "UPDATE report_jobs SET status = 'failed', finished_at = ?, owner_pid = NULL, "
+            "message = 'Worker stopped before finishing' "
+            "WHERE status = 'running' AND heartbeat_at < ? AND attempts >= ?",
+            (time.time(), cutoff, self.max_attempts)
+        )
+        db.execute(
+            "UPDATE report_jobs SET status = 'queued', owner_pid = NULL, progress = 0, "
+            "message = 'Worker stopped; waiting to run again' "
+            "WHERE status = 'running' AND heartbeat_at < ?", (cutoff,)
+        )
+
+    def _claim(self):
+        """Takes the oldest queued job if fewer than max_concurrent run on this host, else None."""
+        now = time.time()
+        with self._db() as db:
+            # IMMEDIATE: the count and the claim happen under SQLite's write lock, so
+            # two processes can't both take the last free slot
+            db.execute("BEGIN IMMEDIATE")
+            self._recover_stale(db)
+            running = db.execute("SELECT COUNT(*) FROM report_jobs WHERE status = 'running'").fetchone()[0]
+            if running >= self.max_concurrent:
+                return None
+            job = db.execute(
+                "SELECT job_id, report, params FROM report_jobs WHERE status = 'queued' "
+                "ORDER BY created_at LIMIT 1"
+            ).fetchone()
+            if job is None:
+                return None
+            db.execute(
+                "UPDATE report_jobs SET status = 'running', owner_pid = ?, heartbeat_at = ?, started_at = ?, "
+                "attempts = attempts + 1, progress = 0.05, message = 'Running report query' WHERE job_id = ?",
+                (os.getpid(), now, now, job['job_id'])
+            )
+        return job['job_id'], job['report'], json.loads(job['params'])
+
+    def _kick(self):
+        # One drain waiting to start is enough: it claims whatever is queued by then
+        with self._executor_lock:
+            if self._drain_pending:
+                return
+            self._drain_pending = True
+        self._pool().submit(self._drain)
+
+    def _drain(self):
+        """Runs queued jobs (from any process) while this host has free slots."""
+        with self._executor_lock:
+            self._drain_pending = False
+        while True:
+            try:
+                claimed = self._claim()
+            except sqlite3.Error as e:
+                print(f"Report Job Error (claim): {e}")
+                return
+            if claimed is None:
+                return
+            self._run(*claimed)
+
+    # --- WORKER ---
+    def _update(self, job_id, **fields):
+        columns = ', '.join(f"{name} = ?" for name in fields)
+        with self._db() as db:
+            db.execute(f"UPDATE report_jobs SET {columns} WHERE job_id = ?", (*fields.values(), job_id))
+
+    def _expected_seconds(self, report):
+        with self._db() as db:
+            rows = db.execute(
+                "SELECT finished_at - started_at FROM report_jobs WHERE report = ? AND status = 'done' "
+                "AND started_at IS NOT NULL ORDER BY finished_at DESC LIMIT ?", (report, DURATION_SAMPLES)
+            ).fetchall()
+        durations = sorted(row[0] for row in rows if row[0] is not None)
+        return durations[len(durations) // 2] if durations else None
+
+    def _heartbeat(self, job_id, report, started, stop):
+        """Refreshes the job's heartbeat and its estimated progress until the run ends."""
+        expected = self._expected_seconds(report)
+        while not stop.wait(self.heartbeat_interval):
+            elapsed = time.time() - started
+            fields = {'heartbeat_at': time.time()}
+            if expected:
+                # Between 'claimed' (0.05) and 'saving' (0.95), by how long recent runs took
+                fields['progress'] = min(0.9, 0.05 + 0.85 * elapsed / expected)
+                remaining = expected - elapsed
+                fields['message'] = (f"Running report query (about {int(remaining) + 1}s left)"
+                                     if remaining > 0 else "Running report query (taking longer than usual)")
+            try:
+                self._update(job_id, **fields)
+            except sqlite3.Error as e:
+                print(f"Report Job Error (heartbeat {job_id}): {e}")
+
+    def _run(self, job_id, report, params):
+        stop = threading.Event()
+        beat = threading.Thread(target=self._heartbeat, args=(job_id, report, time.time(), stop),
+                                name='report-job-heartbeat', daemon=True)
+        beat.start()
+        try:
+            rows = self.runners[report](**params)
+            if rows is None:
+                raise RuntimeError('Could not connect to the database.')
+            stop.set()
+            self._update(job_id, progress=0.95, message=f"Saving {len(rows)} rows")
+            result = pickle.dumps(rows) if self.result_ttl > 0 else None
+            self._update(job_id, status='done', progress=1.0, finished_at=time.time(),
+                         row_count=len(rows), result=result, message='Report ready')
+        except Exception as e:
+            print(f"Report Job Error ({report} {job_id}): {e}")
+            self._update(job_id, status='failed', finished_at=time.time(), message=str(e))
+        finally:
+            stop.set()
+            beat.join()
+
+    # --- STATUS ---
+    def get(self, job_id):
+        with self._db() as db:
+            row = db.execute("SELECT * FROM report_jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job.pop('result', None)
+        job['params'] = json.loads(job['params'])
+        stale = job['status'] == 'running' and (job['heartbeat_at'] or 0) < time.time() - self.stale_after
+        if job['status'] == 'queued' or stale:
+            # Whoever polls picks up jobs stranded by a worker that went away
+            self._kick()
+        return job
+
+    def result_for(self, report, params, since=0.0):
+        """
+        Rows of a job for these params that finished within result_ttl seconds and
+        started at or after `since` (the last write to the report's tables), or None.
+        """
+        if self.result_ttl <= 0:
+            return None
+        with self._db() as db:
+            row = db.execute(
+                "SELECT result FROM report_jobs WHERE report = ? AND params = ? AND status = 'done' "
+                "AND result IS NOT NULL AND finished_at >= ? AND started_at >= ? "
+                "ORDER BY finished_at DESC LIMIT 1",
+                (report, json.dumps(params, sort_keys=True, default=str), time.time() - self.result_ttl, since)
+            ).fetchone()
+        return pickle.loads(row['result']) if row is not None else None
+
+    def stats(self):
+        with self._db() as db:
+            rows = db.execute("SELECT status, COUNT(*) FROM report_jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    def purge(self):
+        """Drops finished jobs older than the retention window and results past result_ttl."""
+        cutoff = time.time() - self.retention
+        with self._db() as db:
+            db.execute("BEGIN IMMEDIATE")
+            self._recover_stale(db)
+            db.execute("DELETE FROM report_jobs WHERE status IN ('done', 'failed') AND created_at < ?", (cutoff,))
+            db.execute("UPDATE report_jobs SET result = NULL WHERE result IS NOT NULL AND finished_at < ?",
+                       (time.time() - self.result_ttl,))
+
+    def shutdown(self, wait=True):
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+        if not wait:
+            # Jobs this process was still running won't finish: hand them back to the queue now
+            # instead of waiting for their heartbeat to go stale
+            try:
+                with self._db() as db:
+                    db.execute(
+                        "UPDATE report_jobs SET status = 'queued', owner_pid = NULL, progress = 0, "
+                        "message = 'Worker stopped; waiting to run again' "
+                        "WHERE status = 'running' AND owner_pid = ?", (os.getpid(),)
+                    )
+            except sqlite3.Error as e:
+                print(f"Report Job Error (shutdown): {e}")
@@ -0,0 +1,252 @@
+# ==============================================================================
+# 🍪 SERVER-SIDE SESSIONS
+# ==============================================================================
+# Session data lives in a local SQLite file (or a Redis-compatible server) and
+# the cookie only carries an opaque random id. Sessions expire after
+# `idle_timeout` seconds without a request; each one records its owner
+# ("reviewer:7", "sponsor:3"...) so all of a person's sessions can be revoked.
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+SESSION_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS sessions (
+        sid TEXT PRIMARY KEY,
+        data TEXT NOT NULL,
+        principal TEXT,
+        expires_at REAL NOT NULL
+    )
+"""
+SESSION_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions (expires_at)",
+    "CREATE INDEX IF NOT EXISTS idx_sessions_principal ON sessions (principal)",
+)
+
+
+# --- SQLITE BACKEND ---
+class SQLiteSessionBackend:
+    """One row per session in a local SQLite file; fine for a single host."""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        with self._db() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(SESSION_SCHEMA)
+            for statement in SESSION_INDEXES:
+                db.execute(statement)
+
+    @contextmanager
+    def _db(self):
+        db = sqlite3.connect(self.db_path, timeout=10)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def load(self, sid):
+        with self._db() as db:
+            row = db.execute("SELECT data FROM sessions WHERE sid = ? AND expires_at > ?",
+                             (sid, time.time())).fetchone()
+        return row[0] if row else None
+
+    def save(self, sid, data, principal, ttl):
+        with self._db() as db:
+            db.execute("INSERT OR REPLACE INTO sessions (sid, data, principal, expires_at) VALUES (?, ?, ?, ?)",
+                       (sid, data, principal, time.time() + ttl))
+
+    def touch(self, sid, ttl):
+        with self._db() as db:
+            db.execute("UPDATE sessions SET expires_at = ? WHERE sid = ?", (time.time() + ttl, sid))
+
+    def delete(self, sid):
+        with self._db() as db:
+            db.execute("DELETE FROM sessions WHERE sid = ?", (sid,))
+
+    def revoke(self, principal):
+        with self._db() as db:
+            return db.execute("DELETE FROM sessions WHERE principal = ?", (principal,)).rowcount
+
+    def purge_expired(self):
+        # Range delete on the expires_at index; nothing else has to scan for stale rows
+        with self._db() as db:
+            return db.execute("DELETE FROM sessions WHERE expires_at <= ?", (time.time(),)).rowcount
+
+
+# --- REDIS-COMPATIBLE BACKEND ---
+class RedisSessionBackend:
+    """
+    Sessions as keys with a server-side TTL, shared by every worker and host.
+    A per-principal set of session ids makes revocation one round trip.
+    """
+
+    def __init__(self, url, prefix='gtc:session:'):
+        import redis  # Optional dependency, only needed for this backend
+        self._client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def _principal_key(self, principal):
+        return f"{self.prefix}principal:{principal}"
+
+    def load(self, sid):
+        raw = self._client.get(self.prefix + sid)
+        return raw.decode('utf-8') if raw is not None else None
+
+    def save(self, sid, data, principal, ttl):
+        pipe = self._client.pipeline()
+        pipe.setex(self.prefix + sid, int(ttl), data)
+        if principal:
+            pipe.sadd(self._principal_key(principal), sid)
+            pipe.expire(self._principal_key(principal), int(ttl))
+        pipe.execute()
+
+    def touch(self, sid, ttl):
+        self._client.expire(self.prefix + sid, int(ttl))
+
+    def delete(self, sid):
+        self._client.delete(self.prefix + sid)
+
+    def revoke(self, principal):
+        key = self._principal_key(principal)
+        sids = self._client.smembers(key)
+        if not sids:
+            return 0
+        removed = self._client.delete(*[self.prefix + sid.decode('utf-8') for sid in sids])
+        self._client.delete(key)
+        return removed
+
+    def purge_expired(self):
+        return 0  # Redis expires keys by itself
+
+
+def make_session_backend(spec, db_path):
+    """'sqlite' -> SQLiteSessionBackend, 'redis://...' -> RedisSessionBackend (falls back to SQLite if redis-py is missing)."""
+    if spec and spec.startswith(('redis://', 'rediss://', 'unix://')):
+        try:
+            return RedisSessionBackend(spec)
+        except ImportError:
+            print("Sessions: redis package not installed, using the SQLite session store.")
+    return SQLiteSessionBackend(db_path)
+
+
+# --- FLASK INTEGRATION ---
+class ServerSideSession(CallbackDict, SessionMixin):
+    """Dict-like session that tracks changes; clear() also asks for a fresh id."""
+
+    def __init__(self, initial=None, sid=None, new=False):
+        def on_update(self):
+            self.modified = True
+        CallbackDict.__init__(self, initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+        self.rotate = False
+
+    def clear(self):
+        # Login and logout both start with session.clear(); issuing a new id there
+        # means an id seen before login can't be reused afterwards
+        super().clear()
+        self.rotate = True
+
+
+class ServerSessionInterface(SessionInterface):
+    """Keeps only a random session id in the cookie; the data stays in `backend`."""
+
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, backend, idle_timeout=3600, refresh_every=60, principal_for=None, purge_chance=0.01):
+        """
+        idle_timeout: seconds without a request before a session expires.
+        refresh_every: untouched sessions only have their expiry pushed back this often.
+        principal_for: function(session) -> owner string used for bulk revocation.
+        """
+        self.backend = backend
+        self.idle_timeout = idle_timeout
+        self.refresh_every = refresh_every
+        self.principal_for = principal_for or (lambda s: None)
+        self.purge_chance = purge_chance
+        self._touched = {}  # sid -> last expiry refresh (per process)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _new_sid():
+        return secrets.token_urlsafe(32)
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            try:
+                data = self.backend.load(sid)
+            except Exception as e:
+                print(f"Session Load Error: {e}")
+                data = None
+            if data is not None:
+                return ServerSideSession(self.serializer.loads(data), sid=sid)
+        return ServerSideSession(sid=self._new_sid(), new=True)
+
+    def save_session(self, app, session, response):
+        cookie_name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if session.rotate and not session.new:
+            self.backend.delete(session.sid)
+            self._forget(session.sid)
+            session.sid = self._new_sid()
+            session.new = True
+
+        if not session:
+            if not session.new or session.rotate:
+                # Emptied (e.g. logout): drop the server copy and the cookie
+                self.backend.delete(session.sid)
+                response.delete_cookie(cookie_name, domain=domain, path=path)
+            return
+
+        if session.modified or session.new:
+            self.backend.save(session.sid, self.serializer.dumps(dict(session)),
+                              self.principal_for(session), self.idle_timeout)
+            self._mark_touched(session.sid)
+        elif self._due_for_touch(session.sid):
+            # Sliding expiry without rewriting the whole session on every request
+            self.backend.touch(session.sid, self.idle_timeout)
+
+        if session.new:
+            response.set_cookie(cookie_name, session.sid,
+                                expires=self.get_expiration_time(app, session),
+                                httponly=self.get_cookie_httponly(app), domain=domain, path=path,
+                                secure=self.get_cookie_secure(app),
+                                samesite=self.get_cookie_samesite(app))
+
+        if self.purge_chance and secrets.randbelow(10000) < self.purge_chance * 10000:
+            # Occasional housekeeping instead of a separate cron job
+            self.backend.purge_expired()
+
+    def _mark_touched(self, sid):
+        with self._lock:
+            self._touched[sid] = time.monotonic()
+
+    def _forget(self, sid):
+        with self._lock:
+            self._touched.pop(sid, None)
+
+    def _due_for_touch(self, sid):
+        now = time.monotonic()
+        with self._lock:
+            if now - self._touched.get(sid, 0) < self.refresh_every:
+                return False
+            if len(self._touched) > 10000:
+                self._touched = {k: v for k, v in self._touched.items() if now - v < self.refresh_every}
+            self._touched[sid] = now
+            return True
+
+    def revoke(self, principal):
+        """Deletes every session belonging to `principal`; returns how many were removed."""
+        return self.backend.revoke(principal)
@@ -0,0 +1,166 @@
+import os
+import re
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('AUTO_MIGRATE', '0')
+
+
+# --- FAKE REBATE DATABASE ---
+# Just enough of MySQL for the routes' REBATE bookkeeping: the statements below are
+# answered from an in-memory REBATE table, everything else is recorded and returns
+# no rows. Cursors hand rows back as tuples or dicts, like mysql.connector's do.
+class FakeCursor:
+    def __init__(self, db, dictionary=False):
+        self.db = db
+        self.dictionary = dictionary
+        self.rowcount = 0
+        self.lastrowid = None
+        self._rows = []
+
+    def _result(self, columns, rows):
+        self._rows = [dict(zip(columns, row)) if self.dictionary else tuple(row) for row in rows]
+
+    def execute(self, sql, params=()):
+        sql = ' '.join(sql.split())
+        params = list(params or ())
+        self.db.statements.append((sql, params))
+        self._rows = []
+        rebates = self.db.rebates
+        if sql.startswith('SELECT SOP_Number, Status FROM REBATE WHERE SOP_Number IN'):
+            self._result(('SOP_Number', 'Status'),
+                         [(int(sop), rebates[int(sop)]['Status']) for sop in params if int(sop) in rebates])
+        elif sql.startswith('SELECT R.SOP_Number, R.Sponsor_ID, R.Category, R.Status'):
+            self._result(('SOP_Number', 'Sponsor_ID', 'Category', 'Status', 'Approval_SOP'),
+                         [(int(sop), rebates[int(sop)]['Sponsor_ID'], rebates[int(sop)]['Category'],
+                           rebates[int(sop)]['Status'], None) for sop in params if int(sop) in rebates])
+        elif sql.startswith('SELECT R.SOP_Number, R.Category, R.Building, R.Department_ID'):
+            columns = ('Category', 'Building', 'Department_ID', 'Status', 'Office_Notes',
+                       'Approved_Amount', 'Decision_Date')
+            sop = int(params[0])
+            # Only ever run through queries.fetch_*, i.e. on prepared (tuple) cursors
+            if sop in rebates:
+                self._rows = [(sop,) + tuple(rebates[sop].get(column) for column in columns)]
+        elif sql.startswith('SELECT Attachment_ID, Sha256'):
+            self._rows = [row[:-1] for row in self.db.attachments if row[-1] == int(params[0])]
+        elif sql.startswith('SELECT Sponsor_ID FROM REBATE WHERE SOP_Number'):
+            self._result(('Sponsor_ID',), [(rebates[int(params[0])]['Sponsor_ID'],)])
+        elif sql.startswith('UPDATE REBATE SET Status = %s, Office_Notes = %s WHERE SOP_Number = %s'):
+            rebates[int(params[2])]['Status'] = params[0]
+        elif sql.startswith('UPDATE REBATE SET Status = CASE'):
+            count = len(re.findall(r'WHEN', sql)) // 2
+            for i in range(count):
+                rebates[int(params[2 * i])]['Status'] = params[2 * i + 1]
+        elif sql.startswith('SELECT R.SOP_Number, R.Sponsor_ID, R.Status, R.Building, R.Category'):
+            columns = ('SOP_Number', 'Sponsor_ID', 'Status', 'Building', 'Category',
+                       'Approved_Amount', 'Payment_Date')
+            self._result(columns, [(int(sop),) + tuple(rebates[int(sop)].get(column) for column in columns[1:])
+                                   for sop in params if int(sop) in rebates])
+        elif sql.startswith("UPDATE REBATE SET Status = 'Disbursed' WHERE SOP_Number"):
+            for sop in params:
+                rebates[int(sop)]['Status'] = 'Disbursed'
+        elif sql.startswith('INSERT INTO REBATE_APPROVALS (SOP_Number, Approved_Amount, Payment_Date'):
+            rebates[int(params[0])].update(Approved_Amount=params[1], Payment_Date='now')
+        elif sql.startswith('INSERT IGNORE INTO IDEMPOTENCY_KEYS'):
+            self.rowcount = 0 if params[0] in self.db.tokens else 1
+            self.db.tokens.add(params[0])
+        elif sql.startswith('DELETE FROM RECENT_ACTIVITY WHERE Activity_ID <= ('):
+            newest = sorted(self.db.activity_ids, reverse=True)
+            if len(newest) > params[0]:
+                self.db.activity_ids = [i for i in newest if i > newest[params[0]]]
+        elif sql.startswith('INSERT INTO RECENT_ACTIVITY'):
+            if 'VALUES' in sql:
+                params = params[:1]
+            self.db.activity.extend(int(sop) for sop in params)
+            self.rowcount = len(params)
+
+    def executemany(self, sql, seq_params):
+        for params in seq_params:
+            self.execute(sql, params)
+
+    def fetchall(self):
+        rows, self._rows = self._rows, []
+        return rows
+
+    def fetchone(self):
+        return self._rows.pop(0) if self._rows else None
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, db):
+        self.db = db
+
+    def cursor(self, dictionary=False, **kwargs):
+        return FakeCursor(self.db, dictionary)
+
+    def commit(self):
+        self.db.commits += 1
+
+    def rollback(self):
+        pass
+
+    def is_connected(self):
+        return True
+
+    def close(self):
+        pass
+
+
+class FakeDB:
+    def __init__(self, rebates):
+        self.rebates = {sop: dict(row) for sop, row in rebates.items()}
+        self.statements = []
+        self.activity = []
+        self.activity_ids = []
+        self.tokens = set()
+        # (Attachment_ID, Sha256, Original_Name, Content_Type, Size_Bytes, Uploaded_At, SOP_Number)
+        self.attachments = []
+        self.commits = 0
+
+    def connect(self):
+        return FakeConnection(self)
+
+    def ran(self, prefix):
+        return [params for sql, params in self.statements if sql.startswith(prefix)]
+
+
+@pytest.fixture
+def web():
+    import Web
+    Web.app.config['TESTING'] = True
+    return Web
+
+
+@pytest.fixture
+def fake_db(web, monkeypatch):
+    db = FakeDB({
+        5: {'Status': 'Pending', 'Sponsor_ID': 1, 'Category': 'Lighting'},
+        6: {'Status': 'Pending', 'Sponsor_ID': 1, 'Category': 'HVAC'},
+        7: {'Status': 'Approved', 'Sponsor_ID': 2, 'Category': 'Lighting', 'Approved_Amount': 500},
+        8: {'Status': 'Approved', 'Sponsor_ID': 2, 'Category': 'HVAC', 'Approved_Amount': 900},
+    })
+    monkeypatch.setattr(web, 'get_db_connection', db.connect)
+    return db
+
+
+@pytest.fixture
+def sponsor(web):
+    client = web.app.test_client()
+    with client.session_transaction() as sess:
+        sess['sponsor_logged_in'] = True
+        sess['sponsor_id'] = 2
+    return client
+
+
+@pytest.fixture
+def contractor(web):
+    client = web.app.test_client()
+    with client.session_transaction() as sess:
+        sess['contractor_logged_in'] = True
+        sess['employee_id'] = 1
+    return client
@@ -0,0 +1,53 @@
+import pytest
+
+
+def test_no_filters(web):
+    assert web.build_application_filters('all', '', '', '') == ('', [])
+
+
+def test_status_and_column_filters_are_parameterized(web):
+    where_sql, params = web.build_application_filters('pending', '', 'Lighting', 'Bilger Hall')
+    assert where_sql == " WHERE R.Status = 'Pending' AND R.Category = %s AND R.Building = %s"
+    assert params == ['Lighting', 'Bilger Hall']
+
+
+def test_sop_number_search(web):
+    where_sql, params = web.build_application_filters('all', '42', '', '')
+    assert 'R.SOP_Number = %s' in where_sql
+    assert params == [42, '%42%', '%42%']
+
+
+def test_word_search_uses_the_fulltext_index(web):
+    where_sql, params = web.build_application_filters('all', 'LED retrofit', '', '')
+    assert 'MATCH(' in where_sql
+    assert params == ['+led* +retrofit*']
+
+
+def test_short_search_falls_back_to_like(web):
+    where_sql, params = web.build_application_filters('all', 'B2', '', '')
+    assert where_sql.count('%s') == len(params) == 2
+
+
+@pytest.mark.parametrize('text, number', [
+    ('42', 42), ('2147483647', 2147483647), ('2147483648', None), ('99999999999', None),
+    ('-1', None), ('4 2', None), ('', None),
+])
+def test_parse_sop_number(web, text, number):
+    assert web.parse_sop_number(text) == number
+
+
+def test_hub_pages_by_keyset(web, monkeypatch, contractor):
+    calls = []
+
+    async def run(func, query, params, suffix):
+        calls.append((query, list(params), suffix))
+        if query is web.queries.APPLICATION_TOTALS:
+            return query.row(total_count=0, total_committed=0)
+        return []
+    monkeypatch.setattr(web.async_db, 'run', run)
+
+    assert contractor.get('/view-all-applications?after=500&per_page=20').status_code == 200
+    page = [call for call in calls if call[0] is web.queries.APPLICATION_PAGE][0]
+    assert page[1] == [500, 21]
+    assert page[2] == " WHERE R.SOP_Number < %s ORDER BY R.SOP_Number DESC LIMIT %s"
+    assert 'OFFSET' not in page[2]
@@ -0,0 +1,52 @@
+import migrations
+import queries
+
+from conftest import FakeDB
+
+
+def delta_statements(db):
+    return [(sql, params) for sql, params in db.statements if sql.startswith('UPDATE CAMPAIGN_METRICS CM')]
+
+
+def test_leaving_and_entered_apply_opposite_deltas(web):
+    db = FakeDB({})
+    cursor = db.connect().cursor()
+    web.campaign_metrics_leaving(cursor, [5, 6])
+    web.campaign_metrics_entered(cursor, [5, 6])
+    (leaving_sql, leaving), (entered_sql, entered) = delta_statements(db)
+    assert leaving_sql.count('%s') == len(leaving) == 5
+    assert leaving == [5, 6, -1, -1, -1]
+    assert entered == [5, 6, 1, 1, 1]
+
+
+def test_only_the_changed_sops_are_read(web):
+    db = FakeDB({})
+    web.campaign_metrics_entered(db.connect().cursor(), 5)
+    (sql, params), = delta_statements(db)
+    assert 'WHERE R.SOP_Number IN (%s)' in sql
+    assert params == [5, 1, 1, 1]
+
+
+def test_no_sops_no_statement(web):
+    db = FakeDB({})
+    web.campaign_metrics_leaving(db.connect().cursor(), [])
+    assert db.statements == []
+
+
+def test_decision_keeps_campaign_metrics_in_step(fake_db, contractor):
+    contractor.post('/process-decision/5', data={'action': 'Rejected', 'notes_to_applicant': ''})
+    signs = [params[-1] for _, params in delta_statements(fake_db)]
+    assert signs == [-1, 1]
+
+
+def test_energy_report_only_reads_the_metrics_table(web, fake_db):
+    assert web.fetch_energy_report() == []
+    assert not fake_db.ran('DELETE FROM CAMPAIGN_METRICS')
+    assert [sql for sql, _ in fake_db.statements] == [' '.join(queries.ENERGY_REPORT_QUERY.split())]
+
+
+def test_backfill_migration_rebuilds_the_metrics(web):
+    db = FakeDB({})
+    backfill = dict((version, func) for version, _, func in migrations.MIGRATIONS)[10]
+    backfill(db.connect().cursor())
+    assert db.ran('DELETE FROM CAMPAIGN_METRICS') and db.ran('INSERT INTO CAMPAIGN_METRICS')
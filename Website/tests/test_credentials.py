@@ -0,0 +1,58 @@
+import threading
+
+import pytest
+
+from credentials import HashingBusy, PasswordHasher
+
+
+@pytest.fixture
+def hasher():
+    return PasswordHasher(n=2 ** 10, workers=1, queue_timeout=0.05)
+
+
+def test_hash_round_trip(hasher):
+    stored = hasher.hash('s3cret')
+    assert stored.startswith('scrypt$1024$')
+    assert hasher.verify(stored, 's3cret') == (True, False)
+    assert hasher.verify(stored, 'wrong') == (False, False)
+
+
+def test_plaintext_matches_and_asks_for_rehash(hasher):
+    assert hasher.verify('s3cret', 's3cret') == (True, True)
+    assert hasher.verify('s3cret', 'other') == (False, False)
+    assert hasher.verify(None, 's3cret') == (False, False)
+
+
+def test_outdated_work_factor_asks_for_rehash(hasher):
+    stored = PasswordHasher(n=2 ** 11).hash('s3cret')
+    assert hasher.verify(stored, 's3cret') == (True, True)
+
+
+def test_busy_when_every_slot_is_taken(hasher):
+    taken, release = threading.Event(), threading.Event()
+
+    def hold_slot():
+        with hasher._slot():
+            taken.set()
+            release.wait(5)
+    holder = threading.Thread(target=hold_slot)
+    holder.start()
+    taken.wait(5)
+    try:
+        with pytest.raises(HashingBusy):
+            hasher.verify('x', 'x')
+    finally:
+        release.set()
+        holder.join()
+    assert hasher.verify('x', 'x') == (True, True)
+
+
+def test_login_answers_503_when_hashing_is_saturated(web, monkeypatch):
+    def busy(*args):
+        raise HashingBusy(retry_after=2)
+    monkeypatch.setattr(web, 'resolve_login_identity', lambda identifier: [])
+    monkeypatch.setattr(web.password_hasher, 'verify', busy)
+    response = web.app.test_client().post('/login-submit', data={'username': 'busy@hawaii.edu',
+                                                                 'password': 'x'})
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '2'
@@ -0,0 +1,78 @@
+import time
+
+import pytest
+
+from db_pool import ConnectionPool
+
+
+class RawConnection:
+    """Stands in for a mysql.connector connection; any network ping is counted."""
+
+    def __init__(self):
+        self._socket = object()
+        self.unread_result = False
+        self.in_transaction = False
+        self.pings = 0
+        self.rollbacks = 0
+
+    def ping(self, reconnect=False):
+        self.pings += 1
+
+    def is_connected(self):
+        self.pings += 1
+        return self._socket is not None
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.in_transaction = False
+
+    def close(self):
+        self._socket = None
+
+
+@pytest.fixture
+def pool():
+    pool = ConnectionPool({}, pool_size=2, max_overflow=1, timeout=0.05)
+    pool.opened = []
+
+    def connect():
+        pool.opened.append(RawConnection())
+        return pool.opened[-1], time.monotonic()
+    pool._connect = connect
+    return pool
+
+
+def test_only_checkout_pings(pool):
+    for _ in range(3):
+        conn = pool.acquire()
+        assert conn.is_connected()
+        conn.close()
+    assert len(pool.opened) == 1
+    assert pool.opened[0].pings == 2  # the two reuses; a fresh connection isn't pinged
+
+
+def test_open_transaction_is_rolled_back_on_release(pool):
+    conn = pool.acquire()
+    conn._raw.in_transaction = True
+    conn.close()
+    assert pool.opened[0].rollbacks == 1
+    assert pool.metrics()['idle'] == 1
+
+
+def test_closed_or_unread_connections_are_not_kept(pool):
+    first, second = pool.acquire(), pool.acquire()
+    first._raw._socket = None
+    second._raw.unread_result = True
+    first.close()
+    second.close()
+    assert pool.metrics()['idle'] == 0
+    assert pool.metrics()['open'] == 0
+
+
+def test_exhausted_pool_times_out(pool):
+    held = [pool.acquire() for _ in range(3)]
+    with pytest.raises(Exception):
+        pool.acquire()
+    for conn in held:
+        conn.close()
+    assert pool.metrics()['timeouts'] == 1
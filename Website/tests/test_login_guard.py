@@ -0,0 +1,73 @@
+import pytest
+
+import login_guard
+from login_guard import LoginGuard
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(login_guard.time, 'monotonic', clock)
+    return clock
+
+
+def test_locks_out_after_max_failures(clock):
+    guard = LoginGuard(max_failures=3, window=60, lockout=120)
+    for _ in range(2):
+        guard.record_failure('someone@hawaii.edu')
+    assert guard.retry_after('someone@hawaii.edu') == 0
+    guard.record_failure('SomeOne@Hawaii.edu ')
+    assert guard.retry_after('someone@hawaii.edu') == 121
+    clock.now += 121
+    assert guard.retry_after('someone@hawaii.edu') == 0
+
+
+def test_failures_outside_the_window_do_not_count(clock):
+    guard = LoginGuard(max_failures=3, window=60, lockout=120)
+    guard.record_failure('a@hawaii.edu')
+    guard.record_failure('a@hawaii.edu')
+    clock.now += 61
+    guard.record_failure('a@hawaii.edu')
+    assert guard.retry_after('a@hawaii.edu') == 0
+
+
+def test_success_clears_failures(clock):
+    guard = LoginGuard(max_failures=2)
+    guard.record_failure('a@hawaii.edu')
+    guard.record_success('a@hawaii.edu')
+    guard.record_failure('a@hawaii.edu')
+    assert guard.retry_after('a@hawaii.edu') == 0
+
+
+def test_negative_cache_expires(clock):
+    guard = LoginGuard(negative_ttl=30)
+    assert not guard.is_known_unknown('nobody@hawaii.edu')
+    guard.remember_unknown('nobody@hawaii.edu')
+    assert guard.is_known_unknown('NOBODY@hawaii.edu')
+    clock.now += 31
+    assert not guard.is_known_unknown('nobody@hawaii.edu')
+
+
+def test_forget_drops_the_negative_entry(clock):
+    guard = LoginGuard()
+    guard.remember_unknown('new@hawaii.edu')
+    guard.forget('new@hawaii.edu')
+    assert not guard.is_known_unknown('new@hawaii.edu')
+
+
+def test_tracked_identifiers_stay_bounded(clock):
+    guard = LoginGuard(negative_ttl=10, max_tracked=5)
+    for i in range(5):
+        guard.remember_unknown(f"spray{i}@hawaii.edu")
+    clock.now += 11
+    for i in range(5, 12):
+        guard.remember_unknown(f"spray{i}@hawaii.edu")
+    assert len(guard._unknown) <= 7
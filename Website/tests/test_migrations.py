@@ -0,0 +1,59 @@
+import pytest
+
+import migrations
+import queries
+
+
+def test_versions_are_contiguous():
+    versions = [version for version, _, _ in migrations.MIGRATIONS]
+    assert versions == list(range(1, len(versions) + 1))
+
+
+def test_duplicate_version_is_refused():
+    with pytest.raises(ValueError):
+        migrations.migration(1, "again")(lambda cursor: None)
+
+
+@pytest.mark.parametrize('entry', migrations.ROUTE_QUERIES, ids=lambda entry: entry['name'])
+def test_route_query_params_match_placeholders(entry):
+    assert entry['sql'].count('%s') == len(entry['params'])
+
+
+def test_report_queries_are_the_ones_the_routes_run():
+    registered = {entry['name']: entry['sql'] for entry in migrations.ROUTE_QUERIES}
+    assert registered['aging_report'] is queries.AGING_REPORT_QUERY
+    assert registered['high_value_audit'] is queries.HIGH_VALUE_QUERY
+    assert registered['payment_report'] is queries.PAYMENT_REPORT_QUERY
+
+
+class ExplainCursor:
+    def __init__(self, plans):
+        self.plans = plans
+        self._rows = []
+
+    def execute(self, sql, params=()):
+        self._rows = next((rows for marker, rows in self.plans if marker in sql), [])
+
+    def fetchall(self):
+        return self._rows
+
+    def close(self):
+        pass
+
+
+class ExplainConnection:
+    def __init__(self, plans):
+        self.plans = plans
+
+    def cursor(self, dictionary=False):
+        return ExplainCursor(self.plans)
+
+
+def test_explain_check_reports_full_scans_only():
+    conn = ExplainConnection([
+        ('FROM RECENT_ACTIVITY', [{'table': 'RECENT_ACTIVITY', 'type': 'ALL'}]),
+        ('FROM STATUS_COUNTS', [{'table': 'STATUS_COUNTS', 'type': 'ALL'}]),
+        ('UNION ALL', [{'table': '<union1,2,3,4>', 'type': 'ALL'}]),
+        ('FROM CAMPAIGN_METRICS', [{'table': 'CAMPAIGN_METRICS', 'type': 'index'}]),
+    ])
+    assert migrations.explain_check(conn) == [('contractor_dashboard_recent', 'RECENT_ACTIVITY')]
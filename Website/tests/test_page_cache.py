@@ -0,0 +1,39 @@
+from flask import Flask, request
+
+from page_cache import PageCache
+
+
+def make_app():
+    app = Flask(__name__)
+    cache = PageCache()
+    renders = []
+
+    @app.route('/about')
+    @cache.cached
+    def about():
+        renders.append(request.full_path)
+        return 'about'
+
+    @app.route('/search')
+    @cache.cached(vary_args=('page',))
+    def search():
+        renders.append(request.full_path)
+        return f"page {request.args.get('page', '1')}"
+
+    return app.test_client(), cache, renders
+
+
+def test_unread_query_params_share_one_entry():
+    client, cache, renders = make_app()
+    for query in ('', '?utm_source=mail', '?x=1', '?x=2&y=3'):
+        assert client.get('/about' + query).data == b'about'
+    assert len(renders) == 1
+    assert cache.stats()['pages'] == 1
+
+
+def test_vary_args_get_their_own_entries():
+    client, cache, renders = make_app()
+    assert client.get('/search?page=2&utm_source=a').data == b'page 2'
+    assert client.get('/search?page=2&utm_source=b').data == b'page 2'
+    assert client.get('/search?page=3').data == b'page 3'
+    assert len(renders) == 2
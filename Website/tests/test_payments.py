@@ -0,0 +1,51 @@
+def test_disburse_payment_pays_and_logs(fake_db, sponsor):
+    response = sponsor.post('/disburse-payment/7', data={'approved_amount': '750', 'idempotency_key': 'a'})
+    assert response.status_code == 302
+    assert fake_db.rebates[7]['Status'] == 'Disbursed'
+    assert fake_db.activity == [7]
+    assert fake_db.ran('INSERT INTO STATUS_COUNTS') == [['Approved', -1, 'Disbursed', 1]]
+    assert fake_db.ran('UPDATE CAMPAIGN_METRICS') == [[250.0, 'Lighting']]
+    assert fake_db.commits == 1
+
+
+def test_disburse_payment_locks_the_row(fake_db, sponsor):
+    sponsor.post('/disburse-payment/7', data={'approved_amount': '500', 'idempotency_key': 'a'})
+    locking = [sql for sql, _ in fake_db.statements if sql.startswith('SELECT R.SOP_Number, R.Sponsor_ID')]
+    assert locking and all(sql.endswith('FOR UPDATE') for sql in locking)
+
+
+def test_second_payout_with_a_new_token_pays_nothing(fake_db, sponsor):
+    sponsor.post('/disburse-payment/7', data={'approved_amount': '500', 'idempotency_key': 'a'})
+    sponsor.post('/disburse-payment/7', data={'approved_amount': '500', 'idempotency_key': 'b'})
+    assert len(fake_db.ran('INSERT INTO REBATE_APPROVALS')) == 1
+    assert fake_db.commits == 1
+
+
+def test_repeated_token_is_a_no_op(fake_db, sponsor):
+    sponsor.post('/disburse-payment/7', data={'approved_amount': '500', 'idempotency_key': 'a'})
+    sponsor.post('/disburse-payment/8', data={'approved_amount': '500', 'idempotency_key': 'a'})
+    assert fake_db.rebates[8]['Status'] == 'Approved'
+
+
+def test_other_sponsors_rebate_is_refused(fake_db, sponsor):
+    sponsor.post('/disburse-payment/5', data={'approved_amount': '500', 'idempotency_key': 'a'})
+    assert fake_db.rebates[5]['Status'] == 'Pending'
+    assert fake_db.commits == 0
+
+
+def test_bulk_payout_locks_pays_and_logs(fake_db, sponsor):
+    response = sponsor.post('/disburse-payments', json={'payments': [{'sop_number': 7}, {'sop_number': 8}],
+                                                         'idempotency_key': 'bulk'})
+    assert response.status_code == 200, response.get_json()
+    locking = [sql for sql, _ in fake_db.statements if sql.startswith('SELECT R.SOP_Number, R.Sponsor_ID')]
+    assert locking[0].endswith('FOR UPDATE')
+    assert fake_db.rebates[7]['Status'] == fake_db.rebates[8]['Status'] == 'Disbursed'
+    assert sorted(fake_db.activity) == [7, 8]
+
+
+def test_bulk_payout_refuses_already_paid(fake_db, sponsor):
+    sponsor.post('/disburse-payment/7', data={'approved_amount': '500', 'idempotency_key': 'a'})
+    response = sponsor.post('/disburse-payments', json={'payments': [{'sop_number': 7}],
+                                                         'idempotency_key': 'bulk'})
+    assert response.status_code == 400
+    assert fake_db.commits == 1
@@ -0,0 +1,11 @@
+from previews import PreviewCache
+
+
+def test_generation_failures_go_to_the_log_callable(tmp_path):
+    source = tmp_path / 'broken.png'
+    source.write_bytes(b'not an image')
+    lines = []
+    cache = PreviewCache(str(tmp_path / 'previews'), log=lines.append)
+    cache._generate('a' * 64, 'image/png', str(source))
+    assert cache.failed == 1
+    assert lines and lines[0].startswith('Preview Error (aaaaaaaaaaaa)')
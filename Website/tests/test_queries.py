@@ -0,0 +1,66 @@
+import pytest
+
+import queries
+
+
+@pytest.mark.parametrize('column, name', [
+    ('R.SOP_Number', 'SOP_Number'),
+    ('Status', 'Status'),
+    ('RA.Start_Date AS Decision_Date', 'Decision_Date'),
+    ('COALESCE(RA.Approved_Amount, 0) AS Approved_Amount', 'Approved_Amount'),
+    ('NULL AS Score', 'Score'),
+    (f'{queries.SEARCH_MATCH} AS Score', 'Score'),
+])
+def test_output_name(column, name):
+    assert queries._output_name(column) == name
+
+
+def test_query_rows_are_named_after_the_columns():
+    query = queries.Query('TestRow', ['R.SOP_Number', 'RA.Start_Date AS Decision_Date'], " FROM REBATE R")
+    assert query.row._fields == ('SOP_Number', 'Decision_Date')
+    assert query.sql == "SELECT R.SOP_Number, RA.Start_Date AS Decision_Date FROM REBATE R"
+
+
+def test_with_suffix_returns_one_interned_string_per_variant():
+    query = queries.APPLICATION_PAGE
+    suffix = " WHERE R.SOP_Number < %s"
+    assert query.with_suffix(''.join([' WHERE', ' R.SOP_Number < %s'])) is query.with_suffix(suffix)
+    assert query.with_suffix('') is query.sql
+
+
+@pytest.mark.parametrize('text, expression', [
+    ('LED retro', '+led* +retro*'),
+    ('  Bilger   Hall ', '+bilger* +hall*'),
+    ('led LED Led', '+led*'),
+    ('+solar -pv "envelope"', '+solar* +envelope*'),
+    ('the lighting for hvac', '+lighting* +hvac*'),
+])
+def test_boolean_search(text, expression):
+    assert queries.boolean_search(text) == expression
+
+
+@pytest.mark.parametrize('text', ['', None, 'pv ab', 'the with from', '+-*"()'])
+def test_boolean_search_without_indexable_words(text):
+    assert queries.boolean_search(text) is None
+
+
+def test_boolean_search_caps_the_number_of_terms():
+    words = [f"word{i}" for i in range(20)]
+    assert queries.boolean_search(' '.join(words)).split() == [f"+{w}*" for w in words[:queries.SEARCH_MAX_TERMS]]
+
+
+def test_review_application_renders_attachment_rows(web, fake_db, contractor, monkeypatch):
+    fake_db.attachments = [
+        (1, 'a' * 64, 'photo.png', 'image/png', 2048, None, 5),
+        (2, 'b' * 64, 'invoice.pdf', 'application/pdf', 4096, None, 5),
+        (3, 'c' * 64, 'other.png', 'image/png', 1024, None, 6),
+    ]
+    scheduled = []
+    monkeypatch.setattr(web.preview_cache, 'available', lambda sha: sha == 'a' * 64)
+    monkeypatch.setattr(web.preview_cache, 'schedule', lambda sha, *args: scheduled.append(sha))
+    response = contractor.get('/review-application/5')
+    assert response.status_code == 200
+    html = response.get_data(as_text=True)
+    assert 'Preview of photo.png' in html
+    assert 'invoice.pdf (4.0 KB)' in html and 'other.png' not in html
+    assert scheduled == ['b' * 64]
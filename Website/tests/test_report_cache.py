@@ -0,0 +1,90 @@
+import pytest
+
+from report_cache import MemoryBackend, ReportCache, SQLiteBackend, make_backend
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def cache(request, tmp_path):
+    if request.param == 'memory':
+        backend = MemoryBackend(max_entries=8)
+    else:
+        backend = SQLiteBackend(str(tmp_path / 'cache.sqlite3'), max_entries=8)
+    return ReportCache(backend, default_ttl=60)
+
+
+def counting(value):
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return value
+    return compute, calls
+
+
+def test_second_read_is_a_hit(cache):
+    compute, calls = counting([1, 2])
+    assert cache.get_or_compute('aging', {'days': 30}, compute, tags=('REBATE',)) == [1, 2]
+    assert cache.get_or_compute('aging', {'days': 30}, compute, tags=('REBATE',)) == [1, 2]
+    assert len(calls) == 1
+    assert cache.stats() == {'hits': 1, 'misses': 1}
+
+
+def test_params_are_part_of_the_key(cache):
+    compute, calls = counting([1])
+    cache.get_or_compute('aging', {'days': 30}, compute, tags=('REBATE',))
+    cache.get_or_compute('aging', {'days': 60}, compute, tags=('REBATE',))
+    assert len(calls) == 2
+
+
+def test_invalidating_a_table_misses_its_reports_only(cache):
+    aging, aging_calls = counting([1])
+    energy, energy_calls = counting([2])
+    cache.get_or_compute('aging', {}, aging, tags=('REBATE',))
+    cache.get_or_compute('energy', {}, energy, tags=('CAMPAIGN',))
+    cache.invalidate('REBATE')
+    cache.get_or_compute('aging', {}, aging, tags=('REBATE',))
+    cache.get_or_compute('energy', {}, energy, tags=('CAMPAIGN',))
+    assert len(aging_calls) == 2
+    assert len(energy_calls) == 1
+
+
+def test_none_is_never_cached(cache):
+    compute, calls = counting(None)
+    cache.get_or_compute('aging', {}, compute, tags=('REBATE',))
+    cache.get_or_compute('aging', {}, compute, tags=('REBATE',))
+    assert len(calls) == 2
+
+
+def test_invalidated_at_tracks_the_latest_write(cache):
+    assert cache.invalidated_at(('REBATE', 'REBATE_APPROVALS')) == 0
+    cache.invalidate('REBATE_APPROVALS')
+    assert cache.invalidated_at(('REBATE', 'REBATE_APPROVALS')) > 0
+    assert cache.invalidated_at(('CAMPAIGN',)) == 0
+
+
+def test_sqlite_backend_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / 'cache.sqlite3')
+    first = ReportCache(SQLiteBackend(path), default_ttl=60)
+    second = ReportCache(SQLiteBackend(path), default_ttl=60)
+    compute, calls = counting([1])
+    first.get_or_compute('aging', {}, compute, tags=('REBATE',))
+    second.get_or_compute('aging', {}, compute, tags=('REBATE',))
+    assert len(calls) == 1
+    second.invalidate('REBATE')
+    first.get_or_compute('aging', {}, compute, tags=('REBATE',))
+    assert len(calls) == 2
+
+
+def test_sqlite_backend_evicts_least_recently_used(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / 'cache.sqlite3'), max_entries=2)
+    backend.set('a', 1, 60)
+    backend.set('b', 2, 60)
+    backend.get('a')
+    backend.set('c', 3, 60)
+    assert backend.get('a') == 1
+    assert backend.get('b') is None
+
+
+def test_make_backend_specs(tmp_path):
+    assert isinstance(make_backend('memory'), MemoryBackend)
+    assert isinstance(make_backend('sqlite', db_path=str(tmp_path / 'c.sqlite3')), SQLiteBackend)
@@ -0,0 +1,41 @@
+import time
+
+from report_jobs import ReportJobQueue
+
+
+def wait_done(queue, job_id, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = queue.get(job_id)
+        if job['status'] in ('done', 'failed'):
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def make_queue(tmp_path, **kwargs):
+    return ReportJobQueue(str(tmp_path / 'jobs.sqlite3'), {'aging': lambda **params: [params['days']]},
+                          **kwargs)
+
+
+def test_result_for_serves_rows_of_a_finished_job(tmp_path):
+    queue = make_queue(tmp_path)
+    job = wait_done(queue, queue.submit('aging', {'days': 30}))
+    assert job['status'] == 'done'
+    assert queue.result_for('aging', {'days': 30}) == [30]
+    assert queue.result_for('aging', {'days': 60}) is None
+    queue.shutdown()
+
+
+def test_result_for_ignores_runs_started_before_the_last_write(tmp_path):
+    queue = make_queue(tmp_path)
+    wait_done(queue, queue.submit('aging', {'days': 30}))
+    assert queue.result_for('aging', {'days': 30}, since=time.time()) is None
+    queue.shutdown()
+
+
+def test_results_are_not_kept_without_result_ttl(tmp_path):
+    queue = make_queue(tmp_path, result_ttl=0)
+    wait_done(queue, queue.submit('aging', {'days': 30}))
+    assert queue.result_for('aging', {'days': 30}) is None
+    queue.shutdown()
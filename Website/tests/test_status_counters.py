@@ -0,0 +1,87 @@
+import pytest
+
+from conftest import FakeDB
+
+
+@pytest.mark.parametrize('dictionary', [False, True])
+def test_status_leaving_returns_old_statuses(web, dictionary):
+    db = FakeDB({5: {'Status': 'Pending'}, 7: {'Status': 'Approved'}})
+    cursor = db.connect().cursor(dictionary=dictionary)
+    assert web.status_leaving(cursor, [5, 7]) == {5: 'Pending', 7: 'Approved'}
+
+
+@pytest.mark.parametrize('dictionary', [False, True])
+def test_status_entered_logs_only_changed_rebates(web, dictionary):
+    db = FakeDB({5: {'Status': 'Pending'}, 7: {'Status': 'Approved'}})
+    cursor = db.connect().cursor(dictionary=dictionary)
+    previous = web.status_leaving(cursor, [5, 7])
+    db.rebates[5]['Status'] = 'Rejected'
+    web.status_entered(cursor, [5, 7], previous)
+    assert db.activity == [5]
+
+
+@pytest.mark.parametrize('dictionary', [False, True])
+def test_status_entered_without_previous_logs_everything(web, dictionary):
+    db = FakeDB({5: {'Status': 'Pending'}})
+    web.status_entered(db.connect().cursor(dictionary=dictionary), 5)
+    assert db.activity == [5]
+    assert db.ran('INSERT INTO STATUS_COUNTS')
+
+
+def test_trim_recent_activity_keeps_newest_ring(web):
+    db = FakeDB({})
+    # Gaps in the ids (rolled-back inserts) must not shrink the ring
+    db.activity_ids = list(range(1, 40)) + list(range(100, 140))
+    web.trim_recent_activity(db.connect().cursor())
+    assert len(db.activity_ids) == web.RECENT_ACTIVITY_LIMIT
+    assert min(db.activity_ids) == 30
+
+
+def test_trim_recent_activity_leaves_short_ring_alone(web):
+    db = FakeDB({})
+    db.activity_ids = list(range(1, 11))
+    web.trim_recent_activity(db.connect().cursor())
+    assert db.activity_ids == list(range(1, 11))
+
+
+def test_process_decision_logs_activity(fake_db, contractor):
+    response = contractor.post('/process-decision/5', data={'action': 'Rejected', 'notes_to_applicant': 'No'})
+    assert response.status_code == 302
+    assert fake_db.rebates[5]['Status'] == 'Rejected'
+    assert fake_db.activity == [5]
+    assert fake_db.commits == 1
+
+
+def test_process_decision_notes_only_change_is_not_logged(fake_db, contractor):
+    contractor.post('/process-decision/5', data={'action': 'Pending', 'notes_to_applicant': 'Note'})
+    assert fake_db.activity == []
+    assert fake_db.commits == 1
+
+
+def test_process_decisions_logs_each_decided_rebate(fake_db, contractor):
+    response = contractor.post('/process-decisions', json={'decisions': [
+        {'sop_number': 5, 'action': 'Approve', 'approved_amount': 500},
+        {'sop_number': 6, 'action': 'Reject'},
+    ]})
+    assert response.status_code == 200, response.get_json()
+    assert fake_db.rebates[5]['Status'] == 'Approved'
+    assert fake_db.rebates[6]['Status'] == 'Rejected'
+    assert sorted(fake_db.activity) == [5, 6]
+
+
+def test_update_status_plain_cursor_logs_activity(fake_db, contractor):
+    contractor.post('/update-status/5', data={'status': 'Request revision', 'notes': ''})
+    assert fake_db.activity == [5]
+
+
+def test_dashboard_reads_counters_on_one_connection(web, monkeypatch, contractor):
+    db = FakeDB({})
+    connections = []
+
+    def connect():
+        connections.append(db.connect())
+        return connections[-1]
+    monkeypatch.setattr(web, 'get_db_connection', connect)
+    assert contractor.get('/dashboard').status_code == 200
+    assert len(connections) == 1
+    assert db.ran('SELECT Status, Total FROM STATUS_COUNTS') and db.ran('SELECT Building, Category, Status')
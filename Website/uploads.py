@@ -0,0 +1,267 @@
+# ==============================================================================
+# 📎 DOCUMENT UPLOADS
+# ==============================================================================
+# Invoices and spec sheets arrive in chunks: the browser opens an upload, PUTs
+# consecutive byte ranges and, after a dropped connection, asks for the current
+# offset and carries on from there. Each chunk is copied from the request
+# stream to a partial file in small blocks, so no process ever holds a whole
+# document in memory. Limits are enforced while streaming: the declared size,
+# a hard per-file cap, a per-request chunk cap and the file signature (magic
+# bytes) of the first block. A finished upload is renamed to its SHA-256 under
+# blobs/, so the same invoice attached to five applications is stored once.
+#
+#   <root>/partial/<upload_id>.part    bytes received so far
+#   <root>/partial/<upload_id>.json    owner, name, declared size (+ sha256 once complete)
+#   <root>/blobs/ab/ab12...            finished, content-addressed files
+import hashlib
+import json
+import os
+import re
+import secrets
+import time
+
+BLOCK_BYTES = 64 * 1024
+HASH_BLOCK_BYTES = 1024 * 1024
+
+# extension: (content type, signature as [(offset, bytes)] that must all match)
+ALLOWED_TYPES = {
+    '.pdf': ('application/pdf', [(0, b'%PDF-')]),
+    '.png': ('image/png', [(0, b'\x89PNG\r\n\x1a\n')]),
+    '.jpg': ('image/jpeg', [(0, b'\xff\xd8\xff')]),
+    '.jpeg': ('image/jpeg', [(0, b'\xff\xd8\xff')]),
+    '.webp': ('image/webp', [(0, b'RIFF'), (8, b'WEBP')]),
+    '.xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', [(0, b'PK\x03\x04')]),
+    '.docx': ('application/vnd.openxmlformats-officedocument.wordprocessingml.document', [(0, b'PK\x03\x04')]),
+}
+
+_UPLOAD_ID = re.compile(r'^[A-Za-z0-9_-]{16,64}$')
+_SHA256 = re.compile(r'^[0-9a-f]{64}$')
+
+
+class UploadError(Exception):
+    """A rejected upload request; `status` is the HTTP status to answer with."""
+
+    def __init__(self, message, status=400, offset=None):
+        super().__init__(message)
+        self.status = status
+        self.offset = offset
+
+
+class UploadStore:
+    """Resumable chunked uploads streamed to disk and stored as SHA-256 named blobs."""
+
+    def __init__(self, root, max_bytes=25 * 1024 * 1024, chunk_bytes=4 * 1024 * 1024,
+                 allowed_types=None, partial_ttl=24 * 3600):
+        """
+        max_bytes: largest file accepted.
+        chunk_bytes: most bytes accepted by a single PUT.
+        partial_ttl: seconds an unfinished (or finished but never attached) upload is kept.
+        """
+        self.root = root
+        self.max_bytes = max_bytes
+        self.chunk_bytes = chunk_bytes
+        self.allowed_types = allowed_types or ALLOWED_TYPES
+        self.partial_ttl = partial_ttl
+        self.partial_dir = os.path.join(root, 'partial')
+        self.blob_dir = os.path.join(root, 'blobs')
+        os.makedirs(self.partial_dir, exist_ok=True)
+        os.makedirs(self.blob_dir, exist_ok=True)
+
+    # --- PATHS ---
+    def _paths(self, upload_id):
+        if not _UPLOAD_ID.match(upload_id or ''):
+            raise UploadError("Unknown upload.", 404)
+        base = os.path.join(self.partial_dir, upload_id)
+        return base + '.part', base + '.json'
+
+    def blob_path(self, sha256):
+        if not _SHA256.match(sha256 or ''):
+            raise ValueError(f"Not a SHA-256 hex digest: {sha256!r}")
+        return os.path.join(self.blob_dir, sha256[:2], sha256)
+
+    def _load(self, upload_id, owner):
+        part_path, meta_path = self._paths(upload_id)
+        try:
+            with open(meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            raise UploadError("Unknown upload.", 404)
+        # Someone else's upload id is treated exactly like a missing one
+        if meta.get('owner') != owner:
+            raise UploadError("Unknown upload.", 404)
+        return meta, part_path, meta_path
+
+    @staticmethod
+    def _save(meta_path, meta):
+        tmp_path = meta_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, meta_path)
+
+    @staticmethod
+    def _received(part_path):
+        try:
+            return os.path.getsize(part_path)
+        except OSError:
+            return 0
+
+    # --- PROTOCOL ---
+    def start(self, owner, filename, size):
+        """Opens an upload for a file of `size` bytes; returns {'upload_id', 'offset', 'chunk_bytes'}."""
+        extension = os.path.splitext(filename or '')[1].lower()
+        if extension not in self.allowed_types:
+            allowed = ', '.join(sorted(self.allowed_types))
+            raise UploadError(f"File type not allowed (use {allowed}).", 415)
+        try:
+            size = int(size)
+        except (TypeError, ValueError):
+            raise UploadError("File size is required.")
+        if size <= 0:
+            raise UploadError("Empty files can't be attached.")
+        if size > self.max_bytes:
+            raise UploadError(f"Files are limited to {self.max_bytes // (1024 * 1024)} MB.", 413)
+
+        upload_id = secrets.token_urlsafe(24)
+        part_path, meta_path = self._paths(upload_id)
+        open(part_path, 'wb').close()
+        self._save(meta_path, {
+            'owner': owner,
+            'filename': os.path.basename(filename)[:255],
+            'content_type': self.allowed_types[extension][0],
+            'extension': extension,
+            'size': size,
+            'created': time.time(),
+        })
+        return {'upload_id': upload_id, 'offset': 0, 'chunk_bytes': self.chunk_bytes}
+
+    def status(self, upload_id, owner):
+        meta, part_path, _ = self._load(upload_id, owner)
+        offset = meta['size'] if meta.get('sha256') else self._received(part_path)
+        return {'offset': offset, 'size': meta['size'], 'sha256': meta.get('sha256')}
+
+    def write_chunk(self, upload_id, owner, offset, stream, length):
+        """
+        Copies `length` bytes from `stream` into the upload starting at `offset`.
+        Re-sending a range that already arrived is harmless (the same bytes are
+        rewritten); skipping ahead is refused with the offset to resume from.
+        Returns the new offset, which is less than offset + length if the client
+        disconnected mid-chunk.
+        """
+        meta, part_path, _ = self._load(upload_id, owner)
+        received = self._received(part_path)
+        if meta.get('sha256'):
+            raise UploadError("Upload is already complete.", 409, offset=received)
+        if offset is None or offset < 0 or offset > received:
+            raise UploadError("Chunk doesn't start at the current offset.", 409, offset=received)
+        if length is None:
+            raise UploadError("Content-Length is required.", 411, offset=received)
+        if length > self.chunk_bytes:
+            raise UploadError(f"Chunks are limited to {self.chunk_bytes} bytes.", 413, offset=received)
+        if offset + length > meta['size']:
+            raise UploadError("Chunk runs past the declared file size.", 413, offset=received)
+
+        position = offset
+        with open(part_path, 'r+b') as f:
+            f.seek(offset)
+            remaining = length
+            while remaining > 0:
+                block = stream.read(min(BLOCK_BYTES, remaining))
+                if not block:
+                    break
+                if position == 0 and not self._signature_matches(meta['extension'], block):
+                    f.truncate(0)
+                    raise UploadError(f"File contents don't look like a {meta['extension']} file.", 415, offset=0)
+                f.write(block)
+                position += len(block)
+                remaining -= len(block)
+        return max(received, position)
+
+    def _signature_matches(self, extension, head):
+        signature = self.allowed_types[extension][1]
+        return all(head[at:at + len(magic)] == magic for at, magic in signature)
+
+    def finish(self, upload_id, owner):
+        """
+        Hashes the received file and moves it into blobs/ (or drops it if that
+        blob already exists). Returns the upload's metadata including 'sha256'.
+        """
+        meta, part_path, meta_path = self._load(upload_id, owner)
+        if meta.get('sha256'):
+            return meta
+        received = self._received(part_path)
+        if received != meta['size']:
+            raise UploadError("Upload is incomplete.", 409, offset=received)
+
+        digest = hashlib.sha256()
+        with open(part_path, 'rb') as f:
+            for block in iter(lambda: f.read(HASH_BLOCK_BYTES), b''):
+                digest.update(block)
+        sha256 = digest.hexdigest()
+
+        blob_path = self.blob_path(sha256)
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        meta['deduplicated'] = os.path.exists(blob_path)
+        if meta['deduplicated']:
+            os.remove(part_path)
+            os.utime(blob_path)  # Freshly in use again: keeps purge_orphaned_blobs off it
+        else:
+            os.replace(part_path, blob_path)
+        meta['sha256'] = sha256
+        self._save(meta_path, meta)
+        return meta
+
+    def completed(self, upload_id, owner):
+        """Metadata of a finished upload that is about to be attached to an application."""
+        meta, _, _ = self._load(upload_id, owner)
+        if not meta.get('sha256'):
+            raise UploadError("Upload is incomplete.", 409)
+        return meta
+
+    def discard(self, upload_id):
+        """Forgets an upload once it's attached (or abandoned); its blob is kept."""
+        for path in self._paths(upload_id):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def purge_stale(self):
+        """Removes uploads older than partial_ttl; returns how many were removed."""
+        cutoff = time.time() - self.partial_ttl
+        removed = 0
+        for name in os.listdir(self.partial_dir):
+            upload_id, extension = os.path.splitext(name)
+            if extension != '.json':
+                continue
+            part_path, meta_path = os.path.join(self.partial_dir, upload_id + '.part'), os.path.join(self.partial_dir, name)
+            try:
+                # A chunk landing keeps an upload alive
+                last_activity = max(os.path.getmtime(meta_path),
+                                    os.path.getmtime(part_path) if os.path.exists(part_path) else 0)
+            except OSError:
+                continue
+            if last_activity < cutoff:
+                self.discard(upload_id)
+                removed += 1
+        return removed
+
+    def purge_orphaned_blobs(self, referenced):
+        """
+        Removes blobs whose SHA-256 isn't in `referenced` (e.g. their application was
+        deleted). Blobs younger than partial_ttl are kept: they may belong to an upload
+        that is finished but not attached yet.
+        """
+        cutoff = time.time() - self.partial_ttl
+        removed = 0
+        for folder, _, names in os.walk(self.blob_dir):
+            for name in names:
+                if not _SHA256.match(name) or name in referenced:
+                    continue
+                path = os.path.join(folder, name)
+                try:
+                    if os.path.getmtime(path) < cutoff:
+                        os.remove(path)
+                        removed += 1
+                except OSError:
+                    continue
+        return removed
@@ -0,0 +1,9 @@
+# ==============================================================================
+# 🏭 WSGI ENTRY POINT
+# ==============================================================================
+# Production:  gunicorn -c gunicorn.conf.py wsgi:app
+# Any WSGI server that imports `wsgi:app` works; gunicorn.conf.py adds worker
+# sizing, preloading and the fork hooks.
+from Web import create_app
+
+app = create_app()